@@ -2,7 +2,7 @@
 Admin configuration for AI/ML models.
 """
 from django.contrib import admin
-from .models import HealthInsight, HealthTrend, HealthRisk
+from .models import HealthInsight, HealthTrend, HealthRisk, AnalysisJob, PopulationRun, PopulationShard
 
 
 @admin.register(HealthInsight)
@@ -36,3 +36,32 @@ class HealthRiskAdmin(admin.ModelAdmin):
     filter_horizontal = ('related_records',)
     date_hierarchy = 'assessed_at'
 
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    """Analysis job admin."""
+    list_display = ('job_type', 'patient', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('job_type', 'status', 'created_at')
+    search_fields = ('patient__mobile', 'patient__first_name', 'task_id')
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
+    date_hierarchy = 'created_at'
+
+
+class PopulationShardInline(admin.TabularInline):
+    """Population shard inline with progress and throughput."""
+    model = PopulationShard
+    extra = 0
+    can_delete = False
+    fields = ('index', 'first_patient_id', 'last_patient_id', 'status', 'checkpoint_patient_id',
+              'patients_processed', 'duration_seconds', 'throughput', 'attempts', 'error')
+    readonly_fields = fields
+
+
+@admin.register(PopulationRun)
+class PopulationRunAdmin(admin.ModelAdmin):
+    """Population run admin."""
+    list_display = ('id', 'status', 'total_shards', 'patients_processed', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'updated_at', 'finished_at')
+    inlines = [PopulationShardInline]
+    date_hierarchy = 'created_at'
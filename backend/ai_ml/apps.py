@@ -4,4 +4,6 @@ from django.apps import AppConfig
 class AiMlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_ml'
-
+    
+    def ready(self):
+        from . import signals  # noqa: F401
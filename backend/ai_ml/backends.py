@@ -0,0 +1,165 @@
+"""
+Statistics backends for HealthAnalyzer.
+
+The NumPy backend pulls a patient's metric observations into memory and
+aggregates them in Python; the Postgres backend pushes the same
+aggregation into window/aggregate SQL so only one row per metric (or per
+anomaly) crosses the wire. Both return identical shapes.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from . import stats
+from .compute import get_compute_executor
+
+logger = logging.getLogger(__name__)
+
+
+class NumpyAnalysisBackend:
+    """Aggregate a patient's MetricMatrix in process."""
+
+    name = 'numpy'
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    def trend_statistics(self, metric_name=None):
+        """Sufficient statistics and data points for each metric with 2+ observations."""
+        matrix = self.analyzer.metric_matrix
+        series_by_metric = {
+            metric: (series.dates, series.values)
+            for metric, series in matrix.items()
+            if len(series) >= 2 and (not metric_name or metric == metric_name)
+        }
+        if not series_by_metric:
+            return {}
+        
+        statistics = get_compute_executor().run(stats.series_statistics_batch, series_by_metric)
+        return {
+            metric: {**values, 'data_points': matrix[metric].data_points()}
+            for metric, values in statistics.items()
+        }
+
+    def detect_anomalies(self, detector):
+        return detector.scan(self.analyzer.metric_matrix)
+
+
+class PostgresAnalysisBackend:
+    """Aggregate metric observations with Postgres window and aggregate functions."""
+
+    name = 'postgres'
+
+    # x is days since the series' first observation, as in stats.series_statistics
+    TREND_SQL = """
+        WITH ordered AS (
+            SELECT patient_id, metric_code, observed_on, value, record_id,
+                   (observed_on - first_value(observed_on) OVER (
+                       PARTITION BY patient_id, metric_code ORDER BY observed_on, record_id
+                   ))::float8 AS x
+            FROM health_metric_observations
+            WHERE patient_id = ANY(%s) {metric_filter}
+        )
+        SELECT patient_id, metric_code,
+               count(*), sum(x), sum(value), sum(x * value), sum(x * x),
+               min(value), max(value),
+               (array_agg(value ORDER BY observed_on, record_id))[1],
+               (array_agg(value ORDER BY observed_on DESC, record_id DESC))[1],
+               avg(value), var_pop(value) * count(*),
+               json_agg(json_build_object(
+                   'date', observed_on, 'value', value, 'record_id', record_id
+               ) ORDER BY observed_on, record_id)
+        FROM ordered
+        GROUP BY patient_id, metric_code
+        HAVING count(*) >= 2
+        ORDER BY patient_id, metric_code
+    """
+
+    ANOMALY_SQL = """
+        SELECT metric_code, observed_on, value, record_id, z
+        FROM (
+            SELECT metric_code, observed_on, value, record_id,
+                   abs(value - avg(value) OVER w)
+                       / (coalesce(stddev_pop(value) OVER w, 0) + 1e-10) AS z,
+                   count(*) OVER w AS n
+            FROM health_metric_observations
+            WHERE patient_id = %s
+            WINDOW w AS (PARTITION BY metric_code)
+        ) scored
+        WHERE n >= 2 AND z > %s
+        ORDER BY metric_code, observed_on, record_id
+    """
+
+    STAT_COLUMNS = (
+        'sample_count', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'min_value', 'max_value',
+        'first_value', 'current_value', 'running_mean', 'running_m2',
+    )
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    @classmethod
+    def cohort_trend_statistics(cls, patient_ids, metric_name=None):
+        """Trend statistics for many patients at once, keyed by (patient_id, metric)."""
+        params = [list(patient_ids)]
+        metric_filter = ''
+        if metric_name:
+            metric_filter = 'AND metric_code = %s'
+            params.append(metric_name)
+
+        result = {}
+        with connection.cursor() as cursor:
+            cursor.execute(cls.TREND_SQL.format(metric_filter=metric_filter), params)
+            for row in cursor.fetchall():
+                patient_id, metric, *values, data_points = row
+                statistics = {column: float(value) for column, value in zip(cls.STAT_COLUMNS, values)}
+                statistics['sample_count'] = int(statistics['sample_count'])
+                statistics['data_points'] = data_points
+                result[(patient_id, metric)] = statistics
+        return result
+
+    def trend_statistics(self, metric_name=None):
+        statistics = self.cohort_trend_statistics([self.analyzer.patient.id], metric_name)
+        return {metric: values for (_, metric), values in statistics.items()}
+
+    def detect_anomalies(self, detector):
+        with connection.cursor() as cursor:
+            cursor.execute(self.ANOMALY_SQL, [self.analyzer.patient.id, detector.Z_THRESHOLD])
+            rows = cursor.fetchall()
+        if not rows:
+            return []
+
+        codes, observed_on, values, record_ids, z = zip(*rows)
+        codes = np.asarray(codes, dtype=object)
+        dates = np.asarray(observed_on, dtype='datetime64[D]').astype(np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        record_ids = np.asarray(record_ids, dtype=np.int64)
+        z = np.asarray(z, dtype=np.float64)
+
+        # Rows arrive grouped by metric; apply the normal-range mask per metric slice
+        anomalies = []
+        bounds = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(codes)]):
+            window = slice(start, stop)
+            anomalies.extend(detector.collect(
+                codes[start], values[window], z[window], dates[window], record_ids[window]
+            ))
+        return anomalies
+
+
+BACKENDS = {
+    NumpyAnalysisBackend.name: NumpyAnalysisBackend,
+    PostgresAnalysisBackend.name: PostgresAnalysisBackend,
+}
+
+
+def get_analysis_backend(analyzer):
+    """Instantiate the backend selected by settings.AI_ML_ANALYSIS_BACKEND."""
+    name = getattr(settings, 'AI_ML_ANALYSIS_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'postgres' if connection.vendor == 'postgresql' else 'numpy'
+    elif name == 'postgres' and connection.vendor != 'postgresql':
+        logger.warning(f"Postgres analysis backend requested on {connection.vendor}; using NumPy")
+        name = 'numpy'
+    return BACKENDS[name](analyzer)
@@ -0,0 +1,3 @@
+"""
+Benchmark helpers for the AI/ML analysis pipeline.
+"""
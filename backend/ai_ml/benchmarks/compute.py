@@ -0,0 +1,71 @@
+"""
+Throughput benchmark for the compute executors.
+
+Simulates concurrent requests (threads) each submitting one patient's
+analysis kernels, and reports patients per second for the in-process
+executor and process pools of increasing size. Pure NumPy, no database.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from .. import stats
+from ..compute import InProcessExecutor, ProcessPoolComputeExecutor
+
+
+def synthetic_patients(count, metrics=10, length=2000, seed=0):
+    """Per-patient {metric: values} dicts of random-walk series."""
+    rng = np.random.default_rng(seed)
+    return [
+        {f'metric_{index}': 100 + np.cumsum(rng.normal(0, 1, length)) for index in range(metrics)}
+        for _ in range(count)
+    ]
+
+
+def patient_kernel(values_by_metric):
+    """The pure-compute part of one patient's analysis: statistics, z-scores and fits."""
+    values = np.vstack(list(values_by_metric.values()))
+    days = np.broadcast_to(np.arange(values.shape[1], dtype=np.float64), values.shape)
+    statistics = stats.series_statistics_batch({
+        metric: (days[0], series) for metric, series in values_by_metric.items()
+    })
+    z_by_metric = stats.z_scores_batch(values_by_metric)
+
+    fit = stats.linear_fits(days, values, np.ones(values.shape, dtype=bool))
+    return len(statistics), int(sum((z > 2).sum() for z in z_by_metric.values())), float(fit['slope'].sum())
+
+
+def measure(executor, patients, concurrency):
+    """Patients per second with ``concurrency`` request threads sharing ``executor``."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(lambda values: executor.run(patient_kernel, values), patients))
+    return len(patients) / (time.perf_counter() - started)
+
+
+def run_benchmark(worker_counts, patients=200, metrics=10, length=2000, concurrency=None):
+    """
+    Throughput for the in-process executor and each pool size.
+
+    Returns a list of ``{'backend', 'workers', 'patients_per_second', 'speedup'}``.
+    """
+    data = synthetic_patients(patients, metrics, length)
+    concurrency = concurrency or max(worker_counts)
+
+    baseline = measure(InProcessExecutor(), data, concurrency)
+    results = [{'backend': 'inprocess', 'workers': 1, 'patients_per_second': baseline, 'speedup': 1.0}]
+
+    for workers in worker_counts:
+        executor = ProcessPoolComputeExecutor(workers)
+        try:
+            executor.warm()
+            throughput = measure(executor, data, max(concurrency, workers))
+        finally:
+            executor.shutdown()
+        results.append({
+            'backend': 'process',
+            'workers': workers,
+            'patients_per_second': throughput,
+            'speedup': throughput / baseline,
+        })
+    return results
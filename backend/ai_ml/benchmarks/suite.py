@@ -0,0 +1,129 @@
+"""
+Benchmark suite for HealthAnalyzer and PredictiveModel.
+
+Each operation is timed over every synthetic patient and repeated; the
+report records wall time, database query count and peak traced Python
+memory per operation, and can be saved as JSON and compared with an
+earlier run.
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..models import HealthTrend
+from ..services import HealthAnalyzer, PredictiveModel
+
+REPORT_VERSION = 1
+METRIC_FIELDS = ('wall_ms', 'queries', 'peak_kib')
+
+
+def _predict(patient):
+    # Clear cached fits so every repeat measures the regression itself
+    HealthTrend.objects.filter(patient=patient).update(forecast_fit=None)
+    return PredictiveModel.predict_future_values(patient, 'HbA1c', days_ahead=90)
+
+
+OPERATIONS = {
+    'analyze_trends': lambda patient: HealthAnalyzer(patient).analyze_trends(),
+    'detect_anomalies': lambda patient: HealthAnalyzer(patient).detect_anomalies(),
+    'assess_health_risks': lambda patient: HealthAnalyzer(patient).assess_health_risks(),
+    'generate_insights': lambda patient: HealthAnalyzer(patient).generate_insights(),
+    'predict_future_values': _predict,
+}
+
+
+def measure(operation, patients):
+    """Wall time, query count and peak traced memory of one pass over the patients."""
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for patient in patients:
+                operation(patient)
+            wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'wall_ms': wall * 1000, 'queries': len(queries), 'peak_kib': peak / 1024}
+
+
+def run_suite(patients, scenario, repeat=3, operations=None):
+    """
+    Run every operation ``repeat`` times over ``patients``.
+
+    Per operation, the report keeps the best and median wall time, the
+    query count and the largest peak memory seen.
+    """
+    results = {}
+    for name in operations or OPERATIONS:
+        # tracemalloc slows execution, so time without it and trace memory once
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for patient in patients:
+                    OPERATIONS[name](patient)
+                timings.append((time.perf_counter() - started) * 1000)
+        traced = measure(OPERATIONS[name], patients)
+        results[name] = {
+            'wall_ms': min(timings),
+            'wall_ms_median': statistics.median(timings),
+            'queries': len(queries),
+            'peak_kib': traced['peak_kib'],
+            'per_patient_ms': min(timings) / len(patients),
+        }
+
+    return {
+        'version': REPORT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'database': connection.vendor,
+            'analysis_backend': settings.AI_ML_ANALYSIS_BACKEND,
+            'compute_backend': settings.AI_ML_COMPUTE_BACKEND,
+        },
+        'scenario': scenario,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as report_file:
+        return json.load(report_file)
+
+
+def compare_reports(baseline, current):
+    """
+    Relative change of each operation's metrics versus a baseline report.
+
+    Returns ``{operation: {metric: {'baseline', 'current', 'change_pct'}}}``
+    for operations present in both reports.
+    """
+    comparison = {}
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        comparison[name] = {}
+        for field in METRIC_FIELDS:
+            before, after = previous[field], result[field]
+            comparison[name][field] = {
+                'baseline': before,
+                'current': after,
+                'change_pct': (after - before) / before * 100 if before else None,
+            }
+    return comparison
@@ -0,0 +1,97 @@
+"""
+Synthetic patient data for benchmarking analysis backends.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from core.models import HealthRecord
+from ..models import HealthMetricObservation
+from ..services import ObservationWriter
+
+User = get_user_model()
+
+# metric name -> (baseline mean, standard deviation)
+DEFAULT_METRICS = {
+    'HbA1c': (5.8, 0.6),
+    'Fasting Blood Sugar': (105, 18),
+    'Blood Pressure Systolic': (128, 12),
+    'Blood Pressure Diastolic': (82, 8),
+    'Total Cholesterol': (195, 25),
+    'LDL Cholesterol': (120, 22),
+    'HDL Cholesterol': (48, 8),
+    'Triglycerides': (145, 35),
+    'Hemoglobin': (13.8, 1.2),
+    'Creatinine': (1.0, 0.2),
+}
+
+EXTRA_METRICS = {
+    'ALT': (38, 14),
+    'AST': (30, 10),
+    'WBC Count': (7500, 1800),
+    'Platelet Count': (260000, 60000),
+}
+
+
+def select_metrics(count):
+    """The first ``count`` known metrics, padded with generic synthetic ones."""
+    metrics = dict(list({**DEFAULT_METRICS, **EXTRA_METRICS}.items())[:count])
+    for index in range(len(metrics), count):
+        metrics[f'Synthetic Metric {index}'] = (100.0, 15.0)
+    return metrics
+
+
+def generate_cohort(n_records, n_patients=1, metrics=None, seed=0, start=date(2015, 1, 1),
+                    mobile_prefix='8', interval_days=7):
+    """
+    Bulk-create PROCESSED records (and their metric observations) spread
+    evenly over ``n_patients`` synthetic patients, one visit every
+    ``interval_days`` days.
+
+    Values drift upward by 10% over each patient's history with Gaussian
+    noise and occasional outliers, and roughly 10% of metrics are missing
+    from each record. Returns the created patients.
+    """
+    metrics = metrics or DEFAULT_METRICS
+    rnd = random.Random(seed)
+    visits = max(-(-n_records // n_patients) - 1, 1)
+
+    patients = User.objects.bulk_create([
+        User(mobile=f'{mobile_prefix}{seed:03d}{index:06d}', first_name='Benchmark')
+        for index in range(n_patients)
+    ])
+
+    records = []
+    for index in range(n_records):
+        patient = patients[index % n_patients]
+        visit = index // n_patients
+        values = {}
+        for metric_name, (mean, std) in metrics.items():
+            if rnd.random() < 0.1:
+                continue
+            value = mean * (1 + 0.1 * visit / visits) + rnd.gauss(0, std)
+            if rnd.random() < 0.02:
+                value += 4 * std
+            values[metric_name] = round(value, 2)
+
+        records.append(HealthRecord(
+            patient=patient,
+            uploaded_by=patient,
+            title=f'Synthetic lab report {visit}',
+            category=HealthRecord.RecordCategory.LAB_REPORT,
+            file_url='https://example.com/synthetic.pdf',
+            file_name='synthetic.pdf',
+            file_size=1,
+            file_type='pdf',
+            record_date=start + timedelta(days=interval_days * visit),
+            status=HealthRecord.RecordStatus.PROCESSED,
+            extracted_values=values,
+        ))
+
+    # bulk_create bypasses the post_save signal, so observations are written here
+    records = HealthRecord.objects.bulk_create(records, batch_size=1000)
+    HealthMetricObservation.objects.bulk_create(
+        [observation for record in records for observation in ObservationWriter.build(record)],
+        batch_size=5000,
+    )
+    return patients
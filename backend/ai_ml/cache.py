@@ -0,0 +1,128 @@
+"""
+Per-patient cache for analysis results.
+
+Results are stored in ``CACHES['default']`` under a key that embeds the
+patient's record watermark (latest ``updated_at`` and count of PROCESSED
+records), a version bumped by HealthRecord signals and the versions of the
+loaded metric registry and risk rules, so a patient whose records have not
+changed is served without re-running HealthAnalyzer until a rule file is
+reloaded.
+Downsampled trend series are keyed on the trend's ``last_updated`` the
+same way.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from core.models import HealthRecord
+from .metric_registry import metric_registry_version
+from .risk_rules import risk_rules_version
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai_ml:analysis'
+STATS_EVENTS = ('hits', 'misses')
+
+
+def _version_key(patient_id):
+    return f'{KEY_PREFIX}:{patient_id}:version'
+
+
+def _stats_key(kind, event):
+    return f'{KEY_PREFIX}:stats:{kind}:{event}'
+
+
+def increment(key):
+    """Atomically increment a counter in the cache, creating it on first use."""
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Could not increment cache counter {key}: {str(e)}")
+
+
+def invalidate_patient(patient_id):
+    """Invalidate every cached result for a patient by bumping its version."""
+    increment(_version_key(patient_id))
+
+
+def cache_stats(kinds=None):
+    """Hit/miss counters per result kind, with hit ratios."""
+    kinds = kinds or AnalysisCache.KINDS + (TrendSeriesCache.KIND,)
+    keys = {_stats_key(kind, event): (kind, event) for kind in kinds for event in STATS_EVENTS}
+    values = cache.get_many(list(keys))
+
+    stats = {}
+    for key, (kind, event) in keys.items():
+        stats.setdefault(kind, {})[event] = int(values.get(key, 0))
+    for counters in stats.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = counters['hits'] / lookups if lookups else None
+    return stats
+
+
+class AnalysisCache:
+    """Watermark-keyed cache of one patient's analysis results."""
+
+    KINDS = ('trends', 'risks', 'anomalies')
+
+    def __init__(self, patient, timeout=None):
+        self.patient = patient
+        self.timeout = timeout if timeout is not None else settings.AI_ML_ANALYSIS_CACHE_TIMEOUT
+
+    def watermark(self):
+        """Latest record update, PROCESSED record count, signal version and rule file versions."""
+        state = HealthRecord.objects.filter(
+            patient=self.patient,
+            status=HealthRecord.RecordStatus.PROCESSED
+        ).aggregate(updated=Max('updated_at'), count=Count('id'))
+        updated = state['updated'].timestamp() if state['updated'] else 0
+        version = cache.get(_version_key(self.patient.id), 0)
+        rules = f'{metric_registry_version():.6f}:{risk_rules_version():.6f}'
+        return f"{updated:.6f}:{state['count']}:{version}:{rules}"
+
+    def key(self, kind, params=''):
+        return f'{KEY_PREFIX}:{self.patient.id}:{kind}:{params}:{self.watermark()}'
+
+    def get_or_compute(self, kind, compute, params=''):
+        """Return the cached result for ``kind`` or compute and store it."""
+        return _get_or_compute(lambda: self.key(kind, params), kind, compute, self.timeout)
+
+
+class TrendSeriesCache:
+    """Cache of one trend's downsampled series, keyed on its last update."""
+
+    KIND = 'series'
+
+    def __init__(self, trend, timeout=None):
+        self.trend = trend
+        self.timeout = timeout if timeout is not None else settings.AI_ML_ANALYSIS_CACHE_TIMEOUT
+
+    def key(self, params):
+        return f'{KEY_PREFIX}:series:{self.trend.id}:{params}:{self.trend.last_updated.timestamp():.6f}'
+
+    def get_or_compute(self, compute, params=''):
+        """Return the cached series for ``params`` or compute and store it."""
+        return _get_or_compute(lambda: self.key(params), self.KIND, compute, self.timeout)
+
+
+def _get_or_compute(make_key, kind, compute, timeout):
+    """Cache lookup with hit/miss counting that falls back to computing when the cache fails."""
+    try:
+        key = make_key()
+        result = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Analysis cache unavailable: {str(e)}")
+        return compute()
+
+    increment(_stats_key(kind, 'hits' if result is not None else 'misses'))
+    if result is not None:
+        return result
+
+    result = compute()
+    try:
+        cache.set(key, result, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Could not store {kind} result in the analysis cache: {str(e)}")
+    return result
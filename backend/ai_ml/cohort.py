@@ -0,0 +1,355 @@
+"""
+Cohort-wide trend engine for batch re-analysis.
+
+Streams metric observations for many patients, computes trend
+statistics for every (patient, metric) group with grouped pandas/NumPy
+operations and upserts the resulting HealthTrend rows in bulk.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from core.models import HealthRecord
+from .correlation import CorrelationAnalyzer
+from .models import HealthInsight, HealthMetricObservation, HealthTrend
+from .metric_registry import get_metric_registry
+from .risk_rules import RiskRuleEngine
+from .services import (
+    EPOCH_ORDINAL, AnomalyDetector, HealthAnalyzer, InsightWriter, anomaly_insight,
+    from_epoch_day, save_risk_assessments, upsert_trends
+)
+from . import stats
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+GROUP_KEYS = ['patient_id', 'metric_name']
+
+
+def iter_patient_chunks(chunk_size=500, patient_ids=None, first_id=None, last_id=None):
+    """
+    Yield ascending lists of patient ids that have PROCESSED records.
+
+    Optionally restricted to explicit ``patient_ids`` and/or the inclusive
+    id range ``first_id``..``last_id``.
+    """
+    queryset = HealthRecord.objects.filter(status=HealthRecord.RecordStatus.PROCESSED)
+    if patient_ids is not None:
+        queryset = queryset.filter(patient_id__in=patient_ids)
+    if last_id is not None:
+        queryset = queryset.filter(patient_id__lte=last_id)
+
+    previous_id = first_id - 1 if first_id is not None else 0
+    while True:
+        chunk = list(
+            queryset.filter(patient_id__gt=previous_id)
+            .order_by('patient_id')
+            .values_list('patient_id', flat=True)
+            .distinct()[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        previous_id = chunk[-1]
+
+
+class CohortTrendEngine:
+    """Compute and persist trends for a batch of patients at once."""
+
+    def __init__(self, normal_ranges=None, iterator_chunk_size=2000):
+        self.normal_ranges = normal_ranges if normal_ranges is not None else HealthAnalyzer.NORMAL_RANGES
+        self.iterator_chunk_size = iterator_chunk_size
+
+    def load_observations(self, patient_ids, metric_codes=None):
+        """
+        Stream the patients' metric observations into a long-format frame.
+
+        One row per observation, sorted by patient, metric, date and record
+        id (the order HealthAnalyzer uses).
+        """
+        rows = HealthMetricObservation.objects.filter(patient_id__in=patient_ids)
+        if metric_codes is not None:
+            rows = rows.filter(metric_code__in=metric_codes)
+        rows = rows.order_by('patient_id', 'metric_code', 'observed_on', 'record_id').values_list(
+            'patient_id', 'metric_code', 'observed_on', 'value', 'record_id'
+        )
+
+        patient_col, metric_col, day_col, value_col, record_col = [], [], [], [], []
+        for patient_id, metric_code, observed_on, value, record_id in rows.iterator(chunk_size=self.iterator_chunk_size):
+            patient_col.append(patient_id)
+            metric_col.append(metric_code)
+            day_col.append(observed_on.toordinal() - EPOCH_ORDINAL)
+            value_col.append(value)
+            record_col.append(record_id)
+
+        return pd.DataFrame({
+            'patient_id': np.asarray(patient_col, dtype=np.int64),
+            'metric_name': metric_col,
+            'day': np.asarray(day_col, dtype=np.int64),
+            'value': np.asarray(value_col, dtype=np.float64),
+            'record_id': np.asarray(record_col, dtype=np.int64),
+        })
+
+    def compute(self, frame):
+        """
+        Compute trend statistics for every (patient, metric) group.
+
+        Returns one row per group with at least two observations, plus the
+        group's start/stop offsets into ``frame`` for slicing data points.
+        """
+        grouped = frame.groupby(GROUP_KEYS, sort=False)
+        # x is days since each group's first observation, as in HealthAnalyzer
+        x = (frame['day'] - grouped['day'].transform('first')).to_numpy(dtype=np.float64)
+        y = frame['value'].to_numpy()
+        group_mean = grouped['value'].transform('mean').to_numpy()
+        work = frame[GROUP_KEYS].assign(x=x, y=y, xy=x * y, xx=x * x, dev2=np.square(y - group_mean))
+
+        summary = work.groupby(GROUP_KEYS, sort=False).agg(
+            n=('y', 'size'),
+            sum_x=('x', 'sum'),
+            sum_y=('y', 'sum'),
+            sum_xy=('xy', 'sum'),
+            sum_xx=('xx', 'sum'),
+            min_value=('y', 'min'),
+            max_value=('y', 'max'),
+            first_value=('y', 'first'),
+            last_value=('y', 'last'),
+            running_m2=('dev2', 'sum'),
+            span=('x', 'max'),
+        ).reset_index()
+
+        summary['stop'] = summary['n'].cumsum()
+        summary['start'] = summary['stop'] - summary['n']
+        summary = summary[summary['n'] >= 2].reset_index(drop=True)
+
+        derived = stats.trend_summary(
+            summary['n'].to_numpy(),
+            summary['sum_x'].to_numpy(),
+            summary['sum_y'].to_numpy(),
+            summary['sum_xy'].to_numpy(),
+            summary['sum_xx'].to_numpy(),
+            summary['min_value'].to_numpy(),
+            summary['max_value'].to_numpy(),
+            summary['first_value'].to_numpy(),
+            summary['last_value'].to_numpy(),
+            summary['span'].to_numpy(),
+            self.slopes(summary, x, y),
+        )
+        for column, values in derived.items():
+            summary[column] = values
+        return summary
+
+    @staticmethod
+    def slopes(summary, x, y):
+        """
+        Per-group trend slopes: each metric's configured robust estimator,
+        run in padded batches, or least squares from the group sums.
+        """
+        slopes = stats.ols_slope(
+            summary['n'].to_numpy(), summary['sum_x'].to_numpy(), summary['sum_y'].to_numpy(),
+            summary['sum_xy'].to_numpy(), summary['sum_xx'].to_numpy(),
+        )
+        methods = summary['metric_name'].map(get_metric_registry().trend_estimator).to_numpy()
+        for method in set(methods) - {'ols'}:
+            rows = np.flatnonzero(methods == method)
+            slopes[rows] = stats.trend_slopes(method, [
+                (x[start:stop], y[start:stop])
+                for start, stop in zip(summary['start'].to_numpy()[rows], summary['stop'].to_numpy()[rows])
+            ])
+        return slopes
+
+    def build_trends(self, frame, summary):
+        """Turn computed group statistics into unsaved HealthTrend objects."""
+        iso_dates = frame['day'].to_numpy().astype('datetime64[D]').astype(str)
+        values = frame['value'].to_numpy()
+        record_ids = frame['record_id'].to_numpy()
+
+        registry = get_metric_registry()
+        trends = []
+        for row in summary.itertuples(index=False):
+            window = slice(row.start, row.stop)
+            normal_range = self.normal_ranges.get(row.metric_name, (None, None))
+            trends.append(HealthTrend(
+                patient_id=row.patient_id,
+                metric_name=row.metric_name,
+                metric_unit=registry.unit(row.metric_name),
+                data_points=[
+                    {'date': day, 'value': float(value), 'record_id': int(record_id)}
+                    for day, value, record_id in zip(iso_dates[window], values[window], record_ids[window])
+                ],
+                trend_direction=row.trend_direction,
+                trend_strength=float(row.trend_strength),
+                current_value=float(row.last_value),
+                average_value=float(row.average_value),
+                min_value=float(row.min_value),
+                max_value=float(row.max_value),
+                change_percentage=float(row.change_percentage),
+                sample_count=int(row.n),
+                sum_x=float(row.sum_x),
+                sum_y=float(row.sum_y),
+                sum_xy=float(row.sum_xy),
+                sum_xx=float(row.sum_xx),
+                first_value=float(row.first_value),
+                running_mean=float(row.average_value),
+                running_m2=float(row.running_m2),
+                normal_range_min=normal_range[0],
+                normal_range_max=normal_range[1],
+            ))
+        return trends
+
+    def run(self, patient_ids, frame=None):
+        """
+        Recompute and upsert trends for the given patients; returns the count.
+
+        The patients' trends for metrics that no longer have at least two
+        observations are deleted, as HealthAnalyzer.analyze_trends does.
+        """
+        if frame is None:
+            frame = self.load_observations(patient_ids)
+        trends = self.build_trends(frame, self.compute(frame)) if not frame.empty else []
+
+        with transaction.atomic():
+            if trends:
+                upsert_trends(trends)
+            self.drop_missing_trends(patient_ids, trends)
+
+        logger.info(f"Upserted {len(trends)} trends for {len(patient_ids)} patients")
+        return len(trends)
+
+    @staticmethod
+    def drop_missing_trends(patient_ids, trends):
+        """Delete the patients' stored trends that ``trends`` no longer covers."""
+        kept = {(trend.patient_id, trend.metric_name) for trend in trends}
+        stored = HealthTrend.objects.filter(patient_id__in=patient_ids).values_list('id', 'patient_id', 'metric_name')
+        dropped = [trend_id for trend_id, patient_id, metric_name in stored if (patient_id, metric_name) not in kept]
+        if dropped:
+            HealthTrend.objects.filter(id__in=dropped).delete()
+
+
+class CohortRiskEngine:
+    """Score and persist risk assessments for a batch of patients at once."""
+
+    def __init__(self, rule_engine=None, iterator_chunk_size=2000):
+        self.rule_engine = rule_engine or RiskRuleEngine.default()
+        self.iterator_chunk_size = iterator_chunk_size
+
+    @staticmethod
+    def latest_values(frame, metrics):
+        """Pivot a sorted observation frame into (patient ids, latest-value matrix)."""
+        latest = frame.groupby(GROUP_KEYS, sort=False)['value'].last().unstack('metric_name')
+        latest = latest.reindex(columns=metrics)
+        return latest.index.to_numpy(), latest.to_numpy(dtype=np.float64)
+
+    def run(self, patient_ids, frame=None):
+        """Assess and persist risks for the given patients; returns the count."""
+        metrics = self.rule_engine.metrics
+        if frame is None:
+            frame = CohortTrendEngine(iterator_chunk_size=self.iterator_chunk_size).load_observations(
+                patient_ids, metric_codes=metrics
+            )
+        else:
+            frame = frame[frame['metric_name'].isin(metrics)]
+        if frame.empty:
+            return 0
+
+        patients, latest = self.latest_values(frame, metrics)
+        assessments = dict(zip(patients.tolist(), self.rule_engine.evaluate(latest, metrics)))
+        risks = save_risk_assessments(assessments)
+
+        count = sum(len(items) for items in risks.values())
+        logger.info(f"Saved {count} risk assessments for {len(patients)} patients")
+        return count
+
+
+class CohortAnomalyEngine:
+    """Detect and persist anomalies for a batch of patients at once."""
+
+    def __init__(self, normal_ranges=None, iterator_chunk_size=2000):
+        self.normal_ranges = normal_ranges if normal_ranges is not None else HealthAnalyzer.NORMAL_RANGES
+        self.iterator_chunk_size = iterator_chunk_size
+
+    def detect(self, frame):
+        """
+        Rows of ``frame`` that AnomalyDetector would flag, with a z_score column.
+
+        z-scores use each (patient, metric) group's mean and population
+        standard deviation, as in the per-patient scan.
+        """
+        grouped = frame.groupby(GROUP_KEYS, sort=False)['value']
+        values = frame['value'].to_numpy()
+        z = stats.z_scores(values, grouped.transform('mean').to_numpy(), grouped.transform('std', ddof=0).to_numpy())
+
+        # Unbounded sides map to NaN, which never compares as outside
+        low = frame['metric_name'].map({
+            metric: bounds[0] for metric, bounds in self.normal_ranges.items() if bounds[0] is not None
+        }).to_numpy(dtype=np.float64)
+        high = frame['metric_name'].map({
+            metric: bounds[1] for metric, bounds in self.normal_ranges.items() if bounds[1] is not None
+        }).to_numpy(dtype=np.float64)
+        outside = (values < low) | (values > high)
+
+        mask = (grouped.transform('size').to_numpy() >= 2) & (z > AnomalyDetector.Z_THRESHOLD) & outside
+        return frame[mask].assign(z_score=z[mask])
+
+    def run(self, patient_ids, frame=None):
+        """
+        Detect anomalies for the given patients and sync them as insights; returns the count.
+
+        Anomaly insights of these patients that are no longer detected are
+        deactivated.
+        """
+        if frame is None:
+            frame = CohortTrendEngine(iterator_chunk_size=self.iterator_chunk_size).load_observations(patient_ids)
+        anomalies = self.detect(frame) if not frame.empty else frame
+        pending = [
+            anomaly_insight(User(id=int(row.patient_id)), {
+                'metric': row.metric_name,
+                'value': float(row.value),
+                'date': from_epoch_day(row.day),
+                'record_id': int(row.record_id),
+                'z_score': float(row.z_score),
+                'normal_range': self.normal_ranges.get(row.metric_name, (None, None)),
+            })
+            for row in anomalies.itertuples(index=False)
+        ]
+        InsightWriter.sync_patients(patient_ids, pending, deactivate_types=[HealthInsight.InsightType.ANOMALY])
+
+        logger.info(f"Recorded {len(anomalies)} anomalies for {len(patient_ids)} patients")
+        return len(anomalies)
+
+
+class CohortCorrelationEngine:
+    """Detect and persist cross-metric correlations for a batch of patients at once."""
+
+    TREND_FIELDS = [
+        'patient_id', 'metric_name', 'data_points', 'trend_direction', 'current_value',
+        'normal_range_min', 'normal_range_max',
+    ]
+
+    def __init__(self, analyzer=None):
+        self.analyzer = analyzer or CorrelationAnalyzer()
+
+    def run(self, patient_ids):
+        """
+        Correlate the patients' stored trends and sync CORRELATION insights.
+
+        Correlation insights of these patients that are no longer produced
+        are deactivated. Returns the number of correlated pairs.
+        """
+        trends_by_patient = {}
+        for trend in HealthTrend.objects.filter(patient_id__in=patient_ids).only(*self.TREND_FIELDS):
+            trends_by_patient.setdefault(trend.patient_id, []).append(trend)
+
+        correlations = self.analyzer.correlations(trends_by_patient)
+        pending = [
+            insight
+            for patient_id, pairs in correlations.items()
+            for insight in self.analyzer.insights(User(id=patient_id), trends_by_patient[patient_id], pairs)
+        ]
+        InsightWriter.sync_patients(patient_ids, pending, deactivate_types=[HealthInsight.InsightType.CORRELATION])
+
+        count = sum(len(pairs) for pairs in correlations.values())
+        logger.info(f"Recorded {count} correlations for {len(patient_ids)} patients")
+        return count
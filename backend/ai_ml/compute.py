@@ -0,0 +1,120 @@
+"""
+Execution backends for the pure-compute part of analysis.
+
+Kernels take arrays and return statistics; database I/O always stays in
+the calling process. The in-process executor runs kernels on the calling
+thread. The process executor sends them to a ``ProcessPoolExecutor`` of
+pre-warmed workers so NumPy work does not contend for the GIL with request
+handling. It is selected by ``AI_ML_COMPUTE_BACKEND``.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_worker():
+    """Pool initializer: import NumPy and the kernels, and compile the risk rules."""
+    import numpy as np
+    from . import stats
+    from .risk_rules import RiskRuleEngine
+
+    stats.series_statistics(np.arange(4), np.arange(4, dtype=np.float64))
+    stats.trend_slopes('theil_sen', [(np.arange(4.0), np.arange(4.0))])
+    RiskRuleEngine.default()
+
+
+def _ping(_):
+    return os.getpid()
+
+
+class InProcessExecutor:
+    """Run kernels on the calling thread."""
+
+    name = 'inprocess'
+    workers = 1
+
+    def run(self, kernel, *args):
+        return kernel(*args)
+
+    def map(self, kernel, *iterables):
+        return list(map(kernel, *iterables))
+
+    def warm(self):
+        return [os.getpid()]
+
+    def shutdown(self):
+        pass
+
+
+class ProcessPoolComputeExecutor:
+    """Run kernels in a pool of pre-warmed worker processes."""
+
+    name = 'process'
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn: workers never inherit the parent's DB connections or threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_worker
+            )
+        return self._pool
+
+    def warm(self):
+        """Start every worker now rather than on first use; returns worker pids."""
+        return sorted(set(self.pool.map(_ping, range(self.workers * 4))))
+
+    def run(self, kernel, *args):
+        try:
+            return self.pool.submit(kernel, *args).result()
+        except BrokenProcessPool:
+            logger.error("Compute worker pool broke; restarting it and running in process")
+            self.shutdown()
+            return kernel(*args)
+
+    def map(self, kernel, *iterables):
+        try:
+            return list(self.pool.map(kernel, *iterables))
+        except BrokenProcessPool:
+            logger.error("Compute worker pool broke; restarting it and running in process")
+            self.shutdown()
+            return list(map(kernel, *iterables))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_executor = None
+
+
+def get_compute_executor():
+    """The process-wide executor selected by settings.AI_ML_COMPUTE_BACKEND."""
+    global _executor
+    if _executor is None:
+        backend = settings.AI_ML_COMPUTE_BACKEND
+        workers = settings.AI_ML_COMPUTE_WORKERS or os.cpu_count() or 1
+        if backend == 'auto':
+            backend = 'process' if workers > 1 else 'inprocess'
+        if multiprocessing.current_process().daemon:
+            # e.g. Celery prefork children, which may not start processes of their own
+            backend = 'inprocess'
+        if backend == 'process':
+            _executor = ProcessPoolComputeExecutor(workers)
+            _executor.warm()
+        else:
+            _executor = InProcessExecutor()
+    return _executor
@@ -0,0 +1,179 @@
+"""
+Cross-metric correlation insights.
+
+A patient's HealthTrend series are aligned on a common date grid (one cell
+per ``GRID_DAYS`` days, averaging values that share a cell) and correlated
+at once: the Pearson coefficients of every metric pair, for every patient
+in a batch, come from one batched einsum (``stats.pairwise_correlations``).
+"""
+from datetime import date
+
+import numpy as np
+from .models import HealthInsight
+from .services import EPOCH_ORDINAL, PendingInsight
+from . import stats
+
+
+class CorrelationAnalyzer:
+    """Flag metric pairs of a patient whose values move together or against each other."""
+
+    GRID_DAYS = 7
+    MIN_POINTS = 6  # Shared grid cells a pair needs
+    MIN_ABS_R = 0.7
+    MAX_CELLS = 2_000_000  # Upper bound on batch x metrics x grid cells per einsum
+
+    def __init__(self, grid_days=None, min_points=None, min_abs_r=None):
+        self.grid_days = grid_days or self.GRID_DAYS
+        self.min_points = min_points or self.MIN_POINTS
+        self.min_abs_r = min_abs_r or self.MIN_ABS_R
+
+    @staticmethod
+    def _days(trend):
+        return np.fromiter(
+            (date.fromisoformat(point['date']).toordinal() - EPOCH_ORDINAL for point in trend.data_points),
+            dtype=np.int64,
+            count=len(trend.data_points),
+        )
+
+    def grid(self, trends, metrics):
+        """
+        Align one patient's trends on a shared grid.
+
+        Returns a (metrics, cells) array of per-cell means, NaN where a
+        metric has no value in a cell.
+        """
+        series = {trend.metric_name: trend for trend in trends if trend.data_points}
+        days = {metric: self._days(trend) for metric, trend in series.items()}
+        if not days:
+            return np.full((len(metrics), 0), np.nan)
+
+        origin = min(values.min() for values in days.values())
+        cells = (max(values.max() for values in days.values()) - origin) // self.grid_days + 1
+        grid = np.full((len(metrics), cells), np.nan)
+        for row, metric in enumerate(metrics):
+            if metric not in series:
+                continue
+            cell = (days[metric] - origin) // self.grid_days
+            values = np.fromiter((point['value'] for point in series[metric].data_points), dtype=np.float64)
+            counts = np.bincount(cell, minlength=cells)
+            sums = np.bincount(cell, weights=values, minlength=cells)
+            occupied = counts > 0
+            grid[row, occupied] = sums[occupied] / counts[occupied]
+        return grid
+
+    def batches(self, trends_by_patient):
+        """
+        Split patients into batches of similar grid length under ``MAX_CELLS``.
+
+        Yields ``(patient_ids, metrics, values)`` with values a
+        (patients, metrics, cells) NaN-padded array.
+        """
+        metrics = sorted({trend.metric_name for trends in trends_by_patient.values() for trend in trends})
+        grids = {
+            patient_id: self.grid(trends, metrics)
+            for patient_id, trends in trends_by_patient.items()
+            if len(trends) >= 2
+        }
+
+        batch = []
+        for patient_id in sorted(grids, key=lambda pid: grids[pid].shape[1]):
+            cells = grids[patient_id].shape[1]
+            if batch and (len(batch) + 1) * len(metrics) * cells > self.MAX_CELLS:
+                yield self._stack(batch, grids, metrics)
+                batch = []
+            batch.append(patient_id)
+        if batch:
+            yield self._stack(batch, grids, metrics)
+
+    @staticmethod
+    def _stack(patient_ids, grids, metrics):
+        cells = max(grids[patient_id].shape[1] for patient_id in patient_ids)
+        values = np.full((len(patient_ids), len(metrics), cells), np.nan)
+        for index, patient_id in enumerate(patient_ids):
+            grid = grids[patient_id]
+            values[index, :, :grid.shape[1]] = grid
+        return patient_ids, metrics, values
+
+    def correlations(self, trends_by_patient):
+        """
+        Significant metric pairs per patient.
+
+        Returns ``{patient_id: [(metric_a, metric_b, r, shared_points)]}``
+        for pairs with at least ``min_points`` shared cells and
+        ``|r| >= min_abs_r``.
+        """
+        found = {}
+        for patient_ids, metrics, values in self.batches(trends_by_patient):
+            r, n = stats.pairwise_correlations(values)
+            upper = np.triu(np.ones(r.shape[1:], dtype=bool), k=1)
+            with np.errstate(invalid='ignore'):
+                hits = upper & (n >= self.min_points) & (np.abs(r) >= self.min_abs_r)
+            for batch_index, first, second in zip(*np.nonzero(hits)):
+                found.setdefault(patient_ids[batch_index], []).append((
+                    metrics[first], metrics[second],
+                    float(r[batch_index, first, second]), int(n[batch_index, first, second]),
+                ))
+        return found
+
+    def insights(self, patient, trends, pairs):
+        """Pending CORRELATION insights for one patient's significant pairs."""
+        trends = {trend.metric_name: trend for trend in trends}
+        return [
+            correlation_insight(patient, trends[first], trends[second], r, points, self.grid_days)
+            for first, second, r, points in pairs
+        ]
+
+    def patient_insights(self, patient, trends):
+        """Pending CORRELATION insights for one patient's current trends."""
+        pairs = self.correlations({patient.id: trends}).get(patient.id, [])
+        return self.insights(patient, trends, pairs)
+
+
+def _out_of_range(trend):
+    value = trend.current_value
+    return value is not None and (
+        (trend.normal_range_min is not None and value < trend.normal_range_min)
+        or (trend.normal_range_max is not None and value > trend.normal_range_max)
+    )
+
+
+def _movement(first, second, r):
+    """Describe how two correlated trends move."""
+    directions = (first.trend_direction, second.trend_direction)
+    words = {'INCREASING': 'rising', 'DECREASING': 'falling'}
+    if r > 0 and directions[0] == directions[1] and directions[0] in words:
+        return f'{first.metric_name} and {second.metric_name} have been {words[directions[0]]} together'
+    if r < 0 and set(directions) == {'INCREASING', 'DECREASING'}:
+        return (f'{first.metric_name} has been {words[directions[0]]} while '
+                f'{second.metric_name} has been {words[directions[1]]}')
+    if r > 0:
+        return f'{first.metric_name} and {second.metric_name} tend to move together'
+    return f'{first.metric_name} and {second.metric_name} tend to move in opposite directions'
+
+
+def correlation_insight(patient, first, second, r, points, grid_days):
+    """Build the pending insight reporting two correlated metrics."""
+    r = round(r, 2)
+    return PendingInsight(
+        HealthInsight(
+            patient=patient,
+            type=HealthInsight.InsightType.CORRELATION,
+            title=f'{first.metric_name} and {second.metric_name} are {"correlated" if r > 0 else "inversely correlated"}',
+            description=f'{_movement(first, second, r)} (correlation {r:+.2f} across {points} shared {grid_days}-day periods).',
+            severity='MEDIUM' if _out_of_range(first) or _out_of_range(second) else 'LOW',
+            metrics={
+                'metrics': [first.metric_name, second.metric_name],
+                'correlation': r,
+                'shared_points': points,
+                'directions': [first.trend_direction, second.trend_direction],
+            },
+            confidence_score=min(abs(r), 1.0),
+        ),
+        subject=f'{first.metric_name}~{second.metric_name}',
+        inputs={
+            'correlation': r,
+            'shared_points': points,
+            'directions': [first.trend_direction, second.trend_direction],
+            'out_of_range': [_out_of_range(first), _out_of_range(second)],
+        },
+    )
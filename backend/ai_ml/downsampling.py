@@ -0,0 +1,112 @@
+"""
+Downsampling of HealthTrend series for chart rendering.
+
+Long-tracked metrics accumulate thousands of data points while a chart
+needs about a hundred. A series is reduced either with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the points that
+preserve the visual shape, or to min/max/mean buckets per calendar week,
+month or year.
+"""
+import numpy as np
+
+RESOLUTIONS = ('lttb', 'week', 'month', 'year')
+CALENDAR_UNITS = {'month': 'M', 'year': 'Y'}
+
+DEFAULT_POINTS = 100
+MIN_POINTS = 3
+MAX_POINTS = 2000
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the ``threshold`` points LTTB keeps from a series sorted by x.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the mean of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+
+    # Bucket edges over the interior points; bucket i spans edges[i]:edges[i + 1]
+    edges = (np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / sizes
+    # The last bucket looks ahead to the final point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def bucket_starts(days, period):
+    """First day (epoch days) of the calendar week (Monday), month or year of each day."""
+    days = np.asarray(days, dtype=np.int64)
+    if period == 'week':
+        # 1970-01-01 was a Thursday
+        return days - (days + 3) % 7
+    unit = CALENDAR_UNITS[period]
+    return days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype('datetime64[D]').astype(np.int64)
+
+
+def bucket_aggregates(days, values, period):
+    """
+    Min, max, mean and count of a date-sorted series per calendar period.
+
+    Returns parallel arrays keyed ``start``, ``min``, ``max``, ``mean`` and
+    ``count``, one entry per non-empty period.
+    """
+    starts = bucket_starts(days, period)
+    boundaries = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    counts = np.diff(np.r_[boundaries, len(values)])
+    return {
+        'start': starts[boundaries],
+        'min': np.minimum.reduceat(values, boundaries),
+        'max': np.maximum.reduceat(values, boundaries),
+        'mean': np.add.reduceat(values, boundaries) / counts,
+        'count': counts,
+    }
+
+
+def downsample_trend(trend, resolution='lttb', points=DEFAULT_POINTS):
+    """
+    A trend's data points at the requested resolution.
+
+    ``lttb`` returns at most ``points`` of the stored data points; calendar
+    resolutions return one ``{date, min, max, mean, count}`` bucket per
+    period, dated by the period's first day.
+    """
+    data_points = trend.data_points
+    result = {'resolution': resolution, 'source_count': len(data_points)}
+    if not data_points:
+        return {**result, 'points': []}
+
+    days = np.array([point['date'] for point in data_points], dtype='datetime64[D]').astype(np.int64)
+    values = np.array([point['value'] for point in data_points], dtype=np.float64)
+
+    if resolution == 'lttb':
+        kept = lttb_indices(days.astype(np.float64), values, points)
+        return {**result, 'points': [data_points[index] for index in kept]}
+
+    buckets = bucket_aggregates(days, values, resolution)
+    iso_dates = buckets['start'].astype('datetime64[D]').astype(str)
+    return {**result, 'points': [
+        {'date': day, 'min': float(low), 'max': float(high), 'mean': float(mean), 'count': int(count)}
+        for day, low, high, mean, count in zip(
+            iso_dates, buckets['min'], buckets['max'], buckets['mean'], buckets['count']
+        )
+    ]}
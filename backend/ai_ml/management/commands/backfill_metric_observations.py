@@ -0,0 +1,49 @@
+"""
+Populate HealthMetricObservation rows for already processed health records.
+"""
+from django.core.management.base import BaseCommand
+from core.models import HealthRecord
+from ai_ml.models import HealthMetricObservation
+from ai_ml.services import ObservationWriter
+
+
+class Command(BaseCommand):
+    help = 'Backfill metric observations from the extracted_values of PROCESSED records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of records read per batch')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Replace existing observations (e.g. after metric registry changes)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        records = HealthRecord.objects.filter(
+            status=HealthRecord.RecordStatus.PROCESSED
+        ).only('id', 'patient_id', 'record_date', 'extracted_values').order_by('id')
+
+        last_id = 0
+        scanned = written = 0
+        while True:
+            chunk = list(records.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            observations = [
+                observation
+                for record in chunk
+                for observation in ObservationWriter.build(record)
+            ]
+            if options['rebuild']:
+                HealthMetricObservation.objects.filter(record_id__in=[record.id for record in chunk]).delete()
+            # Existing (record, metric) rows are kept, so the command can be re-run
+            HealthMetricObservation.objects.bulk_create(observations, ignore_conflicts=True)
+
+            scanned += len(chunk)
+            written += len(observations)
+            self.stdout.write(f'Scanned {scanned} records')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled observations from {scanned} records ({written} values)'
+        ))
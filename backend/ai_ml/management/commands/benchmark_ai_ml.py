@@ -0,0 +1,76 @@
+"""
+Benchmark the analysis pipeline on synthetic patients and compare runs.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ai_ml.benchmarks.suite import OPERATIONS, compare_reports, load_report, run_suite, save_report
+from ai_ml.benchmarks.synthetic import generate_cohort, select_metrics
+
+
+class Command(BaseCommand):
+    help = 'Time HealthAnalyzer and PredictiveModel operations (wall time, queries, peak memory)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=5, help='Synthetic patients')
+        parser.add_argument('--records', type=int, default=200, help='Records per patient')
+        parser.add_argument('--metrics', type=int, default=10, help='Metrics per record')
+        parser.add_argument('--interval-days', type=int, default=7, help='Days between records')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed passes per operation')
+        parser.add_argument('--operation', action='append', dest='operations', choices=sorted(OPERATIONS),
+                            help='Restrict to an operation (repeatable)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='Baseline JSON report to compare against')
+        parser.add_argument('--fail-threshold', type=float,
+                            help='Fail when wall time regresses by more than this percentage')
+
+    def handle(self, *args, **options):
+        baseline = load_report(options['compare']) if options['compare'] else None
+        scenario = {
+            'patients': options['patients'],
+            'records_per_patient': options['records'],
+            'metrics': options['metrics'],
+            'interval_days': options['interval_days'],
+        }
+
+        # Synthetic data and analysis results are rolled back afterwards
+        with transaction.atomic():
+            patients = generate_cohort(
+                options['patients'] * options['records'],
+                n_patients=options['patients'],
+                metrics=select_metrics(options['metrics']),
+                interval_days=options['interval_days'],
+            )
+            report = run_suite(patients, scenario, options['repeat'], options['operations'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{scenario['patients']} patients x {scenario['records_per_patient']} records x "
+            f"{scenario['metrics']} metrics on {report['environment']['database']}"
+        )
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<22} {result['wall_ms']:9.1f} ms  (median {result['wall_ms_median']:.1f})  "
+                f"{result['queries']:>5} queries  {result['peak_kib']:9.1f} KiB peak"
+            )
+
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if baseline is None:
+            return
+        if baseline.get('scenario') != scenario:
+            self.stdout.write(self.style.WARNING('Baseline was recorded with a different scenario'))
+
+        regressions = []
+        for name, fields in compare_reports(baseline, report).items():
+            self.stdout.write(f'{name:<22} ' + '  '.join(
+                f"{field} {values['change_pct']:+.1f}%" if values['change_pct'] is not None else f'{field} n/a'
+                for field, values in fields.items()
+            ))
+            change = fields['wall_ms']['change_pct']
+            if options['fail_threshold'] is not None and change is not None and change > options['fail_threshold']:
+                regressions.append(f'{name} ({change:+.1f}%)')
+
+        if regressions:
+            raise CommandError(f"Wall time regressed beyond {options['fail_threshold']}%: {', '.join(regressions)}")
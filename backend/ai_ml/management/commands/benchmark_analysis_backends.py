@@ -0,0 +1,56 @@
+"""
+Compare HealthAnalyzer statistics backends on a synthetic patient.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from ai_ml.backends import BACKENDS
+from ai_ml.benchmarks.synthetic import generate_cohort
+from ai_ml.services import AnomalyDetector, HealthAnalyzer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark trend and anomaly analysis across statistics backends (synthetic data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=10000,
+                            help='Number of synthetic records for the benchmark patient')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Timed runs per backend; the best is reported')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Generating {options['records']} synthetic records...")
+            patient = generate_cohort(options['records'])[0]
+
+            for name, backend_class in BACKENDS.items():
+                if name == 'postgres' and connection.vendor != 'postgresql':
+                    self.stdout.write(self.style.WARNING(f'Skipping {name}: database is {connection.vendor}'))
+                    continue
+                self.run_backend(name, backend_class, patient, options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def run_backend(self, name, backend_class, patient, repeat):
+        analyzer = HealthAnalyzer(patient)
+        analyzer._backend = backend_class(analyzer)
+        detector = AnomalyDetector(HealthAnalyzer.NORMAL_RANGES)
+
+        for label, operation in (
+            ('trend statistics', analyzer.backend.trend_statistics),
+            ('anomalies', lambda: analyzer.backend.detect_anomalies(detector)),
+        ):
+            timings = []
+            for _ in range(repeat):
+                analyzer._metric_matrix = None  # Measure the load, not a warm matrix
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    result = operation()
+                    timings.append(time.perf_counter() - started)
+
+            self.stdout.write(
+                f'{name:<10} {label:<18} best {min(timings) * 1000:8.1f} ms  '
+                f'{len(queries)} queries  {len(result)} results'
+            )
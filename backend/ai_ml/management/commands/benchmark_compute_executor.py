@@ -0,0 +1,33 @@
+"""
+Benchmark analysis kernel throughput across compute executors.
+"""
+import os
+
+from django.core.management.base import BaseCommand
+from ai_ml.benchmarks.compute import run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure analysis throughput in process and with process pools of increasing size'
+
+    def add_arguments(self, parser):
+        cores = os.cpu_count() or 1
+        default_workers = sorted({1, 2, max(cores // 2, 1), cores})
+        parser.add_argument('--workers', type=lambda value: [int(part) for part in value.split(',')],
+                            default=default_workers, help='Comma-separated pool sizes to compare')
+        parser.add_argument('--patients', type=int, default=200, help='Synthetic patients to analyze')
+        parser.add_argument('--metrics', type=int, default=10, help='Metrics per patient')
+        parser.add_argument('--length', type=int, default=2000, help='Observations per metric')
+        parser.add_argument('--concurrency', type=int, help='Concurrent request threads (default: largest pool)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['patients']} patients x {options['metrics']} metrics x {options['length']} "
+            f"observations on {os.cpu_count()} cores"
+        )
+        for row in run_benchmark(options['workers'], options['patients'], options['metrics'],
+                                 options['length'], options['concurrency']):
+            self.stdout.write(
+                f"{row['backend']:<10} workers {row['workers']:>3}  "
+                f"{row['patients_per_second']:8.1f} patients/s  x{row['speedup']:.2f}"
+            )
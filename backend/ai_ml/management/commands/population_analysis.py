@@ -0,0 +1,62 @@
+"""
+Start, resume or report on sharded population analysis runs.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from ai_ml.models import PopulationRun, PopulationShard
+from ai_ml.population import (
+    ShardProcessor, create_population_run, finish_population_run, start_population_run
+)
+
+
+class Command(BaseCommand):
+    help = 'Start (or resume) a sharded population analysis run, or report on one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard-size', type=int, help='Patients per shard for a new run')
+        parser.add_argument('--max-concurrent', type=int, help='Maximum shards running at once for a new run')
+        parser.add_argument('--inline', action='store_true',
+                            help='Process shards in this process instead of on Celery workers')
+        parser.add_argument('--report', type=int, nargs='?', const=0, metavar='RUN_ID',
+                            help='Report on a run (latest when no id is given) instead of starting one')
+
+    def handle(self, *args, **options):
+        if options['report'] is not None:
+            self.report(options['report'])
+            return
+
+        if options['inline']:
+            run = self.run_inline(options)
+            self.report(run.id)
+            return
+
+        run, created = start_population_run(options['shard_size'], options['max_concurrent'])
+        self.stdout.write(f"{'Started' if created else 'Resumed'} population run {run.id} ({run.total_shards} shards)")
+
+    def run_inline(self, options):
+        run = PopulationRun.objects.filter(status=PopulationRun.RunStatus.RUNNING).order_by('created_at').first()
+        if run is None:
+            run = create_population_run(options['shard_size'], options['max_concurrent'])
+
+        pending = run.shards.exclude(status__in=[PopulationShard.ShardStatus.SUCCESS, PopulationShard.ShardStatus.FAILURE])
+        for shard in pending.order_by('index'):
+            self.stdout.write(f'Processing shard {shard.index} (patients {shard.first_patient_id}-{shard.last_patient_id})')
+            ShardProcessor(shard).process()
+        finish_population_run(run)
+        return run
+
+    def report(self, run_id):
+        run = (PopulationRun.objects.filter(id=run_id) if run_id else PopulationRun.objects.all()).first()
+        if run is None:
+            raise CommandError('No population run found')
+
+        self.stdout.write(
+            f'Run {run.id}: {run.status}, {run.total_shards} shards, {run.patients_processed} patients, '
+            f'{run.trends_count} trends, {run.anomalies_count} anomalies, {run.risks_count} risks, '
+            f'{run.correlations_count} correlations'
+        )
+        for shard in run.shards.all():
+            throughput = f'{shard.throughput:.1f}/s' if shard.throughput else '-'
+            self.stdout.write(
+                f'  shard {shard.index:>4} {shard.status:<8} patients {shard.patients_processed:>6} '
+                f'in {shard.duration_seconds:8.1f}s ({throughput}) attempts {shard.attempts}'
+            )
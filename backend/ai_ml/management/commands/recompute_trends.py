@@ -0,0 +1,37 @@
+"""
+Recompute HealthTrend rows for the whole patient population in chunks.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from ai_ml.cohort import CohortRiskEngine, CohortTrendEngine, iter_patient_chunks
+
+
+class Command(BaseCommand):
+    help = 'Recompute health trends (and optionally risks) for all patients in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of patients processed per batch')
+        parser.add_argument('--patient', type=int, action='append', dest='patient_ids',
+                            help='Restrict to a patient id (repeatable)')
+        parser.add_argument('--risks', action='store_true',
+                            help='Also reassess health risks with the rule engine')
+
+    def handle(self, *args, **options):
+        engine = CohortTrendEngine()
+        risk_engine = CohortRiskEngine() if options['risks'] else None
+        started = time.monotonic()
+        patients = trends = risks = 0
+
+        for chunk in iter_patient_chunks(options['chunk_size'], options['patient_ids']):
+            trends += engine.run(chunk)
+            if risk_engine:
+                risks += risk_engine.run(chunk)
+            patients += len(chunk)
+            self.stdout.write(f'Processed {patients} patients ({trends} trends, {risks} risks)')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {trends} trends and {risks} risks for {patients} patients in {elapsed:.1f}s'
+        ))
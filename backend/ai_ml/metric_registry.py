@@ -0,0 +1,247 @@
+"""
+Canonical lab metric registry.
+
+``data/metrics.json`` lists every metric the analysis understands: its code
+(the name used for observations, trends and risk rules), unit, normal range,
+the synonyms labs use for it and optionally its trend estimator. Names are
+matched through a precompiled hash index of normalized strings, so
+resolving an ``extracted_values`` key is one dict lookup (two when it ends
+in a bracketed unit). An Aho-Corasick automaton over the synonyms finds
+metric mentions in free OCR text.
+
+The registry is loaded once per process and reloaded automatically when
+the file changes, or explicitly with ``reload_metric_registry()``.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from .stats import TREND_ESTIMATORS
+
+DEFAULT_REGISTRY_PATH = Path(__file__).resolve().parent / 'data' / 'metrics.json'
+
+# Seconds between checks of the registry file's modification time
+RELOAD_CHECK_INTERVAL = 5
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+# A trailing bracketed unit, e.g. 'Creatinine (mg/dL)' or 'Platelets [/uL]'
+_UNIT_SUFFIX = re.compile(r'\s*[(\[][^()\[\]]*[)\]]\s*$')
+
+
+def normalize_metric_name(name):
+    """Case-, accent- and punctuation-insensitive key ('Hb A1c' -> 'hba1c')."""
+    return _NON_ALNUM.sub('', unicodedata.normalize('NFKC', str(name)).casefold())
+
+
+def _tokenize(text):
+    """Casefolded text with every run of non-alphanumerics collapsed to one space."""
+    return ' ' + _NON_ALNUM.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip() + ' '
+
+
+class MetricDefinition:
+    """One canonical metric."""
+
+    __slots__ = ('code', 'unit', 'normal_range', 'synonyms', 'trend_estimator')
+
+    def __init__(self, code, unit='', normal_range=(None, None), synonyms=(), trend_estimator=None):
+        if trend_estimator is not None and trend_estimator not in TREND_ESTIMATORS:
+            raise ValueError(f"Unknown trend estimator '{trend_estimator}' for metric {code}")
+        self.code = code
+        self.unit = unit
+        self.normal_range = tuple(normal_range)
+        self.synonyms = list(synonyms)
+        self.trend_estimator = trend_estimator  # None: AI_ML_TREND_ESTIMATOR
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: every pattern occurrence in one pass over the text."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(pattern), value))
+
+        # Breadth-first failure links; outputs inherit their fallback's matches
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                if state == 0:
+                    continue  # Depth-1 states fall back to the root
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter_matches(self, text):
+        """Yield ``(start, end, value)`` for every pattern occurrence."""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, value in self.output[state]:
+                yield index + 1 - length, index + 1, value
+
+
+class MetricRegistry:
+    """Canonical metrics with a normalized-name index."""
+
+    def __init__(self, definitions):
+        self.metrics = {}
+        self._index = {}
+        for definition in definitions:
+            self.metrics[definition.code] = definition
+            for name in [definition.code] + definition.synonyms:
+                key = normalize_metric_name(name)
+                existing = self._index.setdefault(key, definition.code)
+                if existing != definition.code:
+                    raise ValueError(f"Metric name '{name}' is ambiguous: {existing} and {definition.code}")
+
+        self.normal_ranges = {code: definition.normal_range for code, definition in self.metrics.items()}
+        self._automaton = None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as registry_file:
+            data = json.load(registry_file)
+        return cls([
+            MetricDefinition(
+                metric['code'],
+                unit=metric.get('unit', ''),
+                normal_range=metric.get('normal_range', (None, None)),
+                synonyms=metric.get('synonyms', ()),
+                trend_estimator=metric.get('trend_estimator'),
+            )
+            for metric in data['metrics']
+        ])
+
+    def resolve(self, name):
+        """Canonical code for a metric name or synonym (optionally with a bracketed unit), or None."""
+        code = self._index.get(normalize_metric_name(name))
+        if code is None:
+            without_unit = _UNIT_SUFFIX.sub('', str(name))
+            if without_unit != str(name):
+                code = self._index.get(normalize_metric_name(without_unit))
+        return code
+
+    def canonicalize(self, values):
+        """
+        Re-key a ``{name: value}`` mapping by canonical code.
+
+        Unknown names are kept as they are; when several names resolve to
+        the same code the first one wins.
+        """
+        canonical = {}
+        for name, value in values.items():
+            canonical.setdefault(self.resolve(name) or name, value)
+        return canonical
+
+    def unit(self, code):
+        definition = self.metrics.get(code)
+        return definition.unit if definition else ''
+
+    def trend_estimator(self, code):
+        """The metric's trend estimator, or the AI_ML_TREND_ESTIMATOR default."""
+        definition = self.metrics.get(code)
+        return (definition and definition.trend_estimator) or settings.AI_ML_TREND_ESTIMATOR
+
+    @property
+    def automaton(self):
+        """Aho-Corasick automaton over tokenized names, built on first use."""
+        if self._automaton is None:
+            patterns = {}
+            for code, definition in self.metrics.items():
+                for name in [code] + definition.synonyms:
+                    patterns.setdefault(_tokenize(name), code)
+            self._automaton = AhoCorasick(patterns)
+        return self._automaton
+
+    def find_in_text(self, text):
+        """
+        Metric mentions in free text as ``(code, start, end)`` over the
+        tokenized text, keeping the leftmost-longest non-overlapping matches.
+        """
+        matches = sorted(
+            self.automaton.iter_matches(_tokenize(text)),
+            key=lambda match: (match[0], -(match[1] - match[0]))
+        )
+        found = []
+        last_end = 0
+        for start, end, code in matches:
+            # Patterns carry their surrounding spaces; adjacent mentions share one
+            if start >= last_end - 1:
+                found.append((code, start + 1, end - 1))
+                last_end = end
+        return found
+
+
+_lock = threading.Lock()
+_registry = None
+_loaded_mtime = None
+_checked_at = 0.0
+
+
+def _registry_path():
+    return getattr(settings, 'AI_ML_METRIC_REGISTRY_PATH', None) or DEFAULT_REGISTRY_PATH
+
+
+def reload_metric_registry():
+    """Load the registry file now and make it the process-wide registry."""
+    global _registry, _loaded_mtime, _checked_at
+    path = _registry_path()
+    with _lock:
+        mtime = os.stat(path).st_mtime
+        _registry = MetricRegistry.from_file(path)
+        _loaded_mtime = mtime
+        _checked_at = time.monotonic()
+    return _registry
+
+
+def get_metric_registry():
+    """The process-wide registry, reloaded if its file changed since loading."""
+    global _checked_at
+    if _registry is None:
+        return reload_metric_registry()
+
+    now = time.monotonic()
+    if now - _checked_at >= RELOAD_CHECK_INTERVAL:
+        _checked_at = now
+        try:
+            if os.stat(_registry_path()).st_mtime != _loaded_mtime:
+                return reload_metric_registry()
+        except OSError:
+            pass  # Keep serving the loaded registry
+    return _registry
+
+
+def metric_registry_version():
+    """Modification time of the registry file the current registry was loaded from."""
+    get_metric_registry()
+    return _loaded_mtime
+
+
+class RegistryNormalRanges:
+    """Class attribute resolving to the current registry's normal ranges."""
+
+    def __get__(self, instance, owner):
+        return get_metric_registry().normal_ranges
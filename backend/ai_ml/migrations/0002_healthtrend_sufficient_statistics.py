@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-15 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthtrend",
+            name="first_value",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="healthtrend",
+            name="sample_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="healthtrend",
+            name="sum_x",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="healthtrend",
+            name="sum_xx",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="healthtrend",
+            name="sum_xy",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="healthtrend",
+            name="sum_y",
+            field=models.FloatField(default=0.0),
+        ),
+    ]
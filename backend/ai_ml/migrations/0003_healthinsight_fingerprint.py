@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-15 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0002_healthtrend_sufficient_statistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthinsight",
+            name="fingerprint",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="healthinsight",
+            name="subject_key",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="healthinsight",
+            index=models.Index(
+                fields=["patient", "is_active", "subject_key"],
+                name="health_insi_patient_fc8f8b_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-15 17:47
+
+from django.db import migrations, models
+
+
+def backfill_running_variance(apps, schema_editor):
+    """Seed Welford statistics from the stored data points."""
+    HealthTrend = apps.get_model("ai_ml", "HealthTrend")
+    batch = []
+    for trend in HealthTrend.objects.only("id", "data_points").iterator(chunk_size=500):
+        values = [point["value"] for point in trend.data_points]
+        if not values:
+            continue
+        mean = sum(values) / len(values)
+        trend.running_mean = mean
+        trend.running_m2 = sum((value - mean) ** 2 for value in values)
+        batch.append(trend)
+        if len(batch) >= 500:
+            HealthTrend.objects.bulk_update(batch, ["running_mean", "running_m2"])
+            batch = []
+    if batch:
+        HealthTrend.objects.bulk_update(batch, ["running_mean", "running_m2"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0003_healthinsight_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthtrend",
+            name="running_m2",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="healthtrend",
+            name="running_mean",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(backfill_running_variance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-15 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "__first__"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("ai_ml", "0005_analysisjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HealthMetricObservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("metric_code", models.CharField(max_length=100)),
+                ("observed_on", models.DateField()),
+                ("value", models.FloatField()),
+                ("unit", models.CharField(blank=True, max_length=20)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metric_observations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "record",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metric_observations",
+                        to="core.healthrecord",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "health_metric_observations",
+                "indexes": [
+                    models.Index(
+                        fields=["patient", "metric_code", "observed_on"],
+                        include=("value", "record"),
+                        name="metric_obs_patient_range_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="healthmetricobservation",
+            constraint=models.UniqueConstraint(
+                fields=("record", "metric_code"),
+                name="unique_record_metric_observation",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0006_healthmetricobservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthtrend",
+            name="forecast_fit",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
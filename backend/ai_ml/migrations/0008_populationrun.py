@@ -0,0 +1,114 @@
+# Generated by Django 4.2.7 on 2026-10-15 17:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0007_healthtrend_forecast_fit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PopulationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("RUNNING", "Running"),
+                            ("SUCCESS", "Success"),
+                            ("FAILURE", "Failure"),
+                        ],
+                        default="RUNNING",
+                        max_length=20,
+                    ),
+                ),
+                ("shard_size", models.PositiveIntegerField()),
+                ("max_concurrent_shards", models.PositiveSmallIntegerField()),
+                ("total_shards", models.PositiveIntegerField(default=0)),
+                ("patients_processed", models.PositiveIntegerField(default=0)),
+                ("trends_count", models.PositiveIntegerField(default=0)),
+                ("risks_count", models.PositiveIntegerField(default=0)),
+                ("anomalies_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "population_runs",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="PopulationShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveIntegerField()),
+                ("first_patient_id", models.PositiveIntegerField()),
+                ("last_patient_id", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("SUCCESS", "Success"),
+                            ("FAILURE", "Failure"),
+                        ],
+                        default="PENDING",
+                        max_length=20,
+                    ),
+                ),
+                ("checkpoint_patient_id", models.PositiveIntegerField(default=0)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("task_id", models.CharField(blank=True, max_length=255)),
+                ("error", models.TextField(blank=True)),
+                ("patients_processed", models.PositiveIntegerField(default=0)),
+                ("trends_count", models.PositiveIntegerField(default=0)),
+                ("risks_count", models.PositiveIntegerField(default=0)),
+                ("anomalies_count", models.PositiveIntegerField(default=0)),
+                ("duration_seconds", models.FloatField(default=0.0)),
+                ("throughput", models.FloatField(blank=True, null=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="ai_ml.populationrun",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "population_shards",
+                "ordering": ["run", "index"],
+                "indexes": [
+                    models.Index(
+                        fields=["run", "status"], name="population__run_id_2f0f51_idx"
+                    )
+                ],
+                "unique_together": {("run", "index")},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-15 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0008_populationrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="populationrun",
+            name="correlations_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="populationshard",
+            name="correlations_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="healthinsight",
+            name="type",
+            field=models.CharField(
+                choices=[
+                    ("TREND", "Trend Analysis"),
+                    ("RISK", "Risk Assessment"),
+                    ("ANOMALY", "Anomaly Detection"),
+                    ("PREDICTION", "Health Prediction"),
+                    ("RECOMMENDATION", "Recommendation"),
+                    ("CORRELATION", "Metric Correlation"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-15 18:20
+
+from datetime import date
+
+from django.db import migrations
+
+
+def _rebuild_regression_sums(apps, day_based):
+    HealthTrend = apps.get_model("ai_ml", "HealthTrend")
+    fields = ["sum_x", "sum_xy", "sum_xx"]
+    batch = []
+    for trend in HealthTrend.objects.only("id", "data_points").iterator(chunk_size=500):
+        points = trend.data_points
+        if not points:
+            continue
+        if day_based:
+            first = date.fromisoformat(points[0]["date"])
+            xs = [float((date.fromisoformat(point["date"]) - first).days) for point in points]
+        else:
+            xs = [float(index) for index in range(len(points))]
+        trend.sum_x = sum(xs)
+        trend.sum_xy = sum(x * point["value"] for x, point in zip(xs, points))
+        trend.sum_xx = sum(x * x for x in xs)
+        batch.append(trend)
+        if len(batch) >= 500:
+            HealthTrend.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        HealthTrend.objects.bulk_update(batch, fields)
+
+
+def regress_on_days(apps, schema_editor):
+    """Rebuild the regression sums with x in days since each trend's first observation."""
+    _rebuild_regression_sums(apps, day_based=True)
+
+
+def regress_on_index(apps, schema_editor):
+    _rebuild_regression_sums(apps, day_based=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0009_healthinsight_correlation"),
+    ]
+
+    operations = [
+        migrations.RunPython(regress_on_days, regress_on_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-15 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0010_healthtrend_day_regression"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="analysisjob",
+            name="unique_in_flight_analysis_job",
+        ),
+        migrations.AddConstraint(
+            model_name="analysisjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "PENDING")),
+                fields=("patient", "signature"),
+                name="unique_pending_analysis_job",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-15 19:05
+
+from django.db import migrations
+
+
+def deactivate_unkeyed_insights(apps, schema_editor):
+    """Retire insights generated before fingerprinting; the next analysis regenerates them keyed."""
+    HealthInsight = apps.get_model("ai_ml", "HealthInsight")
+    HealthInsight.objects.filter(is_active=True, subject_key="").update(is_active=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ai_ml", "0011_analysisjob_unique_pending"),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_unkeyed_insights, migrations.RunPython.noop),
+    ]
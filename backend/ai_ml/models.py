@@ -1,6 +1,8 @@
 """
 AI/ML models for health insights and predictive analytics.
 """
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import HealthRecord
@@ -17,6 +19,7 @@ class HealthInsight(models.Model):
         ANOMALY = 'ANOMALY', 'Anomaly Detection'
         PREDICTION = 'PREDICTION', 'Health Prediction'
         RECOMMENDATION = 'RECOMMENDATION', 'Recommendation'
+        CORRELATION = 'CORRELATION', 'Metric Correlation'
     
     class Severity(models.TextChoices):
         LOW = 'LOW', 'Low'
@@ -45,6 +48,10 @@ class HealthInsight(models.Model):
     confidence_score = models.FloatField(default=0.0, help_text="Confidence score (0-1)")
     is_active = models.BooleanField(default=True)
     
+    # Regeneration identity
+    subject_key = models.CharField(max_length=255, blank=True)  # e.g. 'TREND:HbA1c'
+    fingerprint = models.CharField(max_length=64, blank=True)  # SHA-256 of the generating inputs
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -55,6 +62,7 @@ class HealthInsight(models.Model):
         indexes = [
             models.Index(fields=['patient', '-created_at']),
             models.Index(fields=['type', 'severity']),
+            models.Index(fields=['patient', 'is_active', 'subject_key']),
         ]
     
     def __str__(self):
@@ -86,6 +94,19 @@ class HealthTrend(models.Model):
     max_value = models.FloatField(null=True, blank=True)
     change_percentage = models.FloatField(null=True, blank=True)  # Percentage change
     
+    # Running sufficient statistics (x is days since the first observation, y the value)
+    sample_count = models.PositiveIntegerField(default=0)
+    sum_x = models.FloatField(default=0.0)
+    sum_y = models.FloatField(default=0.0)
+    sum_xy = models.FloatField(default=0.0)
+    sum_xx = models.FloatField(default=0.0)
+    first_value = models.FloatField(null=True, blank=True)  # current_value holds the last value
+    running_mean = models.FloatField(default=0.0)  # Welford mean of y
+    running_m2 = models.FloatField(default=0.0)  # Welford sum of squared deviations of y
+    
+    # Cached date-based regression used for forecasting; cleared whenever data_points change
+    forecast_fit = models.JSONField(null=True, blank=True)
+    
     # Normal Range
     normal_range_min = models.FloatField(null=True, blank=True)
     normal_range_max = models.FloatField(null=True, blank=True)
@@ -105,6 +126,40 @@ class HealthTrend(models.Model):
         return f"{self.metric_name} Trend - {self.patient.get_full_name()}"
 
 
+class HealthMetricObservation(models.Model):
+    """A single numeric metric value extracted from a processed health record."""
+    
+    # Ownership
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='metric_observations')
+    record = models.ForeignKey(HealthRecord, on_delete=models.CASCADE, related_name='metric_observations')
+    
+    # Observation
+    metric_code = models.CharField(max_length=100)  # Metric key, matches HealthTrend.metric_name
+    observed_on = models.DateField()  # record_date of the source record
+    value = models.FloatField()
+    unit = models.CharField(max_length=20, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'health_metric_observations'
+        indexes = [
+            # Covers per-metric range scans without touching the heap on PostgreSQL
+            models.Index(
+                fields=['patient', 'metric_code', 'observed_on'],
+                include=['value', 'record'],
+                name='metric_obs_patient_range_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['record', 'metric_code'], name='unique_record_metric_observation'),
+        ]
+    
+    def __str__(self):
+        return f"{self.metric_code}={self.value} ({self.observed_on})"
+
+
 class HealthRisk(models.Model):
     """Health risk assessments."""
     
@@ -155,3 +210,163 @@ class HealthRisk(models.Model):
     def __str__(self):
         return f"{self.category} Risk - {self.patient.get_full_name()} ({self.risk_level})"
 
+
+class AnalysisJob(models.Model):
+    """Asynchronous analysis run for a patient."""
+    
+    class JobType(models.TextChoices):
+        INSIGHTS = 'INSIGHTS', 'Generate Insights'
+        TRENDS = 'TRENDS', 'Analyze Trends'
+        RISKS = 'RISKS', 'Assess Risks'
+    
+    class JobStatus(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        SUCCESS = 'SUCCESS', 'Success'
+        FAILURE = 'FAILURE', 'Failure'
+    
+    IN_FLIGHT = [JobStatus.PENDING, JobStatus.RUNNING]
+    
+    # Ownership
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analysis_jobs')
+    
+    # Job Info
+    job_type = models.CharField(max_length=20, choices=JobType.choices)
+    params = models.JSONField(default=dict, blank=True)  # e.g. {'metric_name': 'HbA1c'}
+    signature = models.CharField(max_length=255)  # job_type + params; pending jobs are unique per patient
+    task_id = models.CharField(max_length=255, blank=True)  # Celery task id
+    
+    # Progress
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING)
+    progress = models.PositiveSmallIntegerField(default=0)  # 0-100
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'analysis_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', '-created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'signature'],
+                condition=models.Q(status='PENDING'),
+                name='unique_pending_analysis_job',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.job_type} job - {self.patient.get_full_name()} ({self.status})"
+    
+    def _progress_key(self):
+        return f'ai_ml:job:{self.id}:progress'
+    
+    def report_progress(self, progress):
+        """
+        Publish progress while running.
+        
+        Insight generation runs in one transaction, so progress written to
+        the job's row would not be visible until it finishes; it goes
+        through the cache instead. The entry doubles as the job's heartbeat:
+        it expires AI_ML_JOB_STALE_AFTER seconds after the last report.
+        """
+        cache.set(self._progress_key(), progress, timeout=settings.AI_ML_JOB_STALE_AFTER)
+    
+    @property
+    def is_alive(self):
+        """Whether a running job reported progress within AI_ML_JOB_STALE_AFTER."""
+        return cache.get(self._progress_key()) is not None
+    
+    @property
+    def live_progress(self):
+        """Progress of a running job as last reported, otherwise the stored value."""
+        if self.status == self.JobStatus.RUNNING:
+            return cache.get(self._progress_key(), self.progress)
+        return self.progress
+
+
+class PopulationRun(models.Model):
+    """Sharded batch analysis of the whole patient population (e.g. the nightly run)."""
+    
+    class RunStatus(models.TextChoices):
+        RUNNING = 'RUNNING', 'Running'
+        SUCCESS = 'SUCCESS', 'Success'
+        FAILURE = 'FAILURE', 'Failure'
+    
+    status = models.CharField(max_length=20, choices=RunStatus.choices, default=RunStatus.RUNNING)
+    shard_size = models.PositiveIntegerField()  # Patients per shard
+    max_concurrent_shards = models.PositiveSmallIntegerField()
+    total_shards = models.PositiveIntegerField(default=0)
+    
+    # Totals, rolled up from shards when the run finishes
+    patients_processed = models.PositiveIntegerField(default=0)
+    trends_count = models.PositiveIntegerField(default=0)
+    risks_count = models.PositiveIntegerField(default=0)
+    anomalies_count = models.PositiveIntegerField(default=0)
+    correlations_count = models.PositiveIntegerField(default=0)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'population_runs'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Population run {self.id} ({self.status})"
+
+
+class PopulationShard(models.Model):
+    """A contiguous patient id range of a PopulationRun, processed by one task."""
+    
+    class ShardStatus(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        SUCCESS = 'SUCCESS', 'Success'
+        FAILURE = 'FAILURE', 'Failure'
+    
+    run = models.ForeignKey(PopulationRun, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveIntegerField()
+    first_patient_id = models.PositiveIntegerField()  # Inclusive patient id range
+    last_patient_id = models.PositiveIntegerField()
+    
+    # Progress; the checkpoint is the last patient id fully analyzed
+    status = models.CharField(max_length=20, choices=ShardStatus.choices, default=ShardStatus.PENDING)
+    checkpoint_patient_id = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    task_id = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    
+    # Results and reporting
+    patients_processed = models.PositiveIntegerField(default=0)
+    trends_count = models.PositiveIntegerField(default=0)
+    risks_count = models.PositiveIntegerField(default=0)
+    anomalies_count = models.PositiveIntegerField(default=0)
+    correlations_count = models.PositiveIntegerField(default=0)
+    duration_seconds = models.FloatField(default=0.0)  # Accumulated across attempts
+    throughput = models.FloatField(null=True, blank=True)  # Patients per second
+    
+    # Timestamps
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'population_shards'
+        ordering = ['run', 'index']
+        unique_together = ['run', 'index']
+        indexes = [
+            models.Index(fields=['run', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"Shard {self.index} of run {self.run_id} ({self.status})"
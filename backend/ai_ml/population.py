@@ -0,0 +1,172 @@
+"""
+Sharded population analysis.
+
+A PopulationRun splits the ids of patients with PROCESSED records into
+contiguous shards. Shards are fanned out to Celery workers, at most
+``max_concurrent_shards`` at a time, and each runs the cohort trend, anomaly
+and risk engines over its patients in chunks, checkpointing after every
+chunk so a crashed or interrupted shard resumes where it stopped.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .cohort import (
+    CohortAnomalyEngine, CohortCorrelationEngine, CohortRiskEngine, CohortTrendEngine, iter_patient_chunks
+)
+from .models import PopulationRun, PopulationShard
+
+logger = logging.getLogger(__name__)
+
+COUNT_FIELDS = ['patients_processed', 'trends_count', 'risks_count', 'anomalies_count', 'correlations_count']
+
+
+def create_population_run(shard_size=None, max_concurrent_shards=None):
+    """Create a run and its shards from the current patient id space."""
+    shard_size = shard_size or settings.AI_ML_POPULATION_SHARD_SIZE
+    max_concurrent_shards = max_concurrent_shards or settings.AI_ML_POPULATION_MAX_CONCURRENT_SHARDS
+
+    with transaction.atomic():
+        run = PopulationRun.objects.create(
+            shard_size=shard_size,
+            max_concurrent_shards=max_concurrent_shards
+        )
+        shards = [
+            PopulationShard(run=run, index=index, first_patient_id=chunk[0], last_patient_id=chunk[-1])
+            for index, chunk in enumerate(iter_patient_chunks(shard_size))
+        ]
+        PopulationShard.objects.bulk_create(shards)
+        run.total_shards = len(shards)
+        run.save(update_fields=['total_shards', 'updated_at'])
+    return run
+
+
+def start_population_run(shard_size=None, max_concurrent_shards=None):
+    """
+    Resume the run in progress, or start a new one.
+
+    Returns ``(run, created)``. Shards whose worker went quiet for longer
+    than AI_ML_POPULATION_SHARD_STALE_AFTER are requeued from their
+    checkpoint.
+    """
+    run = PopulationRun.objects.filter(status=PopulationRun.RunStatus.RUNNING).order_by('created_at').first()
+    created = run is None
+    if created:
+        run = create_population_run(shard_size, max_concurrent_shards)
+    else:
+        requeue_stale_shards(run)
+    dispatch_shards(run)
+    return run, created
+
+
+def requeue_stale_shards(run):
+    """Return RUNNING shards that stopped reporting progress to PENDING."""
+    stale_before = timezone.now() - timedelta(seconds=settings.AI_ML_POPULATION_SHARD_STALE_AFTER)
+    requeued = run.shards.filter(
+        status=PopulationShard.ShardStatus.RUNNING,
+        updated_at__lt=stale_before
+    ).update(status=PopulationShard.ShardStatus.PENDING, updated_at=timezone.now())
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale shards of population run {run.id}")
+    return requeued
+
+
+def dispatch_shards(run):
+    """
+    Start pending shards up to the run's concurrency limit.
+
+    Dispatch is serialized on the run row, so concurrent callers (finishing
+    shards, the periodic resume task) never exceed the limit.
+    """
+    from .tasks import run_population_shard
+
+    with transaction.atomic():
+        run = PopulationRun.objects.select_for_update().get(id=run.id)
+        if run.status != PopulationRun.RunStatus.RUNNING:
+            return []
+
+        shards = run.shards.all()
+        running = shards.filter(status=PopulationShard.ShardStatus.RUNNING).count()
+        slots = max(run.max_concurrent_shards - running, 0)
+        shard_ids = list(
+            shards.filter(status=PopulationShard.ShardStatus.PENDING)
+            .order_by('index')
+            .values_list('id', flat=True)[:slots]
+        )
+
+        if not shard_ids and not running:
+            finish_population_run(run)
+            return []
+
+        PopulationShard.objects.filter(id__in=shard_ids).update(
+            status=PopulationShard.ShardStatus.RUNNING,
+            updated_at=timezone.now()
+        )
+        for shard_id in shard_ids:
+            transaction.on_commit(lambda shard_id=shard_id: run_population_shard.delay(shard_id))
+    return shard_ids
+
+
+def finish_population_run(run):
+    """Roll shard results up into the run and mark it finished."""
+    totals = run.shards.aggregate(**{field: Sum(field) for field in COUNT_FIELDS})
+    for field in COUNT_FIELDS:
+        setattr(run, field, totals[field] or 0)
+
+    failed = run.shards.filter(status=PopulationShard.ShardStatus.FAILURE).exists()
+    run.status = PopulationRun.RunStatus.FAILURE if failed else PopulationRun.RunStatus.SUCCESS
+    run.finished_at = timezone.now()
+    run.save(update_fields=COUNT_FIELDS + ['status', 'finished_at', 'updated_at'])
+    logger.info(f"Population run {run.id} finished: {run.status}, {run.patients_processed} patients")
+
+
+class ShardProcessor:
+    """Analyze one shard's patients chunk by chunk, checkpointing as it goes."""
+
+    def __init__(self, shard, chunk_size=None):
+        self.shard = shard
+        self.chunk_size = chunk_size or settings.AI_ML_POPULATION_CHUNK_SIZE
+        self.trend_engine = CohortTrendEngine()
+        self.risk_engine = CohortRiskEngine()
+        self.anomaly_engine = CohortAnomalyEngine()
+        self.correlation_engine = CohortCorrelationEngine()
+
+    def remaining_chunks(self):
+        """Chunks of the shard's patients after its checkpoint."""
+        return iter_patient_chunks(
+            self.chunk_size,
+            first_id=max(self.shard.first_patient_id, self.shard.checkpoint_patient_id + 1),
+            last_id=self.shard.last_patient_id
+        )
+
+    def process(self):
+        """Run the shard to completion; returns it with updated counters."""
+        shard = self.shard
+        shard.attempts += 1
+        shard.started_at = shard.started_at or timezone.now()
+        shard.save(update_fields=['attempts', 'started_at', 'updated_at'])
+
+        for chunk in self.remaining_chunks():
+            started = time.monotonic()
+            frame = self.trend_engine.load_observations(chunk)
+            with transaction.atomic():
+                shard.trends_count += self.trend_engine.run(chunk, frame)
+                shard.anomalies_count += self.anomaly_engine.run(chunk, frame)
+                shard.risks_count += self.risk_engine.run(chunk, frame)
+                shard.correlations_count += self.correlation_engine.run(chunk)
+
+                # The checkpoint commits together with the chunk's results
+                shard.patients_processed += len(chunk)
+                shard.checkpoint_patient_id = chunk[-1]
+                shard.duration_seconds += time.monotonic() - started
+                shard.save(update_fields=COUNT_FIELDS + ['checkpoint_patient_id', 'duration_seconds', 'updated_at'])
+
+        shard.status = PopulationShard.ShardStatus.SUCCESS
+        shard.finished_at = timezone.now()
+        shard.throughput = shard.patients_processed / shard.duration_seconds if shard.duration_seconds else None
+        shard.save(update_fields=['status', 'finished_at', 'throughput', 'updated_at'])
+        return shard
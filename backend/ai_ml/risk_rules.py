@@ -0,0 +1,176 @@
+"""
+Declarative health risk rules.
+
+Threshold tables (metric, bands, points, message) and score-based
+recommendations live in ``data/risk_rules.json``. They are compiled into
+NumPy band lookups so a single patient and a whole cohort's latest-value
+matrix are scored by the same ``searchsorted`` calls. The bundled rules are
+compiled once per process and recompiled when the file changes.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+RULES_PATH = Path(__file__).resolve().parent / 'data' / 'risk_rules.json'
+
+# Seconds between checks of the rule file's modification time
+RELOAD_CHECK_INTERVAL = 5
+
+
+def band_threshold(band):
+    """Smallest value a band covers: ``min`` inclusive, or just past ``above``."""
+    if 'above' in band:
+        return np.nextafter(float(band['above']), np.inf)
+    return float(band['min'])
+
+
+class BandRule:
+    """One metric's ascending threshold bands, each worth a number of points."""
+
+    def __init__(self, spec):
+        bands = sorted(spec['bands'], key=band_threshold)
+        self.metric = spec['metric']
+        self.thresholds = np.array([band_threshold(band) for band in bands], dtype=np.float64)
+        # Index 0 is "below every band": no points, no message
+        self.points = np.array([0.0] + [band['points'] for band in bands], dtype=np.float64)
+        self.messages = [None] + [band['message'] for band in bands]
+
+    def band_index(self, values):
+        """Index of the highest band each value reaches (0 for none or missing)."""
+        index = np.searchsorted(self.thresholds, values, side='right')
+        return np.where(np.isnan(values), 0, index)
+
+
+class RiskCategoryRules:
+    """The band rules and recommendations of one HealthRisk category."""
+
+    def __init__(self, spec):
+        self.category = spec['category']
+        self.description = spec['description']
+        self.rules = [BandRule(rule) for rule in spec['rules']]
+        self.recommendations = [
+            (recommendation['min_score'], recommendation['items'])
+            for recommendation in spec.get('recommendations', [])
+        ]
+
+    def recommendations_for(self, score):
+        return [item for min_score, items in self.recommendations if score >= min_score for item in items]
+
+
+class RiskRuleEngine:
+    """Score risk categories from latest metric values."""
+
+    def __init__(self, spec):
+        levels = sorted(spec['levels'], key=lambda level: level['min_score'])
+        self.level_thresholds = np.array([level['min_score'] for level in levels], dtype=np.float64)
+        self.level_names = np.array([level['level'] for level in levels])
+        self.categories = [RiskCategoryRules(category) for category in spec['categories']]
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        with open(path, encoding='utf-8') as rules_file:
+            return cls(json.load(rules_file))
+
+    @classmethod
+    def default(cls):
+        """The engine for the bundled rule file, recompiled if the file changed since compiling."""
+        global _checked_at
+        if _default is None:
+            return _reload_default()
+
+        now = time.monotonic()
+        if now - _checked_at >= RELOAD_CHECK_INTERVAL:
+            _checked_at = now
+            try:
+                if os.stat(RULES_PATH).st_mtime != _loaded_mtime:
+                    return _reload_default()
+            except OSError:
+                pass  # Keep serving the compiled rules
+        return _default
+
+    @property
+    def metrics(self):
+        """Every metric referenced by a rule, in a stable order."""
+        return sorted({rule.metric for category in self.categories for rule in category.rules})
+
+    def evaluate(self, latest, metrics):
+        """
+        Score a matrix of latest values.
+
+        ``latest`` is a (patients, len(metrics)) array with NaN for missing
+        metrics. Returns, per patient, a list of assessment dicts (category,
+        risk_score, risk_level, description, contributing_factors,
+        recommendations) for every category scoring above zero.
+        """
+        latest = np.atleast_2d(np.asarray(latest, dtype=np.float64))
+        column = {metric: index for index, metric in enumerate(metrics)}
+        results = [[] for _ in range(latest.shape[0])]
+
+        for category in self.categories:
+            score = np.zeros(latest.shape[0])
+            matched = []
+            for rule in category.rules:
+                if rule.metric not in column:
+                    continue
+                values = latest[:, column[rule.metric]]
+                index = rule.band_index(values)
+                score += rule.points[index]
+                matched.append((rule, values, index))
+
+            levels = self.level_names[np.searchsorted(self.level_thresholds, score, side='right') - 1]
+            for patient in np.flatnonzero(score > 0):
+                results[patient].append({
+                    'category': category.category,
+                    'risk_score': float(min(score[patient], 100)),
+                    'risk_level': str(levels[patient]),
+                    'description': category.description,
+                    'contributing_factors': [
+                        rule.messages[index[patient]].format(value=float(values[patient]))
+                        for rule, values, index in matched
+                        if index[patient]
+                    ],
+                    'recommendations': category.recommendations_for(score[patient]),
+                })
+        return results
+
+    def latest_row(self, metric_matrix):
+        """One patient's latest value per rule metric (NaN when missing)."""
+        return [
+            float(metric_matrix[metric].values[-1]) if metric in metric_matrix else np.nan
+            for metric in self.metrics
+        ]
+
+    def assess(self, metric_matrix):
+        """Assessments for one patient's MetricMatrix (latest value per metric)."""
+        return self.evaluate([self.latest_row(metric_matrix)], self.metrics)[0]
+
+
+_lock = threading.Lock()
+_default = None
+_loaded_mtime = None
+_checked_at = 0.0
+
+
+def _reload_default():
+    global _default, _loaded_mtime, _checked_at
+    with _lock:
+        mtime = os.stat(RULES_PATH).st_mtime
+        _default = RiskRuleEngine.from_file(RULES_PATH)
+        _loaded_mtime = mtime
+        _checked_at = time.monotonic()
+    return _default
+
+
+def risk_rules_version():
+    """Modification time of the rule file the current default engine was compiled from."""
+    RiskRuleEngine.default()
+    return _loaded_mtime
+
+
+def evaluate_risk_rules(latest, metrics):
+    """Evaluate the bundled rules on a latest-value matrix (executor entry point)."""
+    return RiskRuleEngine.default().evaluate(latest, metrics)
@@ -2,7 +2,7 @@
 Serializers for AI/ML models.
 """
 from rest_framework import serializers
-from .models import HealthInsight, HealthTrend, HealthRisk
+from .models import HealthInsight, HealthTrend, HealthRisk, AnalysisJob
 
 
 class HealthTrendSerializer(serializers.ModelSerializer):
@@ -18,6 +18,13 @@ class HealthTrendSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'last_updated')
 
 
+class HealthTrendSummarySerializer(HealthTrendSerializer):
+    """Health trend without its data points, for lists (see the series endpoint)."""
+    
+    class Meta(HealthTrendSerializer.Meta):
+        fields = tuple(field for field in HealthTrendSerializer.Meta.fields if field != 'data_points')
+
+
 class HealthRiskSerializer(serializers.ModelSerializer):
     """Serializer for health risks."""
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
@@ -41,3 +48,13 @@ class HealthInsightSerializer(serializers.ModelSerializer):
                  'confidence_score', 'is_active', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """Serializer for asynchronous analysis jobs."""
+    progress = serializers.IntegerField(source='live_progress', read_only=True)
+    
+    class Meta:
+        model = AnalysisJob
+        fields = ('id', 'job_type', 'params', 'status', 'progress', 'result',
+                 'error', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
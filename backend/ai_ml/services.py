@@ -1,451 +1,652 @@
 """
 AI/ML services for health analysis and predictions.
 """
+import hashlib
+import json
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.fields.json import KT
 from django.utils import timezone
-from django.contrib.auth import get_user_model
 from core.models import HealthRecord
-from .models import HealthInsight, HealthTrend, HealthRisk
+from .models import HealthInsight, HealthTrend, HealthRisk, HealthMetricObservation
+from . import stats
+from .backends import get_analysis_backend
+from .compute import get_compute_executor
+from .metric_registry import RegistryNormalRanges, get_metric_registry
+from .risk_rules import RiskRuleEngine, evaluate_risk_rules
 
-User = get_user_model()
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_epoch_day(value):
+    """Convert a date to days since 1970-01-01."""
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def from_epoch_day(day):
+    """Convert days since 1970-01-01 back to a date."""
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def is_metric_value(value):
+    """Whether an extracted_values entry is a numeric lab value."""
+    # bool is an int subclass but never a lab value
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def metric_values(extracted_values):
+    """Numeric extracted values keyed by canonical metric code."""
+    return get_metric_registry().canonicalize({
+        name: float(value)
+        for name, value in (extracted_values or {}).items()
+        if is_metric_value(value)
+    })
+
+
+class MetricSeries:
+    """Date-ordered observations of a single metric held as NumPy arrays."""
+    
+    __slots__ = ('dates', 'values', 'record_ids')
+    
+    def __init__(self, dates, values, record_ids):
+        self.dates = dates  # int64 epoch days
+        self.values = values  # float64
+        self.record_ids = record_ids  # int64
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def data_points(self):
+        """Return the series in the JSON shape stored on HealthTrend."""
+        return [
+            {'date': from_epoch_day(day).isoformat(), 'value': float(value), 'record_id': int(record_id)}
+            for day, value, record_id in zip(self.dates, self.values, self.record_ids)
+        ]
+
+
+class MetricMatrix:
+    """All numeric metrics of a record set, keyed by metric name."""
+    
+    def __init__(self, series):
+        self.series = series
+    
+    @classmethod
+    def from_observations(cls, observations):
+        """
+        Build the matrix from HealthMetricObservation rows.
+        
+        Rows are read in (metric_code, observed_on, record) order, which the
+        (patient, metric_code, observed_on) index serves as a range scan, so
+        each metric is one contiguous, date-sorted slice.
+        """
+        rows = list(observations.order_by('metric_code', 'observed_on', 'record_id').values_list(
+            'metric_code', 'observed_on', 'value', 'record_id'
+        ))
+        if not rows:
+            return cls({})
+        
+        codes, observed_on, values, record_ids = zip(*rows)
+        codes = np.asarray(codes, dtype=object)
+        dates = np.fromiter((to_epoch_day(day) for day in observed_on), dtype=np.int64, count=len(rows))
+        values = np.asarray(values, dtype=np.float64)
+        record_ids = np.asarray(record_ids, dtype=np.int64)
+        
+        starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+        stops = np.append(starts[1:], len(rows))
+        return cls({
+            codes[start]: MetricSeries(dates[start:stop], values[start:stop], record_ids[start:stop])
+            for start, stop in zip(starts, stops)
+        })
+    
+    def __contains__(self, metric_name):
+        return metric_name in self.series
+    
+    def __getitem__(self, metric_name):
+        return self.series[metric_name]
+    
+    def __len__(self):
+        return len(self.series)
+    
+    def items(self):
+        return self.series.items()
+
+
+TREND_UPDATE_FIELDS = [
+    'metric_unit', 'data_points', 'trend_direction', 'trend_strength', 'current_value',
+    'average_value', 'min_value', 'max_value', 'change_percentage',
+    'normal_range_min', 'normal_range_max', 'sample_count', 'sum_x', 'sum_y',
+    'sum_xy', 'sum_xx', 'first_value', 'running_mean', 'running_m2',
+    'last_updated',
+]
+
+
+def upsert_trends(trends, batch_size=500):
+    """Insert or update HealthTrend rows keyed on (patient, metric_name)."""
+    return HealthTrend.objects.bulk_create(
+        trends,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['patient', 'metric_name'],
+        update_fields=TREND_UPDATE_FIELDS,
+    )
+
+
+RISK_UPDATE_FIELDS = [
+    'risk_score', 'risk_level', 'description', 'contributing_factors',
+    'recommendations', 'updated_at',
+]
+
+
+def save_risk_assessments(assessments):
+    """
+    Persist rule engine assessments for many patients in bulk.
+    
+    ``assessments`` maps patient id to assessment dicts. Existing
+    (patient, category) risks are updated in place and the rest created,
+    with one read, one bulk update and one bulk insert. Returns HealthRisk
+    objects keyed by patient id.
+    """
+    existing = {
+        (risk.patient_id, risk.category): risk
+        for risk in HealthRisk.objects.filter(patient_id__in=list(assessments))
+    }
+    
+    now = timezone.now()
+    to_update, to_create = [], []
+    risks = {patient_id: [] for patient_id in assessments}
+    for patient_id, items in assessments.items():
+        for assessment in items:
+            risk = existing.get((patient_id, assessment['category']))
+            if risk is None:
+                risk = HealthRisk(patient_id=patient_id, **assessment)
+                to_create.append(risk)
+            else:
+                for field, value in assessment.items():
+                    setattr(risk, field, value)
+                risk.updated_at = now
+                to_update.append(risk)
+            risks[patient_id].append(risk)
+    
+    if to_update:
+        HealthRisk.objects.bulk_update(to_update, RISK_UPDATE_FIELDS, batch_size=500)
+    if to_create:
+        HealthRisk.objects.bulk_create(to_create, batch_size=500)
+    return risks
+
+
+def summarize_trend_statistics(values, span, slope=None):
+    """
+    HealthTrend direction, strength, average and change from its running sums.
+    
+    ``span`` is the days between first and last observation; ``slope``
+    overrides the least-squares slope of the sums (see estimate_trend_slopes).
+    """
+    summary = stats.trend_summary(
+        values['sample_count'], values['sum_x'], values['sum_y'], values['sum_xy'],
+        values['sum_xx'], values['min_value'], values['max_value'],
+        values['first_value'], values['current_value'], span, slope,
+    )
+    return {
+        'average_value': float(summary['average_value']),
+        'trend_strength': float(summary['trend_strength']),
+        'trend_direction': summary['trend_direction'],
+        'change_percentage': float(summary['change_percentage']),
+    }
+
+
+def data_point_series(data_points):
+    """``(x, values)`` arrays of stored data points, x in days since the first one."""
+    days = np.array([point['date'] for point in data_points], dtype='datetime64[D]').astype(np.int64)
+    values = np.array([point['value'] for point in data_points], dtype=np.float64)
+    return (days - days[0]).astype(np.float64), values
+
+
+def estimate_trend_slopes(series_by_metric):
+    """
+    Per-day trend slopes of ``{metric: (x, values)}`` series whose metric
+    is configured for a robust estimator (Theil-Sen or Huber).
+    
+    Each estimator's series run as one padded batch through the compute
+    executor. Least-squares metrics are omitted: their slope comes from
+    the running sums.
+    """
+    registry = get_metric_registry()
+    grouped = {}
+    for metric, series in series_by_metric.items():
+        method = registry.trend_estimator(metric)
+        if method != 'ols':
+            grouped.setdefault(method, []).append((metric, series))
+    if not grouped:
+        return {}
+    
+    slopes = get_compute_executor().run(stats.trend_slopes_batch, {
+        method: [series for _, series in items] for method, items in grouped.items()
+    })
+    return {
+        metric: float(slope)
+        for method, items in grouped.items()
+        for (metric, _), slope in zip(items, slopes[method])
+    }
+
+
+class PendingInsight:
+    """An unsaved insight together with what identifies and drove it."""
+    
+    __slots__ = ('insight', 'subject', 'inputs', 'record_ids')
+    
+    def __init__(self, insight, subject, inputs, record_ids=()):
+        self.insight = insight
+        self.subject = subject  # What the insight is about (metric, category, ...)
+        self.inputs = inputs  # Values that determine the insight's content
+        self.record_ids = list(record_ids)
+    
+    @property
+    def subject_key(self):
+        return f'{self.insight.type}:{self.subject}'
+    
+    def fingerprint(self):
+        """Stable hash of patient, type, subject and inputs."""
+        payload = json.dumps(
+            [self.insight.patient_id, self.insight.type, self.subject, self.inputs],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class InsightWriter:
+    """
+    Upsert generated insights by fingerprint.
+    
+    Each insight is identified by its patient and subject key; its
+    fingerprint captures the inputs that produced it. Only insights whose
+    fingerprint changed are rewritten, and active insights that were not
+    regenerated are deactivated in bulk. Every step uses a constant number
+    of queries, for one patient or a whole cohort chunk.
+    """
+    
+    CONTENT_FIELDS = [
+        'title', 'description', 'severity', 'metrics', 'predictions',
+        'recommendations', 'confidence_score', 'fingerprint', 'updated_at',
+    ]
+    
+    def __init__(self, patient):
+        self.patient = patient
+    
+    def sync(self, pending, deactivate_missing=True):
+        """
+        Persist pending insights; returns (current insights, counts).
+        
+        With ``deactivate_missing=False`` only the pending subjects are
+        touched, which suits adding insights for a single new record.
+        """
+        deactivate_types = HealthInsight.InsightType.values if deactivate_missing else ()
+        return self.sync_patients([self.patient.id], pending, deactivate_types)
+    
+    @classmethod
+    def sync_patients(cls, patient_ids, pending, deactivate_types=()):
+        """
+        Persist pending insights of several patients; returns (current insights, counts).
+        
+        Active insights of ``deactivate_types`` belonging to ``patient_ids``
+        that were not regenerated are deactivated; other insights are only
+        touched when a pending insight replaces them.
+        """
+        deactivate_types = set(deactivate_types)
+        active = HealthInsight.objects.filter(
+            patient_id__in=patient_ids,
+            is_active=True
+        ).exclude(subject_key='').order_by('patient_id', 'subject_key', '-created_at')
+        if deactivate_types != set(HealthInsight.InsightType.values):
+            active = active.filter(
+                Q(type__in=deactivate_types) | Q(subject_key__in={item.subject_key for item in pending})
+            )
+        existing = {}
+        superseded = []
+        for insight in active:
+            key = (insight.patient_id, insight.subject_key)
+            if key in existing:
+                superseded.append(insight.id)
+            else:
+                existing[key] = insight
+        
+        now = timezone.now()
+        current, created, updated = [], [], []
+        for item in pending:
+            insight = item.insight
+            insight.subject_key = item.subject_key
+            insight.fingerprint = item.fingerprint()
+            
+            previous = existing.pop((insight.patient_id, insight.subject_key), None)
+            if previous is None:
+                created.append(item)
+                current.append(insight)
+            elif previous.fingerprint == insight.fingerprint:
+                current.append(previous)
+            else:
+                for field in cls.CONTENT_FIELDS:
+                    setattr(previous, field, getattr(insight, field))
+                previous.updated_at = now
+                item.insight = previous
+                updated.append(item)
+                current.append(previous)
+        
+        # Whatever is still active but was not regenerated is superseded
+        superseded.extend(insight.id for insight in existing.values() if insight.type in deactivate_types)
+        if superseded:
+            HealthInsight.objects.filter(id__in=superseded).update(is_active=False, updated_at=now)
+        
+        if created:
+            HealthInsight.objects.bulk_create([item.insight for item in created])
+        if updated:
+            HealthInsight.objects.bulk_update([item.insight for item in updated], cls.CONTENT_FIELDS)
+        cls._replace_related_records(created + updated, clear=[item.insight.id for item in updated])
+        
+        counts = {
+            'created': len(created),
+            'updated': len(updated),
+            'unchanged': len(current) - len(created) - len(updated),
+            'deactivated': len(superseded),
+        }
+        return current, counts
+    
+    @staticmethod
+    def _replace_related_records(items, clear=()):
+        """Rewrite related_records for the given insights in bulk."""
+        Through = HealthInsight.related_records.through
+        if clear:
+            Through.objects.filter(healthinsight_id__in=clear).delete()
+        
+        record_ids = {record_id for item in items for record_id in item.record_ids}
+        if not record_ids:
+            return
+        records = HealthRecord.objects.in_bulk(record_ids)
+        Through.objects.bulk_create([
+            Through(healthinsight_id=item.insight.id, healthrecord_id=record_id)
+            for item in items
+            for record_id in item.record_ids
+            if record_id in records
+        ])
+
+
+def anomaly_insight(patient, anomaly):
+    """Build the pending insight reporting a detected anomaly."""
+    return PendingInsight(
+        HealthInsight(
+            patient=patient,
+            type=HealthInsight.InsightType.ANOMALY,
+            title=f'Anomaly detected in {anomaly["metric"]}',
+            description=f'{anomaly["metric"]} value ({anomaly["value"]}) is outside normal range {anomaly["normal_range"]}',
+            severity='HIGH' if anomaly['z_score'] > 3 else 'MEDIUM',
+            metrics={'metric': anomaly['metric'], 'value': anomaly['value'], 'z_score': anomaly['z_score']},
+            confidence_score=min(anomaly['z_score'] / 3, 1.0),
+        ),
+        subject=f'{anomaly["metric"]}:{anomaly["record_id"]}',
+        inputs={'value': anomaly['value'], 'z_score': round(anomaly['z_score'], 6)},
+        record_ids=[anomaly['record_id']],
+    )
+
+
+class AnomalyDetector:
+    """
+    Flag values more than ``Z_THRESHOLD`` standard deviations from the
+    metric's mean that also fall outside its normal range.
+    
+    ``scan`` re-scores a full history with array operations; ``score``
+    checks one new value in constant time against the running (Welford)
+    mean and variance stored on its HealthTrend.
+    """
+    
+    Z_THRESHOLD = 2
+    
+    def __init__(self, normal_ranges):
+        self.normal_ranges = normal_ranges
+    
+    def scan(self, metric_matrix):
+        """Detect anomalies across every metric of a MetricMatrix."""
+        anomalies = []
+        values_by_metric = {
+            metric_name: series.values
+            for metric_name, series in metric_matrix.items()
+            if len(series) >= 2
+        }
+        if not values_by_metric:
+            return anomalies
+        
+        z_by_metric = get_compute_executor().run(stats.z_scores_batch, values_by_metric)
+        for metric_name, z in z_by_metric.items():
+            series = metric_matrix[metric_name]
+            anomalies.extend(self.collect(metric_name, series.values, z, series.dates, series.record_ids))
+        
+        return anomalies
+    
+    def collect(self, metric_name, values, z, dates, record_ids):
+        """Anomalies among scored values: z above threshold and outside the normal range."""
+        normal_range = self.normal_ranges.get(metric_name, (None, None))
+        mask = (z > self.Z_THRESHOLD) & stats.outside_range_mask(values, *normal_range)
+        
+        return [
+            {
+                'metric': metric_name,
+                'value': float(values[i]),
+                'date': from_epoch_day(dates[i]),
+                'record_id': int(record_ids[i]),
+                'z_score': float(z[i]),
+                'normal_range': normal_range
+            }
+            for i in np.flatnonzero(mask)
+        ]
+    
+    def score(self, trend, value, record_date, record_id):
+        """Score a value already folded into ``trend``'s running statistics."""
+        if trend.sample_count < 2:
+            return None
+        
+        normal_range = self.normal_ranges.get(trend.metric_name, (None, None))
+        std = stats.running_std(trend.sample_count, trend.running_m2)
+        z_score = float(stats.z_scores(value, trend.running_mean, std))
+        if z_score <= self.Z_THRESHOLD or not stats.outside_range_mask(value, *normal_range):
+            return None
+        
+        return {
+            'metric': trend.metric_name,
+            'value': float(value),
+            'date': record_date,
+            'record_id': record_id,
+            'z_score': z_score,
+            'normal_range': normal_range
+        }
 
 
 class HealthAnalyzer:
     """Analyze health records and generate insights."""
     
-    # Normal ranges for common health metrics
-    NORMAL_RANGES = {
-        'HbA1c': (4.0, 5.6),  # Percentage
-        'Fasting Blood Sugar': (70, 100),  # mg/dL
-        'Blood Pressure Systolic': (90, 120),  # mmHg
-        'Blood Pressure Diastolic': (60, 80),  # mmHg
-        'Total Cholesterol': (0, 200),  # mg/dL
-        'HDL Cholesterol': (40, None),  # mg/dL (higher is better)
-        'LDL Cholesterol': (0, 100),  # mg/dL
-        'Triglycerides': (0, 150),  # mg/dL
-        'Hemoglobin': (12, 17.5),  # g/dL (varies by gender)
-        'WBC Count': (4000, 11000),  # /cumm
-        'Platelet Count': (150000, 450000),  # /cumm
-        'Creatinine': (0.6, 1.2),  # mg/dL
-        'ALT': (7, 56),  # U/L
-        'AST': (10, 40),  # U/L
-    }
+    # Normal ranges by metric code, from the metric registry
+    NORMAL_RANGES = RegistryNormalRanges()
     
     def __init__(self, patient):
         self.patient = patient
         self.records = HealthRecord.objects.filter(
             patient=patient,
             status=HealthRecord.RecordStatus.PROCESSED
-        ).order_by('record_date')
+        ).order_by('record_date', 'id')
+        self._metric_matrix = None
+        self._backend = None
+        self.insight_counts = {}
+    
+    @property
+    def metric_matrix(self):
+        """Metric arrays for this patient, materialized once per analyzer."""
+        if self._metric_matrix is None:
+            self._metric_matrix = MetricMatrix.from_observations(
+                HealthMetricObservation.objects.filter(patient=self.patient)
+            )
+        return self._metric_matrix
+    
+    @property
+    def backend(self):
+        """Statistics backend (database aggregates or NumPy) for this analyzer."""
+        if self._backend is None:
+            self._backend = get_analysis_backend(self)
+        return self._backend
     
     def analyze_trends(self, metric_name=None):
         """Analyze trends for specific metric or all metrics."""
         trends = []
         
-        # Extract metrics from records
-        metrics_data = self._extract_metrics_from_records()
+        statistics_by_metric = self.backend.trend_statistics(metric_name)
+        series = {
+            metric: data_point_series(statistics['data_points'])
+            for metric, statistics in statistics_by_metric.items()
+        }
+        slopes = estimate_trend_slopes(series)
         
-        if metric_name:
-            if metric_name in metrics_data:
-                trend = self._calculate_trend(metric_name, metrics_data[metric_name])
-                if trend:
-                    trends.append(trend)
-        else:
-            # Analyze all metrics
-            for metric, data_points in metrics_data.items():
-                trend = self._calculate_trend(metric, data_points)
-                if trend:
-                    trends.append(trend)
-        
-        return trends
-    
-    def _extract_metrics_from_records(self):
-        """Extract metric values from health records."""
-        metrics = {}
-        
-        for record in self.records:
-            if record.extracted_values:
-                for metric_name, value in record.extracted_values.items():
-                    if isinstance(value, (int, float)):
-                        if metric_name not in metrics:
-                            metrics[metric_name] = []
-                        metrics[metric_name].append({
-                            'date': record.record_date,
-                            'value': float(value),
-                            'record_id': record.id
-                        })
-        
-        return metrics
-    
-    def _calculate_trend(self, metric_name, data_points):
-        """Calculate trend for a metric."""
-        if len(data_points) < 2:
-            return None
+        for metric, statistics in statistics_by_metric.items():
+            trends.append(self._calculate_trend(metric, statistics, series[metric][0][-1], slopes.get(metric)))
         
-        # Sort by date
-        data_points = sorted(data_points, key=lambda x: x['date'])
-        
-        # Extract values and dates
-        values = [dp['value'] for dp in data_points]
-        dates = [dp['date'] for dp in data_points]
-        
-        # Calculate statistics
-        current_value = values[-1]
-        average_value = np.mean(values)
-        min_value = np.min(values)
-        max_value = np.max(values)
+        # Drop trends whose metric lost its processed records (deleted or reprocessed)
+        dropped = HealthTrend.objects.filter(patient=self.patient)
+        if metric_name:
+            dropped = dropped.filter(metric_name=metric_name)
+        dropped.exclude(metric_name__in=[trend.metric_name for trend in trends]).delete()
         
-        # Calculate trend direction and strength using linear regression
-        x = np.arange(len(values))
-        if len(values) > 1:
-            slope = np.polyfit(x, values, 1)[0]
-            trend_strength = slope / (max(values) - min(values) + 1e-10)  # Normalized
-            
-            if trend_strength > 0.05:
-                trend_direction = 'INCREASING'
-            elif trend_strength < -0.05:
-                trend_direction = 'DECREASING'
-            else:
-                trend_direction = 'STABLE'
-        else:
-            trend_direction = 'STABLE'
-            trend_strength = 0.0
+        if not trends:
+            return []
         
-        # Calculate percentage change
-        if len(values) >= 2:
-            change_percentage = ((values[-1] - values[0]) / values[0]) * 100
-        else:
-            change_percentage = 0.0
+        # Upsert in one statement, then reload to pick up primary keys
+        upsert_trends(trends)
+        return list(HealthTrend.objects.filter(
+            patient=self.patient,
+            metric_name__in=[trend.metric_name for trend in trends]
+        ).order_by('metric_name'))
+    
+    def _calculate_trend(self, metric_name, statistics, span, slope=None):
+        """Build an unsaved HealthTrend from a metric's sufficient statistics and estimated slope."""
+        statistics = dict(statistics)
+        data_points = statistics.pop('data_points')
         
         # Get normal range
         normal_range = self.NORMAL_RANGES.get(metric_name, (None, None))
         
-        # Update or create trend
-        trend, created = HealthTrend.objects.update_or_create(
+        return HealthTrend(
             patient=self.patient,
             metric_name=metric_name,
-            defaults={
-                'data_points': data_points,
-                'trend_direction': trend_direction,
-                'trend_strength': float(trend_strength),
-                'current_value': float(current_value),
-                'average_value': float(average_value),
-                'min_value': float(min_value),
-                'max_value': float(max_value),
-                'change_percentage': float(change_percentage),
-                'normal_range_min': normal_range[0],
-                'normal_range_max': normal_range[1],
-            }
+            metric_unit=get_metric_registry().unit(metric_name),
+            data_points=data_points,
+            normal_range_min=normal_range[0],
+            normal_range_max=normal_range[1],
+            **statistics,
+            **summarize_trend_statistics(statistics, span, slope),
         )
-        
-        return trend
     
     def detect_anomalies(self):
         """Detect anomalies in health records."""
-        anomalies = []
-        metrics_data = self._extract_metrics_from_records()
-        
-        for metric_name, data_points in metrics_data.items():
-            if len(data_points) < 2:
-                continue
-            
-            values = [dp['value'] for dp in data_points]
-            mean = np.mean(values)
-            std = np.std(values)
-            
-            # Detect outliers (values beyond 2 standard deviations)
-            for dp in data_points:
-                z_score = abs((dp['value'] - mean) / (std + 1e-10))
-                if z_score > 2:
-                    # Check against normal range
-                    normal_range = self.NORMAL_RANGES.get(metric_name, (None, None))
-                    is_outside_normal = False
-                    
-                    if normal_range[0] is not None and dp['value'] < normal_range[0]:
-                        is_outside_normal = True
-                    if normal_range[1] is not None and dp['value'] > normal_range[1]:
-                        is_outside_normal = True
-                    
-                    if is_outside_normal:
-                        anomalies.append({
-                            'metric': metric_name,
-                            'value': dp['value'],
-                            'date': dp['date'],
-                            'record_id': dp['record_id'],
-                            'z_score': z_score,
-                            'normal_range': normal_range
-                        })
-        
-        return anomalies
+        return self.backend.detect_anomalies(AnomalyDetector(self.NORMAL_RANGES))
     
     def assess_health_risks(self):
         """Assess health risks based on records."""
-        risks = []
-        metrics_data = self._extract_metrics_from_records()
-        
-        # Diabetes risk assessment
-        diabetes_risk = self._assess_diabetes_risk(metrics_data)
-        if diabetes_risk:
-            risks.append(diabetes_risk)
-        
-        # Hypertension risk assessment
-        hypertension_risk = self._assess_hypertension_risk(metrics_data)
-        if hypertension_risk:
-            risks.append(hypertension_risk)
-        
-        # Heart disease risk assessment
-        heart_risk = self._assess_heart_disease_risk(metrics_data)
-        if heart_risk:
-            risks.append(heart_risk)
-        
-        return risks
-    
-    def _assess_diabetes_risk(self, metrics_data):
-        """Assess diabetes risk based on blood sugar and HbA1c."""
-        risk_factors = []
-        risk_score = 0.0
-        
-        # Check HbA1c
-        if 'HbA1c' in metrics_data:
-            hba1c_values = [dp['value'] for dp in metrics_data['HbA1c']]
-            latest_hba1c = hba1c_values[-1]
-            
-            if latest_hba1c >= 6.5:
-                risk_score += 80
-                risk_factors.append(f'HbA1c level ({latest_hba1c}%) indicates diabetes')
-            elif latest_hba1c >= 5.7:
-                risk_score += 50
-                risk_factors.append(f'HbA1c level ({latest_hba1c}%) indicates pre-diabetes')
-        
-        # Check fasting blood sugar
-        if 'Fasting Blood Sugar' in metrics_data:
-            fbs_values = [dp['value'] for dp in metrics_data['Fasting Blood Sugar']]
-            latest_fbs = fbs_values[-1]
+        engine = RiskRuleEngine.default()
+        assessments = get_compute_executor().run(
+            evaluate_risk_rules, [engine.latest_row(self.metric_matrix)], engine.metrics
+        )[0]
+        return save_risk_assessments({self.patient.id: assessments})[self.patient.id]
+    
+    def generate_insights(self, on_progress=None):
+        """
+        Generate comprehensive health insights.
+        
+        Regeneration is idempotent: insights whose inputs are unchanged are
+        left alone, changed ones are updated in place and insights that are
+        no longer produced are deactivated. The counts are kept on
+        ``self.insight_counts``. ``on_progress`` is called with a percentage
+        after each stage (trends, anomalies, risks).
+        """
+        report = on_progress or (lambda progress: None)
+        with transaction.atomic():
+            pending = []
             
-            if latest_fbs >= 126:
-                risk_score += 70
-                risk_factors.append(f'Fasting blood sugar ({latest_fbs} mg/dL) indicates diabetes')
-            elif latest_fbs >= 100:
-                risk_score += 40
-                risk_factors.append(f'Fasting blood sugar ({latest_fbs} mg/dL) is elevated')
-        
-        if risk_score > 0:
-            risk_level = 'LOW' if risk_score < 30 else ('MODERATE' if risk_score < 60 else ('HIGH' if risk_score < 80 else 'CRITICAL'))
+            # Analyze trends
+            trends = self.analyze_trends()
+            report(30)
             
-            recommendations = []
-            if risk_score >= 60:
-                recommendations.append('Consult a diabetologist for further evaluation')
-                recommendations.append('Monitor blood sugar levels regularly')
-            if risk_score >= 40:
-                recommendations.append('Follow a diabetic-friendly diet')
-                recommendations.append('Maintain regular exercise routine')
+            for trend in trends:
+                # Generate trend insights
+                insight_data = self._generate_trend_insight(trend)
+                if insight_data:
+                    pending.append(PendingInsight(
+                        HealthInsight(
+                            patient=self.patient,
+                            type=HealthInsight.InsightType.TREND,
+                            title=insight_data['title'],
+                            description=insight_data['description'],
+                            severity=insight_data['severity'],
+                            metrics={'metric_name': trend.metric_name, 'current_value': trend.current_value},
+                            confidence_score=0.8,
+                        ),
+                        subject=trend.metric_name,
+                        inputs={
+                            'direction': trend.trend_direction,
+                            'current_value': trend.current_value,
+                            'change_percentage': trend.change_percentage,
+                            'sample_count': trend.sample_count,
+                            'normal_range': [trend.normal_range_min, trend.normal_range_max],
+                        },
+                    ))
             
-            risk, created = HealthRisk.objects.update_or_create(
-                patient=self.patient,
-                category=HealthRisk.RiskCategory.DIABETES,
-                defaults={
-                    'risk_score': min(risk_score, 100),
-                    'risk_level': risk_level,
-                    'description': f'Diabetes risk assessment based on blood sugar levels and HbA1c',
-                    'contributing_factors': risk_factors,
-                    'recommendations': recommendations,
-                }
-            )
-            return risk
-        
-        return None
-    
-    def _assess_hypertension_risk(self, metrics_data):
-        """Assess hypertension risk based on blood pressure."""
-        risk_factors = []
-        risk_score = 0.0
-        
-        systolic_key = 'Blood Pressure Systolic'
-        diastolic_key = 'Blood Pressure Diastolic'
-        
-        if systolic_key in metrics_data or diastolic_key in metrics_data:
-            if systolic_key in metrics_data:
-                sbp_values = [dp['value'] for dp in metrics_data[systolic_key]]
-                latest_sbp = sbp_values[-1]
-                
-                if latest_sbp >= 180:
-                    risk_score += 90
-                    risk_factors.append(f'Very high systolic BP ({latest_sbp} mmHg) - Hypertensive Crisis')
-                elif latest_sbp >= 140:
-                    risk_score += 70
-                    risk_factors.append(f'High systolic BP ({latest_sbp} mmHg) - Stage 2 Hypertension')
-                elif latest_sbp >= 130:
-                    risk_score += 50
-                    risk_factors.append(f'Elevated systolic BP ({latest_sbp} mmHg) - Stage 1 Hypertension')
-                elif latest_sbp >= 120:
-                    risk_score += 30
-                    risk_factors.append(f'High-normal systolic BP ({latest_sbp} mmHg)')
+            # Correlated movement across metrics (imported here: correlation builds on this module)
+            from .correlation import CorrelationAnalyzer
+            pending.extend(CorrelationAnalyzer().patient_insights(self.patient, trends))
             
-            if diastolic_key in metrics_data:
-                dbp_values = [dp['value'] for dp in metrics_data[diastolic_key]]
-                latest_dbp = dbp_values[-1]
-                
-                if latest_dbp >= 120:
-                    risk_score += 90
-                    risk_factors.append(f'Very high diastolic BP ({latest_dbp} mmHg) - Hypertensive Crisis')
-                elif latest_dbp >= 90:
-                    risk_score += 70
-                    risk_factors.append(f'High diastolic BP ({latest_dbp} mmHg) - Stage 2 Hypertension')
-                elif latest_dbp >= 80:
-                    risk_score += 50
-                    risk_factors.append(f'Elevated diastolic BP ({latest_dbp} mmHg) - Stage 1 Hypertension')
+            # Detect anomalies
+            anomalies = self.detect_anomalies()
             
-            if risk_score > 0:
-                risk_level = 'LOW' if risk_score < 30 else ('MODERATE' if risk_score < 60 else ('HIGH' if risk_score < 80 else 'CRITICAL'))
-                
-                recommendations = []
-                if risk_score >= 60:
-                    recommendations.append('Consult a cardiologist for blood pressure management')
-                    recommendations.append('Monitor blood pressure daily')
-                if risk_score >= 40:
-                    recommendations.append('Reduce sodium intake')
-                    recommendations.append('Maintain healthy weight')
-                    recommendations.append('Regular exercise')
-                
-                risk, created = HealthRisk.objects.update_or_create(
-                    patient=self.patient,
-                    category=HealthRisk.RiskCategory.HYPERTENSION,
-                    defaults={
-                        'risk_score': min(risk_score, 100),
-                        'risk_level': risk_level,
-                        'description': 'Hypertension risk assessment based on blood pressure readings',
-                        'contributing_factors': risk_factors,
-                        'recommendations': recommendations,
-                    }
-                )
-                return risk
-        
-        return None
-    
-    def _assess_heart_disease_risk(self, metrics_data):
-        """Assess heart disease risk based on cholesterol and other factors."""
-        risk_factors = []
-        risk_score = 0.0
-        
-        # Check cholesterol levels
-        if 'Total Cholesterol' in metrics_data:
-            tc_values = [dp['value'] for dp in metrics_data['Total Cholesterol']]
-            latest_tc = tc_values[-1]
+            for anomaly in anomalies:
+                pending.append(anomaly_insight(self.patient, anomaly))
+            report(55)
             
-            if latest_tc >= 240:
-                risk_score += 60
-                risk_factors.append(f'High total cholesterol ({latest_tc} mg/dL)')
-            elif latest_tc >= 200:
-                risk_score += 40
-                risk_factors.append(f'Borderline high total cholesterol ({latest_tc} mg/dL)')
-        
-        if 'LDL Cholesterol' in metrics_data:
-            ldl_values = [dp['value'] for dp in metrics_data['LDL Cholesterol']]
-            latest_ldl = ldl_values[-1]
+            # Assess risks
+            risks = self.assess_health_risks()
+            risk_records = self._related_record_ids(risks)
+            report(75)
             
-            if latest_ldl >= 190:
-                risk_score += 70
-                risk_factors.append(f'Very high LDL cholesterol ({latest_ldl} mg/dL)')
-            elif latest_ldl >= 160:
-                risk_score += 50
-                risk_factors.append(f'High LDL cholesterol ({latest_ldl} mg/dL)')
-            elif latest_ldl >= 130:
-                risk_score += 30
-                risk_factors.append(f'Borderline high LDL cholesterol ({latest_ldl} mg/dL)')
-        
-        # Check blood pressure as contributing factor
-        if 'Blood Pressure Systolic' in metrics_data:
-            sbp_values = [dp['value'] for dp in metrics_data['Blood Pressure Systolic']]
-            if sbp_values[-1] >= 140:
-                risk_score += 30
-                risk_factors.append('High blood pressure increases heart disease risk')
-        
-        if risk_score > 0:
-            risk_level = 'LOW' if risk_score < 30 else ('MODERATE' if risk_score < 60 else ('HIGH' if risk_score < 80 else 'CRITICAL'))
+            for risk in risks:
+                pending.append(PendingInsight(
+                    HealthInsight(
+                        patient=self.patient,
+                        type=HealthInsight.InsightType.RISK,
+                        title=f'{risk.get_category_display()} Risk Assessment',
+                        description=risk.description,
+                        severity='CRITICAL' if risk.risk_level == 'CRITICAL' else ('HIGH' if risk.risk_level == 'HIGH' else ('MEDIUM' if risk.risk_level == 'MODERATE' else 'LOW')),
+                        metrics={'risk_score': risk.risk_score, 'risk_level': risk.risk_level},
+                        predictions={'risk_category': risk.category},
+                        recommendations=risk.recommendations,
+                        confidence_score=risk.risk_score / 100,
+                    ),
+                    subject=risk.category,
+                    inputs={
+                        'risk_score': risk.risk_score,
+                        'risk_level': risk.risk_level,
+                        'contributing_factors': risk.contributing_factors,
+                        'recommendations': risk.recommendations,
+                    },
+                    record_ids=risk_records.get(risk.id, []),
+                ))
             
-            recommendations = []
-            if risk_score >= 50:
-                recommendations.append('Consult a cardiologist for comprehensive heart health evaluation')
-            if risk_score >= 40:
-                recommendations.append('Follow heart-healthy diet (low saturated fat)')
-                recommendations.append('Maintain healthy weight')
-                recommendations.append('Regular physical activity')
-            
-            risk, created = HealthRisk.objects.update_or_create(
-                patient=self.patient,
-                category=HealthRisk.RiskCategory.HEART_DISEASE,
-                defaults={
-                    'risk_score': min(risk_score, 100),
-                    'risk_level': risk_level,
-                    'description': 'Heart disease risk assessment based on cholesterol and cardiovascular markers',
-                    'contributing_factors': risk_factors,
-                    'recommendations': recommendations,
-                }
-            )
-            return risk
-        
-        return None
+            insights, self.insight_counts = InsightWriter(self.patient).sync(pending)
+            return insights
     
-    def generate_insights(self):
-        """Generate comprehensive health insights."""
-        insights = []
-        
-        # Analyze trends
-        trends = self.analyze_trends()
-        
-        for trend in trends:
-            # Generate trend insights
-            insight_data = self._generate_trend_insight(trend)
-            if insight_data:
-                insight = HealthInsight.objects.create(
-                    patient=self.patient,
-                    type=HealthInsight.InsightType.TREND,
-                    title=insight_data['title'],
-                    description=insight_data['description'],
-                    severity=insight_data['severity'],
-                    metrics={'metric_name': trend.metric_name, 'current_value': trend.current_value},
-                    confidence_score=0.8,
-                )
-                insights.append(insight)
-        
-        # Detect anomalies
-        anomalies = self.detect_anomalies()
-        
-        for anomaly in anomalies:
-            record = HealthRecord.objects.get(id=anomaly['record_id'])
-            insight = HealthInsight.objects.create(
-                patient=self.patient,
-                type=HealthInsight.InsightType.ANOMALY,
-                title=f'Anomaly detected in {anomaly["metric"]}',
-                description=f'{anomaly["metric"]} value ({anomaly["value"]}) is outside normal range {anomaly["normal_range"]}',
-                severity='HIGH' if anomaly['z_score'] > 3 else 'MEDIUM',
-                related_records=[record],
-                metrics={'metric': anomaly['metric'], 'value': anomaly['value'], 'z_score': anomaly['z_score']},
-                confidence_score=min(anomaly['z_score'] / 3, 1.0),
-            )
-            insights.append(insight)
-        
-        # Assess risks
-        risks = self.assess_health_risks()
-        
-        for risk in risks:
-            insight = HealthInsight.objects.create(
-                patient=self.patient,
-                type=HealthInsight.InsightType.RISK,
-                title=f'{risk.get_category_display()} Risk Assessment',
-                description=risk.description,
-                severity='CRITICAL' if risk.risk_level == 'CRITICAL' else ('HIGH' if risk.risk_level == 'HIGH' else ('MEDIUM' if risk.risk_level == 'MODERATE' else 'LOW')),
-                related_records=list(risk.related_records.all()),
-                metrics={'risk_score': risk.risk_score, 'risk_level': risk.risk_level},
-                predictions={'risk_category': risk.category},
-                recommendations=risk.recommendations,
-                confidence_score=risk.risk_score / 100,
-            )
-            insights.append(insight)
-        
-        return insights
+    @staticmethod
+    def _related_record_ids(risks):
+        """Map risk id to its related record ids with a single query."""
+        related = {}
+        rows = HealthRisk.related_records.through.objects.filter(
+            healthrisk_id__in=[risk.id for risk in risks]
+        ).values_list('healthrisk_id', 'healthrecord_id')
+        for risk_id, record_id in rows:
+            related.setdefault(risk_id, []).append(record_id)
+        return related
     
     def _generate_trend_insight(self, trend):
         """Generate insight text for a trend."""
@@ -483,45 +684,289 @@ class HealthAnalyzer:
             }
 
 
+class ObservationWriter:
+    """Keep HealthMetricObservation rows in step with processed records."""
+    
+    @staticmethod
+    def build(record):
+        """Unsaved observations for a record's numeric extracted values."""
+        registry = get_metric_registry()
+        return [
+            HealthMetricObservation(
+                patient_id=record.patient_id,
+                record_id=record.id,
+                metric_code=metric_code,
+                observed_on=record.record_date,
+                value=value,
+                unit=registry.unit(metric_code),
+            )
+            for metric_code, value in metric_values(record.extracted_values).items()
+        ]
+    
+    @classmethod
+    def sync_record(cls, record):
+        """Replace the record's observations with its current extracted values."""
+        with transaction.atomic():
+            cls.clear_record(record)
+            return HealthMetricObservation.objects.bulk_create(cls.build(record))
+    
+    @staticmethod
+    def clear_record(record):
+        """Remove the record's observations (e.g. it is no longer PROCESSED)."""
+        HealthMetricObservation.objects.filter(record_id=record.id).delete()
+
+
+class IncrementalTrendUpdater:
+    """
+    Fold a newly processed record into its patient's trends.
+    
+    The record's value is appended to each trend's running sums in O(1),
+    whatever the metric's estimator: a robust (Theil-Sen/Huber) metric
+    takes the least-squares slope of the sums until the debounced full
+    re-analysis (schedule_reanalysis) refits it. Trends that cannot be
+    extended in place (missing, created before running sums existed, or
+    the record is not the newest observation) are repaired with a full
+    HealthAnalyzer recompute.
+    """
+    
+    def __init__(self, record):
+        self.record = record
+    
+    def apply(self):
+        """Update every trend touched by the record; returns the updated trends."""
+        values = metric_values(self.record.extracted_values)
+        if not values:
+            return []
+        
+        # Lock the trends so records processed concurrently append one at a time
+        with transaction.atomic():
+            trends = HealthTrend.objects.select_for_update().filter(
+                patient_id=self.record.patient_id,
+                metric_name__in=list(values)
+            ).order_by('metric_name')
+            existing = {trend.metric_name: trend for trend in trends}
+            
+            updated = []
+            stale_metrics = []
+            for metric_name, value in values.items():
+                trend = existing.get(metric_name)
+                if trend is None or not self._can_append(trend):
+                    stale_metrics.append(metric_name)
+                    continue
+                self._append(trend, value)
+                trend.save()
+                updated.append(trend)
+            
+            if stale_metrics:
+                analyzer = HealthAnalyzer(self.record.patient)
+                for metric_name in stale_metrics:
+                    updated.extend(analyzer.analyze_trends(metric_name=metric_name))
+        
+        self._score_anomalies(updated, values)
+        return updated
+    
+    def _score_anomalies(self, trends, values):
+        """Score the record's values as they arrive and persist any anomalies."""
+        detector = AnomalyDetector(HealthAnalyzer.NORMAL_RANGES)
+        pending = []
+        for trend in trends:
+            anomaly = detector.score(trend, values[trend.metric_name], self.record.record_date, self.record.id)
+            if anomaly:
+                pending.append(anomaly_insight(self.record.patient, anomaly))
+        if pending:
+            InsightWriter(self.record.patient).sync(pending, deactivate_missing=False)
+    
+    def _can_append(self, trend):
+        """Whether the record extends the trend's series at the end."""
+        data_points = trend.data_points
+        if trend.sample_count < 2 or trend.sample_count != len(data_points):
+            return False
+        
+        last_point = data_points[-1]
+        record_key = (self.record.record_date.isoformat(), self.record.id)
+        if record_key <= (last_point['date'], last_point['record_id']):
+            return False
+        return True
+    
+    def _append(self, trend, value):
+        """Add one observation to the trend's running statistics."""
+        x = float((self.record.record_date - date.fromisoformat(trend.data_points[0]['date'])).days)
+        trend.sum_x += x
+        trend.sum_y += value
+        trend.sum_xy += x * value
+        trend.sum_xx += x * x
+        trend.sample_count, trend.running_mean, trend.running_m2 = stats.welford_update(
+            trend.sample_count, trend.running_mean, trend.running_m2, value
+        )
+        trend.min_value = min(trend.min_value, value)
+        trend.max_value = max(trend.max_value, value)
+        trend.current_value = value
+        trend.forecast_fit = None
+        trend.data_points.append({
+            'date': self.record.record_date.isoformat(),
+            'value': value,
+            'record_id': self.record.id
+        })
+        
+        for field, derived in summarize_trend_statistics({
+            'sample_count': trend.sample_count,
+            'sum_x': trend.sum_x,
+            'sum_y': trend.sum_y,
+            'sum_xy': trend.sum_xy,
+            'sum_xx': trend.sum_xx,
+            'min_value': trend.min_value,
+            'max_value': trend.max_value,
+            'first_value': trend.first_value,
+            'current_value': trend.current_value,
+        }, x).items():
+            setattr(trend, field, derived)
+
+
 class PredictiveModel:
     """Predictive model for future health outcomes."""
     
+    MIN_POINTS = 3
+    DEFAULT_HORIZONS = (30, 60, 90)
+    
     @staticmethod
-    def predict_future_values(patient, metric_name, days_ahead=90):
-        """Predict future values for a metric using linear regression."""
-        trends = HealthTrend.objects.filter(patient=patient, metric_name=metric_name).first()
-        
-        if not trends or len(trends.data_points) < 3:
+    def defer_series(queryset):
+        """
+        Defer the trends' data_points, keeping the last date the fit digest needs.
+        
+        Reading the last array element relies on PostgreSQL's negative JSON
+        path indexes; other databases load data_points instead.
+        """
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset
+        return queryset.defer('data_points').annotate(last_point_date=KT('data_points__-1__date'))
+    
+    @staticmethod
+    def _series_digest(trend):
+        """Summary of the trend's series; a fit is stale once it changes."""
+        if hasattr(trend, 'last_point_date'):
+            last_date = trend.last_point_date
+        else:
+            last_date = trend.data_points[-1]['date'] if trend.data_points else None
+        return [
+            trend.sample_count,
+            *(round(getattr(trend, field), 6) for field in ('sum_x', 'sum_y', 'sum_xy', 'sum_xx')),
+            last_date,
+        ]
+    
+    @classmethod
+    def _fit_is_current(cls, trend):
+        fit = trend.forecast_fit
+        return bool(fit) and fit.get('series_digest') == cls._series_digest(trend)
+    
+    @classmethod
+    def fit_trends(cls, trends):
+        """
+        Ensure every trend with enough data carries a current regression fit.
+        
+        Missing or stale fits read their series from HealthMetricObservation
+        (one (patient, metric_code, observed_on) range scan per patient, not
+        the trends' data_points JSON), are computed together with one
+        closed-form least-squares pass over the stacked series (x in days
+        since each series' first date) and cached on the trends in a single
+        update.
+        
+        Forecasts are always least squares, since the prediction intervals
+        come from its residuals. For a metric configured with a robust trend
+        estimator, the forecast slope can therefore disagree with the
+        stored trend direction when outliers pull the two apart.
+        """
+        stale = [
+            trend for trend in trends
+            if trend.sample_count >= cls.MIN_POINTS and not cls._fit_is_current(trend)
+        ]
+        if not stale:
+            return
+        
+        by_patient = {}
+        for trend in stale:
+            by_patient.setdefault(trend.patient_id, []).append(trend)
+        series = []
+        for patient_id, patient_trends in by_patient.items():
+            matrix = MetricMatrix.from_observations(HealthMetricObservation.objects.filter(
+                patient_id=patient_id,
+                metric_code__in=[trend.metric_name for trend in patient_trends]
+            ))
+            series.extend(
+                (trend, matrix[trend.metric_name]) for trend in patient_trends
+                if trend.metric_name in matrix and len(matrix[trend.metric_name]) >= cls.MIN_POINTS
+            )
+        if not series:
+            return
+        
+        stale = [trend for trend, _ in series]
+        width = max(len(metric_series) for _, metric_series in series)
+        days = np.zeros((len(series), width), dtype=np.float64)
+        values = np.zeros((len(series), width), dtype=np.float64)
+        mask = np.zeros((len(series), width), dtype=bool)
+        origins = []
+        for row, (_, metric_series) in enumerate(series):
+            count = len(metric_series)
+            origins.append(int(metric_series.dates[0]))
+            days[row, :count] = metric_series.dates - metric_series.dates[0]
+            values[row, :count] = metric_series.values
+            mask[row, :count] = True
+        
+        fit = get_compute_executor().run(stats.linear_fits, days, values, mask)
+        last_x = days.max(axis=1)
+        for row, trend in enumerate(stale):
+            trend.forecast_fit = {
+                'sample_count': trend.sample_count,
+                'series_digest': cls._series_digest(trend),
+                'origin': from_epoch_day(origins[row]).isoformat(),
+                'last_x': float(last_x[row]),
+                **{key: float(column[row]) for key, column in fit.items()},
+            }
+        HealthTrend.objects.bulk_update(stale, ['forecast_fit'])
+    
+    @classmethod
+    def forecast(cls, trends, horizons=DEFAULT_HORIZONS, confidence=0.95):
+        """
+        Forecast several trends at arbitrary horizons (days after each
+        trend's last observation) with prediction intervals.
+        
+        Returns ``{metric_name: [{date, value, lower, upper, days_ahead}]}``;
+        trends with fewer than ``MIN_POINTS`` observations are omitted.
+        """
+        trends = list(trends)
+        cls.fit_trends(trends)
+        fitted = [trend for trend in trends if cls._fit_is_current(trend)]
+        if not fitted:
+            return {}
+        
+        horizons = np.asarray(horizons, dtype=np.float64)
+        fits = {
+            key: np.array([trend.forecast_fit[key] for trend in fitted])
+            for key in ('n', 'slope', 'intercept', 'sigma', 'x_mean', 'sxx', 'last_x')
+        }
+        future_x = fits['last_x'][:, None] + horizons[None, :]
+        mean, lower, upper = get_compute_executor().run(stats.prediction_intervals, fits, future_x, confidence)
+        
+        forecasts = {}
+        for row, trend in enumerate(fitted):
+            last_date = date.fromisoformat(trend.forecast_fit['origin']) + timedelta(days=int(fits['last_x'][row]))
+            forecasts[trend.metric_name] = [
+                {
+                    'date': (last_date + timedelta(days=int(days_ahead))).isoformat(),
+                    'value': float(mean[row, column]),
+                    'lower': float(lower[row, column]),
+                    'upper': float(upper[row, column]),
+                    'days_ahead': int(days_ahead)
+                }
+                for column, days_ahead in enumerate(horizons)
+            ]
+        return forecasts
+    
+    @classmethod
+    def predict_future_values(cls, patient, metric_name, days_ahead=90, confidence=0.95):
+        """Predict future values for a metric every 30 days up to ``days_ahead``."""
+        trend = HealthTrend.objects.filter(patient=patient, metric_name=metric_name).first()
+        if trend is None:
             return None
         
-        # Extract data
-        data_points = sorted(trends.data_points, key=lambda x: x['date'])
-        dates = [dp['date'] for dp in data_points]
-        values = [dp['value'] for dp in data_points]
-        
-        # Convert dates to numeric (days from first date)
-        first_date = dates[0]
-        x = [(date - first_date).days for date in dates]
-        
-        # Fit linear regression
-        coeffs = np.polyfit(x, values, 1)
-        slope = coeffs[0]
-        intercept = coeffs[1]
-        
-        # Predict future values
-        last_date = dates[-1]
-        predictions = []
-        
-        for i in range(30, days_ahead + 1, 30):  # Predict every 30 days
-            future_date = last_date + timedelta(days=i)
-            future_x = (future_date - first_date).days
-            predicted_value = slope * future_x + intercept
-            
-            predictions.append({
-                'date': future_date.isoformat(),
-                'value': float(predicted_value),
-                'days_ahead': i
-            })
-        
-        return predictions
-
+        forecasts = cls.forecast([trend], range(30, days_ahead + 1, 30), confidence)
+        return forecasts.get(metric_name)
@@ -0,0 +1,112 @@
+"""
+Signal handlers keeping AI/ML data in step with health records.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from core.models import HealthRecord
+from .cache import invalidate_patient
+from .models import HealthTrend
+from .services import IncrementalTrendUpdater, ObservationWriter, metric_values
+from .tasks import schedule_reanalysis
+
+logger = logging.getLogger(__name__)
+
+
+def _analysis_snapshot(record):
+    # Read from __dict__ so deferred fields are not fetched. Observations come
+    # from top-level numeric values only, so a shallow copy survives in-place edits
+    values = record.__dict__.get('extracted_values')
+    return {
+        'extracted_values': dict(values) if isinstance(values, dict) else values,
+        'record_date': record.__dict__.get('record_date'),
+    }
+
+
+@receiver(post_init, sender=HealthRecord)
+def remember_loaded_status(sender, instance, **kwargs):
+    """Remember the status and analysed fields a record was loaded with to detect changes."""
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_analysis = _analysis_snapshot(instance)
+
+
+@receiver(post_save, sender=HealthRecord)
+def update_analysis_on_processing(sender, instance, created, **kwargs):
+    """
+    Record observations, update trends and schedule re-analysis when a record
+    moves to PROCESSED, or when a PROCESSED record's values or date change.
+    """
+    previous_status = None if created else instance._loaded_status
+    previous_analysis = instance._loaded_analysis
+    instance._loaded_status = instance.status
+    instance._loaded_analysis = _analysis_snapshot(instance)
+
+    if instance.status != HealthRecord.RecordStatus.PROCESSED:
+        if previous_status == HealthRecord.RecordStatus.PROCESSED:
+            ObservationWriter.clear_record(instance)
+            reanalyse_patient(instance, previous_analysis['extracted_values'])
+        return
+    if previous_status == HealthRecord.RecordStatus.PROCESSED:
+        if previous_analysis != instance._loaded_analysis:
+            resync_edited_record(instance, previous_analysis['extracted_values'])
+        return
+
+    ObservationWriter.sync_record(instance)
+
+    def apply_record():
+        try:
+            IncrementalTrendUpdater(instance).apply()
+        except Exception as e:
+            logger.error(f"Error updating trends for record {instance.id}: {str(e)}")
+        try:
+            schedule_reanalysis(instance.patient_id)
+        except Exception as e:
+            logger.error(f"Error scheduling re-analysis for record {instance.id}: {str(e)}")
+
+    transaction.on_commit(apply_record)
+
+
+def resync_edited_record(record, previous_values):
+    """Replace an edited PROCESSED record's observations and re-analyse its patient."""
+    ObservationWriter.sync_record(record)
+    reanalyse_patient(record, previous_values, record.extracted_values)
+
+
+def reanalyse_patient(record, *values):
+    """
+    Schedule a full re-analysis after a PROCESSED record changed or left the
+    series, dropping the cached forecast fits of the metrics in ``values``
+    (every metric when the values were not loaded).
+    """
+    # The trends' points changed outside the incremental path, so cached fits are stale
+    trends = HealthTrend.objects.filter(patient_id=record.patient_id)
+    if all(isinstance(metric_data, dict) for metric_data in values):
+        trends = trends.filter(metric_name__in=set().union(*(metric_values(metric_data) for metric_data in values)))
+    trends.update(forecast_fit=None)
+    # A deleted record loses its primary key before on_commit fires
+    record_id, patient_id = record.id, record.patient_id
+
+    def reanalyse():
+        try:
+            schedule_reanalysis(patient_id)
+        except Exception as e:
+            logger.error(f"Error scheduling re-analysis for record {record_id}: {str(e)}")
+
+    transaction.on_commit(reanalyse)
+
+
+@receiver(post_delete, sender=HealthRecord)
+def update_analysis_on_delete(sender, instance, **kwargs):
+    """Re-analyse the patient when a PROCESSED record is deleted (its observations cascade)."""
+    if instance._loaded_status == HealthRecord.RecordStatus.PROCESSED:
+        reanalyse_patient(instance, instance._loaded_analysis['extracted_values'])
+
+
+@receiver(post_save, sender=HealthRecord)
+@receiver(post_delete, sender=HealthRecord)
+def invalidate_analysis_cache(sender, instance, **kwargs):
+    """Drop cached analysis results for the record's patient once the change commits."""
+    patient_id = instance.patient_id
+    transaction.on_commit(lambda: invalidate_patient(patient_id))
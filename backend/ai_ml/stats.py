@@ -0,0 +1,387 @@
+"""
+Vectorized statistics shared by the per-patient and cohort analysis paths.
+
+Every function accepts scalars or NumPy arrays, so one patient's metric and
+a whole cohort's (patient, metric) groups go through the same code.
+"""
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+
+# Normalized slope beyond which a trend counts as increasing/decreasing
+TREND_STRENGTH_THRESHOLD = 0.05
+
+
+def ols_slope(n, sum_x, sum_y, sum_xy, sum_xx):
+    """Least-squares slope from sufficient statistics (0 where undefined)."""
+    n = np.asarray(n, dtype=np.float64)
+    denominator = n * sum_xx - np.square(sum_x)
+    numerator = n * sum_xy - np.multiply(sum_x, sum_y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator != 0, numerator / denominator, 0.0)
+    return slope
+
+
+def trend_strength(slope, min_value, max_value):
+    """Slope normalized by the observed value range."""
+    return slope / (np.subtract(max_value, min_value) + 1e-10)
+
+
+def trend_direction(strength):
+    """Classify normalized trend strength as INCREASING/DECREASING/STABLE."""
+    strength = np.asarray(strength)
+    direction = np.where(
+        strength > TREND_STRENGTH_THRESHOLD,
+        'INCREASING',
+        np.where(strength < -TREND_STRENGTH_THRESHOLD, 'DECREASING', 'STABLE'),
+    )
+    return direction.item() if direction.ndim == 0 else direction
+
+
+def change_percentage(first_value, last_value):
+    """Percentage change from first to last value (0 when first is 0)."""
+    first_value = np.asarray(first_value, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(
+            first_value != 0,
+            (np.subtract(last_value, first_value) / first_value) * 100,
+            0.0,
+        )
+    return change
+
+
+def trend_summary(n, sum_x, sum_y, sum_xy, sum_xx, min_value, max_value, first_value, last_value,
+                  span, slope=None):
+    """
+    Derived HealthTrend statistics from running sufficient statistics.
+
+    x is in days. The slope (least squares from the sums unless an
+    estimator's ``slope`` is given) is scaled to the mean sampling interval,
+    ``span / (n - 1)``, so strength stays a change per observation.
+    """
+    if slope is None:
+        slope = ols_slope(n, sum_x, sum_y, sum_xy, sum_xx)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interval = np.where(n > 1, np.divide(span, n - 1), 0.0)
+    strength = trend_strength(np.multiply(slope, interval), min_value, max_value)
+    return {
+        'average_value': np.divide(sum_y, n),
+        'trend_strength': strength,
+        'trend_direction': trend_direction(strength),
+        'change_percentage': change_percentage(first_value, last_value),
+    }
+
+
+def welford_update(count, mean, m2, value):
+    """Fold one value into running count, mean and sum of squared deviations."""
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+
+def running_std(count, m2):
+    """Population standard deviation from Welford's running statistics."""
+    return np.sqrt(np.divide(m2, count)) if count else 0.0
+
+
+def z_scores(values, mean, std):
+    """Absolute z-scores of values against a mean and standard deviation."""
+    return np.abs((np.asarray(values, dtype=np.float64) - mean) / (std + 1e-10))
+
+
+def outside_range_mask(values, low, high):
+    """Boolean mask of values outside [low, high]; None means unbounded."""
+    values = np.asarray(values, dtype=np.float64)
+    mask = np.zeros(values.shape, dtype=bool)
+    if low is not None:
+        mask |= values < low
+    if high is not None:
+        mask |= values > high
+    return mask
+
+
+def series_statistics(days, values):
+    """Running sufficient statistics of one date-ordered series (x in days since its first date)."""
+    values = np.asarray(values, dtype=np.float64)
+    x = np.asarray(days, dtype=np.float64) - days[0]
+    mean = values.mean()
+    return {
+        'sample_count': len(values),
+        'sum_x': float(x.sum()),
+        'sum_y': float(values.sum()),
+        'sum_xy': float(x.dot(values)),
+        'sum_xx': float(x.dot(x)),
+        'min_value': float(values.min()),
+        'max_value': float(values.max()),
+        'first_value': float(values[0]),
+        'current_value': float(values[-1]),
+        'running_mean': float(mean),
+        'running_m2': float(np.square(values - mean).sum()),
+    }
+
+
+def t_quantile(p, df):
+    """
+    Student-t quantile, vectorized over degrees of freedom.
+
+    Exact for df 1 and 2; otherwise the Cornish-Fisher expansion around
+    the normal quantile (within 0.2% for df >= 3 at common levels).
+    """
+    df = np.asarray(df, dtype=np.float64)
+    z = NormalDist().inv_cdf(p)
+    expansion = (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+        + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4)
+    )
+    exact_df1 = np.tan(np.pi * (p - 0.5))
+    exact_df2 = (2 * p - 1) / np.sqrt(2 * p * (1 - p))
+    return np.where(df <= 1, exact_df1, np.where(df <= 2, exact_df2, expansion))
+
+
+def linear_fits(x, y, mask):
+    """
+    Closed-form least-squares fits for stacked, padded series.
+
+    ``x``, ``y`` and ``mask`` are (series, length) arrays; padded cells are
+    excluded by ``mask``. Returns per-series n, slope, intercept, residual
+    standard error, mean x and centred Σ(x - x̄)².
+    """
+    mask = np.asarray(mask, dtype=bool)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+    n = mask.sum(axis=1).astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = x.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        sxx = np.einsum('ij,ij->i', dx, dx)
+        sxy = np.einsum('ij,ij->i', dx, y)
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        intercept = y_mean - slope * x_mean
+        residuals = np.where(mask, y - (intercept[:, None] + slope[:, None] * x), 0.0)
+        sigma = np.sqrt(np.einsum('ij,ij->i', residuals, residuals) / np.maximum(n - 2, 1))
+
+    return {
+        'n': n,
+        'slope': slope,
+        'intercept': intercept,
+        'sigma': sigma,
+        'x_mean': x_mean,
+        'sxx': sxx,
+    }
+
+
+def prediction_intervals(fit, future_x, confidence=0.95):
+    """
+    Point forecasts and prediction intervals for stacked linear fits.
+
+    ``fit`` holds per-series arrays as returned by ``linear_fits``;
+    ``future_x`` is a (series, horizons) array. Returns (mean, lower, upper).
+    """
+    n = np.asarray(fit['n'], dtype=np.float64)[:, None]
+    slope = np.asarray(fit['slope'], dtype=np.float64)[:, None]
+    intercept = np.asarray(fit['intercept'], dtype=np.float64)[:, None]
+    sigma = np.asarray(fit['sigma'], dtype=np.float64)[:, None]
+    x_mean = np.asarray(fit['x_mean'], dtype=np.float64)[:, None]
+    sxx = np.asarray(fit['sxx'], dtype=np.float64)[:, None]
+
+    mean = intercept + slope * future_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        leverage = np.where(sxx > 0, np.square(future_x - x_mean) / sxx, 0.0)
+    standard_error = sigma * np.sqrt(1 + 1 / n + leverage)
+    margin = t_quantile(0.5 + confidence / 2, n - 2) * standard_error
+    return mean, mean - margin, mean + margin
+
+
+def stack_series(series):
+    """Pad ``(x, y)`` series into (series, length) x, y and mask arrays."""
+    width = max((len(values) for _, values in series), default=0)
+    x = np.zeros((len(series), width), dtype=np.float64)
+    y = np.zeros((len(series), width), dtype=np.float64)
+    mask = np.zeros((len(series), width), dtype=bool)
+    for row, (days, values) in enumerate(series):
+        x[row, :len(values)] = days
+        y[row, :len(values)] = values
+        mask[row, :len(values)] = True
+    return x, y, mask
+
+
+def ols_slopes(x, y, mask):
+    """Least-squares slopes of stacked, padded series."""
+    return linear_fits(x, y, mask)['slope']
+
+
+THEIL_SEN_MAX_POINTS = 400
+
+
+def thin_series(x, y, max_points=THEIL_SEN_MAX_POINTS):
+    """Keep at most ``max_points`` evenly spaced points (always the first and last) of a series."""
+    if len(x) <= max_points:
+        return x, y
+    keep = np.unique(np.linspace(0, len(x) - 1, max_points).round().astype(np.int64))
+    return x[keep], y[keep]
+
+
+def theil_sen_slopes(x, y, mask):
+    """
+    Theil-Sen slopes of stacked, padded series.
+
+    Each slope is the median of the slopes between all pairs of points with
+    distinct x, so up to ~29% of outlying values cannot move it and
+    same-day observations are never paired. Builds (series, length, length)
+    arrays; ``trend_slopes`` thins longer series to THEIL_SEN_MAX_POINTS
+    first so one series never costs more than that squared.
+    """
+    dx = x[:, None, :] - x[:, :, None]
+    dy = y[:, None, :] - y[:, :, None]
+    valid = mask[:, :, None] & mask[:, None, :] & (dx > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pairwise = np.where(valid, dy / dx, np.nan).reshape(len(x), -1)
+
+    slopes = np.zeros(len(x), dtype=np.float64)
+    has_pairs = valid.reshape(len(x), -1).any(axis=1)
+    if has_pairs.any():
+        slopes[has_pairs] = np.nanmedian(pairwise[has_pairs], axis=1)
+    return slopes
+
+
+def _weighted_lines(x, y, weights):
+    """Weighted least-squares slope and intercept per row."""
+    total = weights.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.einsum('ij,ij->i', weights, x) / total
+        y_mean = np.einsum('ij,ij->i', weights, y) / total
+        dx = x - x_mean[:, None]
+        sxx = np.einsum('ij,ij,ij->i', weights, dx, dx)
+        sxy = np.einsum('ij,ij,ij->i', weights, dx, y - y_mean[:, None])
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+    return np.nan_to_num(slope), np.nan_to_num(y_mean - slope * x_mean)
+
+
+def huber_slopes(x, y, mask, k=1.345, max_iter=50, tol=1e-9):
+    """
+    Huber M-estimator slopes of stacked, padded series, by iteratively
+    reweighted least squares.
+
+    Residuals beyond ``k`` robust standard deviations (MAD / 0.6745) are
+    down-weighted in proportion to their size; iteration stops when no
+    slope moves by more than ``tol`` (relative).
+    """
+    weights = mask.astype(np.float64)
+    slope, intercept = _weighted_lines(x, y, weights)
+    for _ in range(max_iter):
+        residuals = np.where(mask, y - (intercept[:, None] + slope[:, None] * x), np.nan)
+        # MAD is 0 when most points sit exactly on the line; every residual then counts as outlying
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            centre = np.nanmedian(residuals, axis=1, keepdims=True)
+            scale = np.nanmedian(np.abs(residuals - centre), axis=1) / 0.6745
+        scale = np.where(scale > 0, scale, 1e-12)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = np.abs(residuals) / (k * scale[:, None])
+            weights = np.where(mask, np.minimum(1.0, 1.0 / np.maximum(u, 1e-12)), 0.0)
+
+        previous = slope
+        slope, intercept = _weighted_lines(x, y, weights)
+        if np.all(np.abs(slope - previous) <= tol * (1 + np.abs(slope))):
+            break
+    return slope
+
+
+TREND_ESTIMATORS = {
+    'ols': ols_slopes,
+    'theil_sen': theil_sen_slopes,
+    'huber': huber_slopes,
+}
+
+
+def trend_slopes(method, series, max_cells=4_000_000):
+    """
+    Slopes of ``(x, y)`` series under one of ``TREND_ESTIMATORS``.
+
+    Series are sorted by length and padded in batches of at most
+    ``max_cells`` cells (length² per series for Theil-Sen), so one long
+    history neither pads every short one nor exhausts memory. Theil-Sen
+    series are thinned to THEIL_SEN_MAX_POINTS evenly spaced points, which
+    bounds a single series that alone exceeds ``max_cells``.
+    """
+    kernel = TREND_ESTIMATORS[method]
+    if method == 'theil_sen':
+        series = [thin_series(np.asarray(x), np.asarray(y)) for x, y in series]
+
+    def cells(length):
+        return length * length if method == 'theil_sen' else length
+
+    slopes = np.zeros(len(series), dtype=np.float64)
+    batch = []
+
+    def flush():
+        slopes[batch] = kernel(*stack_series([series[index] for index in batch]))
+        batch.clear()
+
+    for index in sorted(range(len(series)), key=lambda index: len(series[index][1])):
+        if batch and (len(batch) + 1) * cells(len(series[index][1])) > max_cells:
+            flush()
+        batch.append(index)
+    if batch:
+        flush()
+    return slopes
+
+
+def trend_slopes_batch(series_by_method):
+    """``trend_slopes`` for several estimators (one executor round trip)."""
+    return {method: trend_slopes(method, series) for method, series in series_by_method.items()}
+
+
+def series_statistics_batch(series_by_metric):
+    """``series_statistics`` for several ``(days, values)`` series (one executor round trip)."""
+    return {metric: series_statistics(days, values) for metric, (days, values) in series_by_metric.items()}
+
+
+def z_scores_batch(values_by_metric):
+    """Absolute z-scores of each series against its own mean and standard deviation."""
+    return {
+        metric: z_scores(values, np.mean(values), np.std(values))
+        for metric, values in values_by_metric.items()
+    }
+
+
+def pairwise_correlations(values):
+    """
+    Pairwise-complete Pearson correlations for stacked, NaN-padded series.
+
+    ``values`` is a (batch, metrics, grid) array with NaN where a metric has
+    no value. Each pair uses only the grid cells both metrics share.
+    Returns ``(r, n)``: (batch, metrics, metrics) coefficients, NaN where
+    undefined, and the number of shared cells.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    m = present.astype(np.float64)
+
+    # Centring each series is free (Pearson is shift-invariant) and keeps the sums well conditioned
+    counts = m.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, np.where(present, values, 0.0).sum(axis=-1, keepdims=True) / counts, 0.0)
+    x = np.where(present, values - means, 0.0)
+
+    n = np.einsum('bit,bjt->bij', m, m)
+    sum_x = np.einsum('bit,bjt->bij', x, m)  # Σ x_i over cells shared with j
+    sum_xx = np.einsum('bit,bjt->bij', x * x, m)
+    sum_xy = np.einsum('bit,bjt->bij', x, x)
+    sum_y = sum_x.transpose(0, 2, 1)
+    sum_yy = sum_xx.transpose(0, 2, 1)
+
+    covariance = n * sum_xy - sum_x * sum_y
+    variance = (n * sum_xx - np.square(sum_x)) * (n * sum_yy - np.square(sum_y))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(variance > 1e-12, covariance / np.sqrt(variance), np.nan)
+    return np.clip(r, -1.0, 1.0), n.astype(np.int64)
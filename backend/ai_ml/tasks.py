@@ -0,0 +1,238 @@
+"""
+Celery tasks for asynchronous and scheduled health analysis.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import increment
+from .models import AnalysisJob, PopulationRun, PopulationShard
+from .population import ShardProcessor, dispatch_shards, requeue_stale_shards, start_population_run
+from .serializers import HealthInsightSerializer, HealthTrendSerializer, HealthRiskSerializer
+from .services import HealthAnalyzer
+
+logger = logging.getLogger(__name__)
+
+
+def submit_analysis_job(patient, job_type, params=None):
+    """
+    Enqueue an analysis job for a patient.
+
+    Submissions matching a job that has not started yet collapse onto it.
+    A running job may already have read the patient's data, so a new
+    submission (e.g. after another record was processed) gets its own job.
+    Returns ``(job, created)``.
+    """
+    params = params or {}
+    signature = ':'.join([job_type] + [f'{key}={params[key]}' for key in sorted(params)])
+
+    jobs = AnalysisJob.objects.filter(patient=patient, signature=signature)
+
+    # A job stuck in flight (e.g. its worker died) must not block new submissions.
+    # Running jobs never touch their row until they finish, so they count as
+    # stuck only once their progress heartbeat has expired as well
+    stale_before = timezone.now() - timedelta(seconds=settings.AI_ML_JOB_STALE_AFTER)
+    stuck = jobs.filter(
+        Q(status=AnalysisJob.JobStatus.PENDING, updated_at__lt=stale_before)
+        | Q(status=AnalysisJob.JobStatus.RUNNING, started_at__lt=stale_before)
+    ).only('id', 'status')
+    stuck_ids = [job.id for job in stuck if job.status == AnalysisJob.JobStatus.PENDING or not job.is_alive]
+    if stuck_ids:
+        AnalysisJob.objects.filter(id__in=stuck_ids, status__in=AnalysisJob.IN_FLIGHT).update(
+            status=AnalysisJob.JobStatus.FAILURE,
+            error='Job timed out',
+            finished_at=timezone.now()
+        )
+
+    pending = jobs.filter(status=AnalysisJob.JobStatus.PENDING)
+    job = pending.first()
+    if job:
+        return job, False
+
+    try:
+        with transaction.atomic():
+            job = AnalysisJob.objects.create(
+                patient=patient,
+                job_type=job_type,
+                params=params,
+                signature=signature
+            )
+    except IntegrityError:
+        # A concurrent submission won the race
+        job = pending.first()
+        if job:
+            return job, False
+        raise
+
+    transaction.on_commit(lambda: run_analysis_job.delay(job.id))
+    return job, True
+
+
+def _run_analysis(job):
+    """Run the analysis a job describes and return its serialized result."""
+    analyzer = HealthAnalyzer(job.patient)
+
+    if job.job_type == AnalysisJob.JobType.TRENDS:
+        trends = analyzer.analyze_trends(metric_name=job.params.get('metric_name'))
+        job.report_progress(80)
+        return {'trends': HealthTrendSerializer(trends, many=True).data, 'count': len(trends)}
+
+    if job.job_type == AnalysisJob.JobType.RISKS:
+        risks = analyzer.assess_health_risks()
+        job.report_progress(80)
+        return {'risks': HealthRiskSerializer(risks, many=True).data, 'count': len(risks)}
+
+    insights = analyzer.generate_insights(on_progress=job.report_progress)
+    job.report_progress(90)
+    return {
+        'insights': HealthInsightSerializer(insights, many=True).data,
+        'count': len(insights),
+        **analyzer.insight_counts
+    }
+
+
+@shared_task
+def run_analysis_job(job_id):
+    """Execute a queued AnalysisJob, recording progress and results."""
+    # Claim the job atomically, so a redelivered task cannot run it twice
+    claimed = AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.JobStatus.PENDING).update(
+        status=AnalysisJob.JobStatus.RUNNING,
+        progress=10,
+        started_at=timezone.now(),
+        task_id=run_analysis_job.request.id or '',
+        updated_at=timezone.now()
+    )
+    if not claimed:
+        return
+    job = AnalysisJob.objects.select_related('patient').get(id=job_id)
+    job.report_progress(10)
+
+    try:
+        job.result = _run_analysis(job)
+        job.status = AnalysisJob.JobStatus.SUCCESS
+    except Exception as e:
+        logger.error(f"Error running analysis job {job.id}: {str(e)}")
+        job.error = str(e)
+        job.status = AnalysisJob.JobStatus.FAILURE
+
+    job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'result', 'error', 'finished_at', 'updated_at'])
+
+
+REANALYSIS_PREFIX = 'ai_ml:reanalysis'
+REANALYSIS_EVENTS = ('triggered', 'coalesced', 'rescheduled', 'submitted')
+
+
+def _reanalysis_key(patient_id):
+    return f'{REANALYSIS_PREFIX}:{patient_id}'
+
+
+def reanalysis_stats():
+    """Counters for the debounced re-analysis trigger."""
+    keys = {f'{REANALYSIS_PREFIX}:stats:{event}': event for event in REANALYSIS_EVENTS}
+    values = cache.get_many(list(keys))
+    return {event: int(values.get(key, 0)) for key, event in keys.items()}
+
+
+def schedule_reanalysis(patient_id):
+    """
+    Debounce a full re-analysis for a patient whose record was processed.
+
+    The first event opens a window of AI_ML_REANALYSIS_DEBOUNCE_SECONDS and
+    schedules one task; events arriving while it is pending only move the
+    window's end. State lives in the cache (Redis), so web and worker
+    processes share it.
+    """
+    window = settings.AI_ML_REANALYSIS_DEBOUNCE_SECONDS
+    increment(f'{REANALYSIS_PREFIX}:stats:triggered')
+
+    if window <= 0 or settings.CELERY_TASK_ALWAYS_EAGER:
+        # Countdowns are ignored when tasks run inline, so debouncing cannot wait
+        _submit_reanalysis(patient_id)
+        return
+
+    now = time.time()
+    key = _reanalysis_key(patient_id)
+    cache.set(f'{key}:last', now, timeout=settings.AI_ML_REANALYSIS_MAX_DELAY_SECONDS + window)
+    if cache.add(f'{key}:pending', now, timeout=settings.AI_ML_REANALYSIS_MAX_DELAY_SECONDS + window):
+        debounced_reanalysis.apply_async(args=[patient_id], countdown=window)
+    else:
+        increment(f'{REANALYSIS_PREFIX}:stats:coalesced')
+
+
+def _submit_reanalysis(patient_id):
+    patient = get_user_model().objects.filter(id=patient_id).first()
+    if patient is None:
+        return
+    submit_analysis_job(patient, AnalysisJob.JobType.INSIGHTS)
+    increment(f'{REANALYSIS_PREFIX}:stats:submitted')
+
+
+@shared_task
+def debounced_reanalysis(patient_id):
+    """Run a pending re-analysis once the patient's records have been quiet for the window."""
+    key = _reanalysis_key(patient_id)
+    now = time.time()
+    window = settings.AI_ML_REANALYSIS_DEBOUNCE_SECONDS
+    first = cache.get(f'{key}:pending') or now
+    last = cache.get(f'{key}:last') or first
+
+    # Keep waiting while events arrive, but never past the maximum delay
+    quiet_for = now - last
+    if quiet_for < window and now - first < settings.AI_ML_REANALYSIS_MAX_DELAY_SECONDS:
+        increment(f'{REANALYSIS_PREFIX}:stats:rescheduled')
+        debounced_reanalysis.apply_async(args=[patient_id], countdown=window - quiet_for)
+        return
+
+    cache.delete_many([f'{key}:pending', f'{key}:last'])
+    try:
+        _submit_reanalysis(patient_id)
+    except Exception as e:
+        logger.error(f"Error submitting re-analysis for patient {patient_id}: {str(e)}")
+
+
+@shared_task
+def run_population_shard(shard_id):
+    """Analyze one population shard, then hand its slot to the next pending shard."""
+    shard = PopulationShard.objects.select_related('run').filter(id=shard_id).first()
+    if shard is None or shard.status != PopulationShard.ShardStatus.RUNNING:
+        return
+
+    shard.task_id = run_population_shard.request.id or ''
+    shard.save(update_fields=['task_id', 'updated_at'])
+
+    try:
+        ShardProcessor(shard).process()
+    except Exception as e:
+        logger.error(f"Error processing population shard {shard.id}: {str(e)}")
+        # Retry from the checkpoint on a later dispatch until attempts run out
+        retry = shard.attempts < settings.AI_ML_POPULATION_SHARD_MAX_ATTEMPTS
+        shard.status = PopulationShard.ShardStatus.PENDING if retry else PopulationShard.ShardStatus.FAILURE
+        shard.error = str(e)
+        shard.save(update_fields=['status', 'error', 'updated_at'])
+
+    dispatch_shards(shard.run)
+
+
+@shared_task
+def run_population_analysis():
+    """Nightly entry point: start a population run, or resume the one in progress."""
+    run, created = start_population_run()
+    logger.info(f"{'Started' if created else 'Resumed'} population run {run.id} ({run.total_shards} shards)")
+    return run.id
+
+
+@shared_task
+def resume_population_runs():
+    """Requeue stale shards of runs in progress and refill free concurrency slots."""
+    for run in PopulationRun.objects.filter(status=PopulationRun.RunStatus.RUNNING):
+        requeue_stale_shards(run)
+        dispatch_shards(run)
@@ -0,0 +1,781 @@
+"""
+Tests for the AI/ML analysis pipeline.
+"""
+import os
+import shutil
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ai_ml import downsampling, metric_registry, risk_rules, signals, stats, tasks, views
+from ai_ml.backends import NumpyAnalysisBackend, PostgresAnalysisBackend
+from ai_ml.benchmarks.suite import compare_reports, load_report, run_suite, save_report
+from ai_ml.benchmarks.synthetic import generate_cohort, select_metrics
+from ai_ml.cache import AnalysisCache
+from ai_ml.cohort import CohortAnomalyEngine, CohortCorrelationEngine, CohortTrendEngine
+from ai_ml.models import AnalysisJob, HealthInsight, HealthMetricObservation, HealthTrend
+from ai_ml.serializers import AnalysisJobSerializer
+from ai_ml.services import AnomalyDetector, HealthAnalyzer, PredictiveModel, TREND_UPDATE_FIELDS
+from ai_ml.tasks import submit_analysis_job
+
+# Irregular visit gaps (days), so x in days differs from the observation index
+VISIT_GAPS = [0, 14, 30, 31, 90, 7, 45, 60, 3]
+EXACT_FIELDS = ['metric_unit', 'data_points', 'trend_direction', 'sample_count', 'normal_range_min', 'normal_range_max']
+
+
+def trend_fields(trend):
+    return {
+        field: getattr(trend, field)
+        for field in TREND_UPDATE_FIELDS
+        if field != 'last_updated'
+    }
+
+
+@pytest.mark.django_db
+def test_incremental_trends_match_full_recompute(settings, monkeypatch, patient, make_record,
+                                                 django_capture_on_commit_callbacks):
+    settings.AI_ML_TREND_ESTIMATOR = 'ols'
+    # Only the incremental path may touch the trends before the comparison
+    monkeypatch.setattr(signals, 'schedule_reanalysis', lambda patient_id: None)
+
+    record_date = date(2023, 1, 1)
+    for visit, gap in enumerate(VISIT_GAPS):
+        record_date += timedelta(days=gap)
+        values = {'HbA1c': 5.5 + 0.1 * visit + (0.4 if visit == 5 else 0), 'LDL Cholesterol': 150 - 3 * visit}
+        with django_capture_on_commit_callbacks(execute=True):
+            make_record(patient, record_date, values)
+
+    incremental = {trend.metric_name: trend_fields(trend) for trend in HealthTrend.objects.filter(patient=patient)}
+    full = {trend.metric_name: trend_fields(trend) for trend in HealthAnalyzer(patient).analyze_trends()}
+
+    assert set(incremental) == {'HbA1c', 'LDL Cholesterol'}
+    assert incremental.keys() == full.keys()
+    for metric, fields in full.items():
+        assert fields['sample_count'] == len(VISIT_GAPS)
+        for field, value in fields.items():
+            if field in EXACT_FIELDS or value is None:
+                assert incremental[metric][field] == value, (metric, field)
+            else:
+                assert incremental[metric][field] == pytest.approx(value, rel=1e-9, abs=1e-9), (metric, field)
+
+
+@pytest.mark.django_db
+def test_cohort_trends_drop_metrics_without_observations(patient, make_record):
+    for visit in range(3):
+        make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), {'HbA1c': 6.0 + 0.1 * visit, 'ALT': 30 + visit})
+    CohortTrendEngine().run([patient.id])
+    HealthMetricObservation.objects.filter(patient=patient, metric_code='ALT').delete()
+
+    CohortTrendEngine().run([patient.id])
+
+    assert list(HealthTrend.objects.filter(patient=patient).values_list('metric_name', flat=True)) == ['HbA1c']
+
+
+def spiked_history(patient, make_record):
+    """Eight normal HbA1c readings and one far outside the normal range."""
+    for visit in range(9):
+        make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), {'HbA1c': 9.0 if visit == 8 else 5.0})
+
+
+@pytest.mark.django_db
+def test_cohort_anomalies_sync_in_bulk_and_retire_stale_ones(patient, make_record):
+    others = [
+        type(patient).objects.create(mobile=f'900000010{index}', first_name='Cohort', last_name=str(index))
+        for index in range(3)
+    ]
+    for member in [patient] + others:
+        spiked_history(member, make_record)
+    engine = CohortAnomalyEngine()
+
+    with CaptureQueriesContext(connection) as single:
+        assert engine.run([patient.id]) == 1
+    with CaptureQueriesContext(connection) as chunk:
+        assert engine.run([member.id for member in others]) == 3
+    assert len(chunk) == len(single)
+
+    HealthMetricObservation.objects.filter(patient=patient, value=9.0).update(value=5.0)
+    assert engine.run([patient.id]) == 0
+    assert not HealthInsight.objects.filter(patient=patient, type=HealthInsight.InsightType.ANOMALY, is_active=True).exists()
+    assert HealthInsight.objects.filter(type=HealthInsight.InsightType.ANOMALY, is_active=True).count() == 3
+
+
+@pytest.mark.django_db
+def test_cohort_correlations_sync_in_bulk_and_retire_stale_ones(patient, make_record):
+    others = [
+        type(patient).objects.create(mobile=f'900000020{index}', first_name='Cohort', last_name=str(index))
+        for index in range(3)
+    ]
+    members = [patient] + others
+    for member in members:
+        for visit in range(8):
+            make_record(member, date(2024, 1, 1) + timedelta(days=30 * visit),
+                        {'HbA1c': 5.5 + 0.2 * visit, 'Fasting Blood Sugar': 95 + 4 * visit + visit % 2})
+    CohortTrendEngine().run([member.id for member in members])
+    engine = CohortCorrelationEngine()
+
+    with CaptureQueriesContext(connection) as single:
+        assert engine.run([patient.id]) == 1
+    with CaptureQueriesContext(connection) as chunk:
+        assert engine.run([member.id for member in others]) == 3
+    assert len(chunk) == len(single)
+
+    HealthTrend.objects.filter(patient=patient, metric_name='Fasting Blood Sugar').delete()
+    assert engine.run([patient.id]) == 0
+    active = HealthInsight.objects.filter(type=HealthInsight.InsightType.CORRELATION, is_active=True)
+    assert sorted(active.values_list('patient_id', flat=True)) == [member.id for member in others]
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='the SQL backend needs PostgreSQL')
+def test_postgres_backend_matches_numpy_backend():
+    for patient in generate_cohort(240, n_patients=3, metrics=select_metrics(12), seed=7):
+        analyzer = HealthAnalyzer(patient)
+        numpy_backend, postgres_backend = NumpyAnalysisBackend(analyzer), PostgresAnalysisBackend(analyzer)
+
+        expected, actual = numpy_backend.trend_statistics(), postgres_backend.trend_statistics()
+        assert actual.keys() == expected.keys()
+        for metric, statistics in expected.items():
+            assert actual[metric].pop('data_points') == statistics.pop('data_points'), metric
+            assert actual[metric] == pytest.approx(statistics, rel=1e-9), metric
+            slopes = [
+                stats.ols_slope(values['sample_count'], values['sum_x'], values['sum_y'], values['sum_xy'], values['sum_xx'])
+                for values in (statistics, actual[metric])
+            ]
+            assert slopes[1] == pytest.approx(slopes[0], rel=1e-9, abs=1e-12), metric
+
+        detector = AnomalyDetector(HealthAnalyzer.NORMAL_RANGES)
+        expected, actual = (
+            sorted(backend.detect_anomalies(detector), key=lambda anomaly: (anomaly['metric'], anomaly['record_id']))
+            for backend in (numpy_backend, postgres_backend)
+        )
+        assert expected
+        assert [(a['metric'], a['record_id'], a['date']) for a in actual] == [
+            (a['metric'], a['record_id'], a['date']) for a in expected
+        ]
+        assert [a['z_score'] for a in actual] == pytest.approx([a['z_score'] for a in expected], rel=1e-6)
+
+
+@pytest.mark.django_db
+def test_reanalysis_keeps_forecast_fit_of_unchanged_trends(patient, make_record):
+    for visit in range(4):
+        make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), {'HbA1c': 6.0 + 0.3 * visit})
+    analyzer = HealthAnalyzer(patient)
+    PredictiveModel.fit_trends(analyzer.analyze_trends())
+    fit = HealthTrend.objects.get(patient=patient, metric_name='HbA1c').forecast_fit
+    assert fit is not None
+
+    analyzer.analyze_trends()
+
+    assert HealthTrend.objects.get(patient=patient, metric_name='HbA1c').forecast_fit == fit
+
+
+@pytest.mark.django_db
+def test_forecast_fit_is_refit_when_series_changes_at_same_size(patient, make_record):
+    records = [
+        make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), {'HbA1c': 6.0 + 0.3 * visit})
+        for visit in range(4)
+    ]
+    PredictiveModel.fit_trends(HealthAnalyzer(patient).analyze_trends())
+    fit = HealthTrend.objects.get(patient=patient, metric_name='HbA1c').forecast_fit
+
+    # One record out, another in: the sample count is unchanged but the series is not.
+    # Restore the fit the delete signal cleared, as if the change bypassed signals
+    records[1].delete()
+    make_record(patient, date(2024, 6, 1), {'HbA1c': 5.0})
+    HealthAnalyzer(patient).analyze_trends()
+    HealthTrend.objects.filter(patient=patient, metric_name='HbA1c').update(forecast_fit=fit)
+    trend = HealthTrend.objects.get(patient=patient, metric_name='HbA1c')
+    assert trend.sample_count == fit['sample_count'] and trend.forecast_fit == fit
+
+    PredictiveModel.fit_trends([trend])
+    assert trend.forecast_fit['series_digest'] != fit['series_digest']
+    assert trend.forecast_fit['slope'] != pytest.approx(fit['slope'])
+
+
+@pytest.mark.django_db
+def test_editing_processed_record_resyncs_observations(monkeypatch, patient, make_record,
+                                                       django_capture_on_commit_callbacks):
+    scheduled = []
+    monkeypatch.setattr(signals, 'schedule_reanalysis', scheduled.append)
+    record = make_record(patient, date(2024, 1, 1), {'HbA1c': 6.0, 'LDL Cholesterol': 150})
+    HealthAnalyzer(patient).analyze_trends()
+    HealthTrend.objects.filter(patient=patient).update(forecast_fit={'sample_count': 1})
+    record = type(record).objects.get(id=record.id)
+
+    record.extracted_values['HbA1c'] = 7.5
+    del record.extracted_values['LDL Cholesterol']
+    record.record_date = date(2024, 2, 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        record.save()
+
+    assert list(HealthMetricObservation.objects.filter(record=record).values_list(
+        'metric_code', 'value', 'observed_on'
+    )) == [('HbA1c', 7.5, date(2024, 2, 1))]
+    assert scheduled == [patient.id]
+    assert not HealthTrend.objects.filter(patient=patient, forecast_fit__isnull=False).exists()
+
+    scheduled.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        record.save()
+    assert scheduled == []
+
+
+@pytest.mark.django_db
+def test_removing_processed_record_schedules_reanalysis(monkeypatch, patient, make_record,
+                                                        django_capture_on_commit_callbacks):
+    scheduled = []
+    monkeypatch.setattr(signals, 'schedule_reanalysis', scheduled.append)
+    kept = make_record(patient, date(2024, 1, 1), {'HbA1c': 6.0})
+    withdrawn = make_record(patient, date(2024, 2, 1), {'HbA1c': 6.4, 'LDL Cholesterol': 150})
+    deleted = make_record(patient, date(2024, 3, 1), {'HbA1c': 6.8, 'LDL Cholesterol': 140})
+    HealthAnalyzer(patient).analyze_trends()
+    HealthTrend.objects.filter(patient=patient).update(forecast_fit={'sample_count': 3})
+
+    withdrawn = type(withdrawn).objects.get(id=withdrawn.id)
+    withdrawn.status = type(withdrawn).RecordStatus.ERROR
+    with django_capture_on_commit_callbacks(execute=True):
+        withdrawn.save()
+    with django_capture_on_commit_callbacks(execute=True):
+        type(deleted).objects.get(id=deleted.id).delete()
+
+    assert scheduled == [patient.id, patient.id]
+    assert not HealthTrend.objects.filter(patient=patient, forecast_fit__isnull=False).exists()
+    assert list(HealthMetricObservation.objects.filter(patient=patient).values_list('record_id', flat=True)) == [kept.id]
+
+    HealthAnalyzer(patient).analyze_trends()
+    assert not HealthTrend.objects.filter(patient=patient, metric_name='LDL Cholesterol').exists()
+
+
+@pytest.mark.django_db
+def test_analysis_cache_key_changes_when_rule_files_reload(settings, monkeypatch, tmp_path, patient):
+    settings.AI_ML_METRIC_REGISTRY_PATH = shutil.copy(metric_registry.DEFAULT_REGISTRY_PATH, tmp_path)
+    monkeypatch.setattr(risk_rules, 'RULES_PATH', shutil.copy(risk_rules.RULES_PATH, tmp_path))
+    # Check the files on every lookup; the loaded rules are restored afterwards
+    for module in (metric_registry, risk_rules):
+        monkeypatch.setattr(module, 'RELOAD_CHECK_INTERVAL', 0)
+        monkeypatch.setattr(module, '_loaded_mtime', None)
+    monkeypatch.setattr(metric_registry, '_registry', metric_registry._registry)
+    monkeypatch.setattr(risk_rules, '_default', risk_rules._default)
+
+    cache = AnalysisCache(patient)
+    keys = [cache.key('risks')]
+    os.utime(risk_rules.RULES_PATH, (1, 1))
+    keys.append(cache.key('risks'))
+    os.utime(settings.AI_ML_METRIC_REGISTRY_PATH, (1, 1))
+    keys.append(cache.key('risks'))
+
+    assert len(set(keys)) == 3
+
+
+@pytest.mark.parametrize('name, code', [
+    ('HbA1c', 'HbA1c'),
+    ('HBA1C', 'HbA1c'),
+    ('Hb-A1c', 'HbA1c'),
+    ('Glycosylated  Haemoglobin', 'HbA1c'),
+    ('HbA1c (%)', 'HbA1c'),
+    ('fasting blood glucose', 'Fasting Blood Sugar'),
+    ('Fasting Blood Sugar (mg/dL)', 'Fasting Blood Sugar'),
+    ('S. Creatinine', 'Creatinine'),
+    ('Creatinine [mg/dl]', 'Creatinine'),
+    ('sgpt', 'ALT'),
+    ('ALT (SGPT)', 'ALT'),
+    ('Platelets (/uL)', 'Platelet Count'),
+    ('Vitamin D (ng/mL)', None),
+])
+def test_metric_synonyms_resolve_to_canonical_code(name, code):
+    assert metric_registry.get_metric_registry().resolve(name) == code
+
+
+def test_metric_mentions_prefer_the_longest_synonym():
+    registry = metric_registry.get_metric_registry()
+    text = 'Glycated Hemoglobin: 6.1 %, Hemoglobin 13.5 g/dL; HDL Cholesterol Direct 48, LDL-C 130'
+    assert [code for code, _, _ in registry.find_in_text(text)] == [
+        'HbA1c', 'Hemoglobin', 'HDL Cholesterol', 'LDL Cholesterol'
+    ]
+
+
+def test_alt_band_starts_just_above_normal_range():
+    rule = next(
+        rule for category in risk_rules.RiskRuleEngine.from_file().categories
+        for rule in category.rules if rule.metric == 'ALT'
+    )
+    assert metric_registry.get_metric_registry().normal_ranges['ALT'][1] == 56
+    assert list(rule.band_index(np.array([56.0, 56.5, 57.0]))) == [0, 1, 1]
+
+
+@pytest.mark.parametrize('offset', [0.0, 1e6])
+def test_welford_matches_numpy_mean_and_variance(offset):
+    values = offset + np.random.default_rng(11).normal(5, 2, 500)
+    count, mean, m2 = 0, 0.0, 0.0
+    for prefix, value in enumerate(values, start=1):
+        count, mean, m2 = stats.welford_update(count, mean, m2, value)
+        if prefix in (1, 2, 17, 500):
+            assert mean == pytest.approx(np.mean(values[:prefix]), rel=1e-12)
+            assert m2 / count == pytest.approx(np.var(values[:prefix]), rel=1e-8, abs=1e-12)
+            assert stats.running_std(count, m2) == pytest.approx(np.std(values[:prefix]), rel=1e-8, abs=1e-12)
+
+
+def legacy_anomalies(metric_name, values, normal_range):
+    """Indices and z-scores the per-value anomaly loop flagged."""
+    mean, std = np.mean(values), np.std(values)
+    flagged = []
+    for index, value in enumerate(values):
+        z_score = abs((value - mean) / (std + 1e-10))
+        low, high = normal_range
+        if z_score > 2 and ((low is not None and value < low) or (high is not None and value > high)):
+            flagged.append((index, z_score))
+    return flagged
+
+
+def test_vectorized_anomaly_scan_matches_legacy_loop():
+    rng = np.random.default_rng(5)
+    detector = AnomalyDetector(HealthAnalyzer.NORMAL_RANGES)
+    values_by_metric = {
+        'HbA1c': np.r_[rng.normal(5.2, 0.2, 40), 9.5, 3.0],
+        'Fasting Blood Sugar': np.r_[rng.normal(90, 5, 25), 180],
+        'LDL Cholesterol': np.r_[rng.normal(110, 8, 30), 40],
+        'Not A Metric': np.r_[rng.normal(0, 1, 20), 50],
+        'Creatinine': np.full(6, 1.0),
+    }
+    z_by_metric = stats.z_scores_batch(values_by_metric)
+    flagged = 0
+
+    for metric, values in values_by_metric.items():
+        days = np.arange(len(values))
+        anomalies = detector.collect(metric, values, z_by_metric[metric], days, days + 1000)
+        expected = legacy_anomalies(metric, values, HealthAnalyzer.NORMAL_RANGES.get(metric, (None, None)))
+
+        assert [anomaly['record_id'] - 1000 for anomaly in anomalies] == [index for index, _ in expected], metric
+        assert [anomaly['z_score'] for anomaly in anomalies] == pytest.approx([z for _, z in expected]), metric
+        flagged += len(anomalies)
+    assert flagged >= 3
+
+
+def legacy_risk_assessments(latest):
+    """The if/elif risk assessment that preceded the rule file, on a {metric: latest value} dict."""
+    def level(score):
+        return 'LOW' if score < 30 else ('MODERATE' if score < 60 else ('HIGH' if score < 80 else 'CRITICAL'))
+
+    def first_band(value, bands):
+        for threshold, points, message in bands:
+            if value >= threshold:
+                return points, [message.format(value=value)]
+        return 0, []
+
+    tables = {
+        'DIABETES': [
+            ('HbA1c', [(6.5, 80, 'HbA1c level ({value}%) indicates diabetes'),
+                       (5.7, 50, 'HbA1c level ({value}%) indicates pre-diabetes')]),
+            ('Fasting Blood Sugar', [(126, 70, 'Fasting blood sugar ({value} mg/dL) indicates diabetes'),
+                                     (100, 40, 'Fasting blood sugar ({value} mg/dL) is elevated')]),
+        ],
+        'HYPERTENSION': [
+            ('Blood Pressure Systolic', [(180, 90, 'Very high systolic BP ({value} mmHg) - Hypertensive Crisis'),
+                                         (140, 70, 'High systolic BP ({value} mmHg) - Stage 2 Hypertension'),
+                                         (130, 50, 'Elevated systolic BP ({value} mmHg) - Stage 1 Hypertension'),
+                                         (120, 30, 'High-normal systolic BP ({value} mmHg)')]),
+            ('Blood Pressure Diastolic', [(120, 90, 'Very high diastolic BP ({value} mmHg) - Hypertensive Crisis'),
+                                          (90, 70, 'High diastolic BP ({value} mmHg) - Stage 2 Hypertension'),
+                                          (80, 50, 'Elevated diastolic BP ({value} mmHg) - Stage 1 Hypertension')]),
+        ],
+        'HEART_DISEASE': [
+            ('Total Cholesterol', [(240, 60, 'High total cholesterol ({value} mg/dL)'),
+                                   (200, 40, 'Borderline high total cholesterol ({value} mg/dL)')]),
+            ('LDL Cholesterol', [(190, 70, 'Very high LDL cholesterol ({value} mg/dL)'),
+                                 (160, 50, 'High LDL cholesterol ({value} mg/dL)'),
+                                 (130, 30, 'Borderline high LDL cholesterol ({value} mg/dL)')]),
+            ('Blood Pressure Systolic', [(140, 30, 'High blood pressure increases heart disease risk')]),
+        ],
+    }
+    assessments = {}
+    for category, rules in tables.items():
+        score, factors = 0.0, []
+        for metric, bands in rules:
+            if metric in latest:
+                points, messages = first_band(latest[metric], bands)
+                score += points
+                factors += messages
+        if score > 0:
+            assessments[category] = (min(score, 100), level(score), factors)
+    return assessments
+
+
+LEGACY_RISK_THRESHOLDS = {
+    'HbA1c': [5.7, 6.5],
+    'Fasting Blood Sugar': [100, 126],
+    'Blood Pressure Systolic': [120, 130, 140, 180],
+    'Blood Pressure Diastolic': [80, 90, 120],
+    'Total Cholesterol': [200, 240],
+    'LDL Cholesterol': [130, 160, 190],
+}
+
+
+def around(threshold):
+    return [np.nextafter(threshold, -np.inf), threshold, np.nextafter(threshold, np.inf), threshold - 0.1, threshold + 0.1]
+
+
+@pytest.mark.parametrize('metric, threshold', [
+    (metric, threshold) for metric, thresholds in LEGACY_RISK_THRESHOLDS.items() for threshold in thresholds
+])
+def test_risk_rules_match_legacy_assessment_at_thresholds(metric, threshold):
+    engine = risk_rules.RiskRuleEngine.from_file()
+    # Alone, and next to a second metric in the same category that is already in a band
+    companions = [{}, {'HbA1c': 6.0, 'Blood Pressure Systolic': 135.0, 'Blood Pressure Diastolic': 85.0, 'LDL Cholesterol': 170.0}]
+    for companion in companions:
+        for value in around(float(threshold)):
+            latest = {**companion, metric: value}
+            row = [latest.get(name, np.nan) for name in engine.metrics]
+
+            actual = {
+                assessment['category']: (assessment['risk_score'], assessment['risk_level'], assessment['contributing_factors'])
+                for assessment in engine.evaluate([row], engine.metrics)[0]
+            }
+
+            assert actual == legacy_risk_assessments(latest), latest
+
+
+def theil_sen_reference(x, y):
+    """Median pairwise slope, one pair at a time."""
+    slopes = [
+        (y[j] - y[i]) / (x[j] - x[i])
+        for i in range(len(x)) for j in range(len(x)) if x[j] > x[i]
+    ]
+    return float(np.median(slopes)) if slopes else 0.0
+
+
+def huber_reference(x, y, k=1.345, max_iter=50, tol=1e-9):
+    """Huber IRLS on a single series with np.polyfit."""
+    weights = np.ones(len(x))
+    slope, intercept = np.polyfit(x, y, 1)
+    for _ in range(max_iter):
+        residuals = y - (intercept + slope * x)
+        scale = np.median(np.abs(residuals - np.median(residuals))) / 0.6745 or 1e-12
+        weights = np.minimum(1.0, k * scale / np.maximum(np.abs(residuals), 1e-12 * k * scale))
+        previous = slope
+        slope, intercept = np.polyfit(x, y, 1, w=np.sqrt(weights))
+        if abs(slope - previous) <= tol * (1 + abs(slope)):
+            break
+    return slope
+
+
+def outlier_series():
+    """Ragged noisy lines with a few gross outliers and a same-day pair."""
+    rng = np.random.default_rng(7)
+    series = []
+    for length, slope in [(5, 0.5), (12, -1.0), (30, 0.02), (9, 3.0)]:
+        x = np.cumsum(rng.integers(1, 40, length)).astype(np.float64)
+        y = 10 + slope * x + rng.normal(0, 0.5, length)
+        y[-1] += 50
+        series.append((x, y))
+    x, y = series[1]
+    series[1] = (np.append(x, x[-1]), np.append(y, y[-1] + 2))
+    return series
+
+
+@pytest.mark.parametrize('method, reference', [
+    ('theil_sen', theil_sen_reference),
+    ('huber', huber_reference),
+])
+def test_robust_slopes_match_scalar_reference(method, reference):
+    series = outlier_series()
+    expected = [reference(x, y) for x, y in series]
+
+    # One padded batch, and one batch per series
+    assert stats.trend_slopes(method, series) == pytest.approx(expected, rel=1e-6, abs=1e-9)
+    assert stats.trend_slopes(method, series, max_cells=1) == pytest.approx(expected, rel=1e-6, abs=1e-9)
+    # The outliers pull least squares, not the robust fits
+    true_slopes = np.array([0.5, -1.0, 0.02, 3.0])
+    ols = stats.trend_slopes('ols', series)
+    assert np.all(np.abs(ols - true_slopes) > np.abs(np.array(expected) - true_slopes))
+
+
+def test_robust_slopes_ignore_padding():
+    x, y, mask = stats.stack_series([([0.0, 10.0, 20.0], [1.0, 2.0, 3.0]), ([0.0, 5.0], [4.0, 2.0]), ([3.0], [7.0])])
+    # Padded cells would pull both fits towards zero if they were used
+    x[~mask], y[~mask] = 100.0, -100.0
+
+    assert stats.theil_sen_slopes(x, y, mask) == pytest.approx([0.1, -0.4, 0.0])
+    assert stats.huber_slopes(x, y, mask) == pytest.approx([0.1, -0.4, 0.0])
+
+
+def test_theil_sen_thins_long_series():
+    x = np.arange(1000, dtype=np.float64)
+    y = 2.0 + 0.3 * x + np.where(x % 7 == 0, 40.0, 0.0)
+    thin_x, thin_y = stats.thin_series(x, y)
+
+    assert len(thin_x) == stats.THEIL_SEN_MAX_POINTS
+    assert (thin_x[0], thin_x[-1]) == (0.0, 999.0)
+    assert stats.trend_slopes('theil_sen', [(x, y), (x[:10], y[:10])]) == pytest.approx(
+        [theil_sen_reference(thin_x, thin_y), theil_sen_reference(x[:10], y[:10])]
+    )
+
+
+def chart_trend(days):
+    """An unsaved HbA1c trend with one data point per day offset from 2023-01-02 (a Monday)."""
+    start = date(2023, 1, 2)
+    return HealthTrend(metric_name='HbA1c', data_points=[
+        {'date': (start + timedelta(days=int(day))).isoformat(), 'value': 5.0 + np.sin(day / 9) + (20 if day == 500 else 0)}
+        for day in days
+    ])
+
+
+@pytest.mark.parametrize('points', [3, 10, 100, 999])
+def test_lttb_keeps_endpoints_and_peaks(points):
+    trend = chart_trend(range(1000))
+    series = downsampling.downsample_trend(trend, 'lttb', points)['points']
+
+    assert len(series) == points
+    assert series[0] == trend.data_points[0] and series[-1] == trend.data_points[-1]
+    assert [point['date'] for point in series] == sorted(point['date'] for point in series)
+    if points >= 10:
+        assert trend.data_points[500] in series
+
+
+def test_lttb_returns_short_series_unchanged():
+    trend = chart_trend(range(20))
+    assert downsampling.downsample_trend(trend, 'lttb', 50)['points'] == trend.data_points
+
+
+@pytest.mark.parametrize('resolution, period_start', [
+    ('week', lambda day: day - timedelta(days=day.weekday())),
+    ('month', lambda day: day.replace(day=1)),
+    ('year', lambda day: day.replace(month=1, day=1)),
+])
+def test_calendar_buckets_aggregate_each_period(resolution, period_start):
+    trend = chart_trend(np.cumsum(np.random.default_rng(3).integers(1, 12, 150)))
+    expected = {}
+    for point in trend.data_points:
+        expected.setdefault(period_start(date.fromisoformat(point['date'])).isoformat(), []).append(point['value'])
+
+    series = downsampling.downsample_trend(trend, resolution)
+
+    assert series['source_count'] == len(trend.data_points)
+    assert [bucket['date'] for bucket in series['points']] == list(expected)
+    for bucket, values in zip(series['points'], expected.values()):
+        assert bucket['count'] == len(values)
+        assert (bucket['min'], bucket['max']) == (min(values), max(values))
+        assert bucket['mean'] == pytest.approx(np.mean(values))
+
+
+def insight_query_count(patient, make_record, metric_count):
+    for visit in range(4):
+        values = {f'Marker {index}': 10.0 + index + visit * (index % 3 - 1) for index in range(metric_count - 1)}
+        values['HbA1c'] = 6.0 + 0.3 * visit
+        make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), values)
+    with CaptureQueriesContext(connection) as queries:
+        insights = HealthAnalyzer(patient).generate_insights()
+    assert insights
+    return len(queries)
+
+
+@pytest.mark.django_db
+def test_generate_insights_query_count_is_constant(patient, make_record):
+    other = type(patient).objects.create(mobile='9000000009', first_name='Many', last_name='Metrics')
+    assert insight_query_count(patient, make_record, 2) == insight_query_count(other, make_record, 30)
+
+
+@pytest.fixture
+def api_client(patient):
+    client = APIClient()
+    client.force_authenticate(patient)
+    return client
+
+
+@pytest.fixture
+def processed_history(patient, make_record):
+    for visit in range(4):
+        make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), {'HbA1c': 6.0 + 0.3 * visit})
+
+
+@pytest.mark.django_db
+def test_benchmark_report_round_trips_and_compares(tmp_path):
+    patients = generate_cohort(20, n_patients=2, metrics=select_metrics(4), seed=3)
+    report = run_suite(patients, {'patients': 2}, repeat=1, operations=['analyze_trends', 'assess_health_risks'])
+    path = tmp_path / 'baseline.json'
+    save_report(report, path)
+
+    baseline = load_report(path)
+    assert baseline == report
+
+    baseline['results']['assess_health_risks'].update(wall_ms=report['results']['assess_health_risks']['wall_ms'] / 2, queries=0)
+    del baseline['results']['analyze_trends']
+    comparison = compare_reports(baseline, report)
+
+    assert list(comparison) == ['assess_health_risks']
+    changes = comparison['assess_health_risks']
+    assert changes['wall_ms']['change_pct'] == pytest.approx(100.0)
+    assert changes['queries'] == {'baseline': 0, 'current': report['results']['assess_health_risks']['queries'], 'change_pct': None}
+    assert changes['peak_kib']['change_pct'] == 0
+
+
+@pytest.mark.django_db
+def test_new_record_busts_cached_trend_series(settings, monkeypatch, api_client, patient, make_record,
+                                              django_capture_on_commit_callbacks):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    monkeypatch.setattr(signals, 'schedule_reanalysis', lambda patient_id: None)
+    computed = []
+    monkeypatch.setattr(views, 'downsample_trend', lambda *args: computed.append(args) or downsampling.downsample_trend(*args))
+    for visit in range(4):
+        with django_capture_on_commit_callbacks(execute=True):
+            make_record(patient, date(2024, 1, 1) + timedelta(days=30 * visit), {'HbA1c': 6.0 + 0.3 * visit})
+    url = f"/api/v1/ai/trends/{HealthTrend.objects.get(patient=patient).id}/series/?points=10"
+
+    first, second = api_client.get(url).json(), api_client.get(url).json()
+    with django_capture_on_commit_callbacks(execute=True):
+        make_record(patient, date(2024, 6, 1), {'HbA1c': 7.5})
+    third = api_client.get(url).json()
+
+    assert len(computed) == 2
+    assert first == second and first['source_count'] == 4
+    assert third['source_count'] == 5 and third['points'][-1]['value'] == 7.5
+
+
+@pytest.mark.django_db
+def test_async_job_runs_and_can_be_polled(api_client, processed_history, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post('/api/v1/ai/insights/generate/', {'async': True}, format='json')
+    assert response.status_code == 202
+    job_id = response.json()['job']['id']
+
+    job = api_client.get(f'/api/v1/ai/jobs/{job_id}/').json()
+    assert job['status'] == AnalysisJob.JobStatus.SUCCESS
+    assert job['progress'] == 100
+    assert job['result']['count'] == len(job['result']['insights']) > 0
+
+
+@pytest.mark.django_db
+def test_insight_list_defaults_to_active(api_client, patient):
+    active, inactive = HealthInsight.objects.bulk_create([
+        HealthInsight(patient=patient, type=HealthInsight.InsightType.choices[0][0], title=title,
+                      description='-', is_active=is_active)
+        for title, is_active in (('Current', True), ('Superseded', False))
+    ])
+
+    listed = [item['id'] for item in api_client.get('/api/v1/ai/insights/').json()['results']]
+    filtered = [item['id'] for item in api_client.get('/api/v1/ai/insights/?is_active=false').json()['results']]
+    assert listed == [active.id]
+    assert filtered == [inactive.id]
+
+
+@pytest.mark.django_db
+def test_pending_job_is_deduplicated(patient):
+    # on_commit never fires inside the test transaction, so the job stays PENDING
+    job, created = submit_analysis_job(patient, AnalysisJob.JobType.TRENDS, {'metric_name': 'HbA1c'})
+    again, created_again = submit_analysis_job(patient, AnalysisJob.JobType.TRENDS, {'metric_name': 'HbA1c'})
+    other, created_other = submit_analysis_job(patient, AnalysisJob.JobType.TRENDS, {'metric_name': 'LDL Cholesterol'})
+
+    assert created and not created_again and created_other
+    assert again.id == job.id and other.id != job.id
+
+
+@pytest.mark.django_db
+def test_running_job_is_not_deduplicated(patient):
+    job, _ = submit_analysis_job(patient, AnalysisJob.JobType.INSIGHTS)
+    AnalysisJob.objects.filter(id=job.id).update(status=AnalysisJob.JobStatus.RUNNING)
+
+    # The running job may have read the data before the newest record arrived
+    fresh, created = submit_analysis_job(patient, AnalysisJob.JobType.INSIGHTS)
+    assert created and fresh.id != job.id
+    assert fresh.status == AnalysisJob.JobStatus.PENDING
+
+
+@pytest.mark.django_db
+def test_stale_job_is_failed_and_replaced(settings, patient):
+    job, _ = submit_analysis_job(patient, AnalysisJob.JobType.RISKS)
+    AnalysisJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(
+        seconds=settings.AI_ML_JOB_STALE_AFTER + 1
+    ))
+
+    fresh, created = submit_analysis_job(patient, AnalysisJob.JobType.RISKS)
+    job.refresh_from_db()
+    assert created and fresh.id != job.id
+    assert job.status == AnalysisJob.JobStatus.FAILURE and job.error == 'Job timed out'
+
+
+@pytest.mark.django_db
+def test_long_running_job_is_failed_only_without_heartbeat(settings, patient):
+    job, _ = submit_analysis_job(patient, AnalysisJob.JobType.RISKS)
+    long_ago = timezone.now() - timedelta(seconds=settings.AI_ML_JOB_STALE_AFTER + 1)
+    AnalysisJob.objects.filter(id=job.id).update(
+        status=AnalysisJob.JobStatus.RUNNING, started_at=long_ago, updated_at=long_ago
+    )
+    job.report_progress(55)
+
+    submit_analysis_job(patient, AnalysisJob.JobType.RISKS)
+    job.refresh_from_db()
+    assert job.status == AnalysisJob.JobStatus.RUNNING
+
+    cache.delete(job._progress_key())
+    submit_analysis_job(patient, AnalysisJob.JobType.RISKS)
+    job.refresh_from_db()
+    assert job.status == AnalysisJob.JobStatus.FAILURE
+
+
+@pytest.mark.django_db
+def test_reanalysis_is_debounced_across_processed_records(settings, monkeypatch, patient, make_record,
+                                                          django_capture_on_commit_callbacks):
+    settings.CELERY_TASK_ALWAYS_EAGER = False
+    settings.AI_ML_REANALYSIS_DEBOUNCE_SECONDS = 60
+    scheduled = []
+    monkeypatch.setattr(tasks.debounced_reanalysis, 'apply_async', lambda args, countdown: scheduled.append(countdown))
+    clock = [1_000_000.0]
+    monkeypatch.setattr(tasks.time, 'time', lambda: clock[0])
+
+    for visit in range(3):
+        clock[0] += 5
+        with django_capture_on_commit_callbacks(execute=True):
+            make_record(patient, date(2024, 1, 1) + timedelta(days=visit), {'HbA1c': 6.0 + 0.1 * visit})
+
+    assert scheduled == [60]
+    assert tasks.reanalysis_stats() == {'triggered': 3, 'coalesced': 2, 'rescheduled': 0, 'submitted': 0}
+
+    # The first task wakes while the last event is 50s old, so it waits out the rest
+    clock[0] += 50
+    tasks.debounced_reanalysis(patient.id)
+    assert scheduled == [60, 10]
+    assert not AnalysisJob.objects.filter(patient=patient).exists()
+
+    clock[0] += 10
+    tasks.debounced_reanalysis(patient.id)
+    assert AnalysisJob.objects.filter(patient=patient, job_type=AnalysisJob.JobType.INSIGHTS).count() == 1
+    assert tasks.reanalysis_stats() == {'triggered': 3, 'coalesced': 2, 'rescheduled': 1, 'submitted': 1}
+
+
+@pytest.mark.django_db
+def test_failed_job_records_error(monkeypatch, patient, django_capture_on_commit_callbacks):
+    def fail(self, on_progress=None):
+        raise ValueError('analysis exploded')
+    monkeypatch.setattr(HealthAnalyzer, 'generate_insights', fail)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        job, _ = submit_analysis_job(patient, AnalysisJob.JobType.INSIGHTS)
+    job.refresh_from_db()
+
+    assert job.status == AnalysisJob.JobStatus.FAILURE
+    assert job.error == 'analysis exploded'
+    assert job.progress == 100 and job.finished_at is not None
+
+
+@pytest.mark.django_db
+def test_job_reports_progress_per_stage(monkeypatch, patient, processed_history, django_capture_on_commit_callbacks):
+    reported = []
+    monkeypatch.setattr(AnalysisJob, 'report_progress', lambda job, progress: reported.append(progress))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        submit_analysis_job(patient, AnalysisJob.JobType.INSIGHTS)
+
+    assert reported == [10, 30, 55, 75, 90]
+
+
+@pytest.mark.django_db
+def test_running_job_serializes_live_progress(patient):
+    job, _ = submit_analysis_job(patient, AnalysisJob.JobType.INSIGHTS)
+    job.status = AnalysisJob.JobStatus.RUNNING
+    job.report_progress(55)
+
+    assert AnalysisJobSerializer(job).data['progress'] == 55
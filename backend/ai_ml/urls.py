@@ -9,10 +9,13 @@ router = DefaultRouter()
 router.register(r'trends', views.HealthTrendViewSet, basename='healthtrend')
 router.register(r'risks', views.HealthRiskViewSet, basename='healthrisk')
 router.register(r'insights', views.HealthInsightViewSet, basename='healthinsight')
+router.register(r'jobs', views.AnalysisJobViewSet, basename='analysisjob')
 
 app_name = 'ai_ml'
 
 urlpatterns = [
+    path('cache/stats/', views.analysis_cache_stats, name='analysis-cache-stats'),
+    path('reanalysis/stats/', views.reanalysis_trigger_stats, name='reanalysis-stats'),
     path('', include(router.urls)),
 ]
 
@@ -2,21 +2,49 @@
 API views for AI/ML features.
 """
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
-from .models import HealthInsight, HealthTrend, HealthRisk
-from .serializers import HealthInsightSerializer, HealthTrendSerializer, HealthRiskSerializer
+from django.db.models import Prefetch
+from api.pagination import KeysetPagination
+from core.models import HealthRecord
+from .models import HealthInsight, HealthTrend, HealthRisk, AnalysisJob
+from .serializers import (
+    HealthInsightSerializer, HealthTrendSerializer, HealthTrendSummarySerializer,
+    HealthRiskSerializer, AnalysisJobSerializer
+)
+from .cache import AnalysisCache, TrendSeriesCache, cache_stats
+from .downsampling import DEFAULT_POINTS, MAX_POINTS, MIN_POINTS, RESOLUTIONS, downsample_trend
 from .services import HealthAnalyzer, PredictiveModel
+from .tasks import reanalysis_stats, submit_analysis_job
 import logging
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
-class HealthTrendViewSet(viewsets.ReadOnlyModelViewSet):
+class AsyncAnalysisMixin:
+    """Lets analysis actions run as background jobs when ``async`` is requested."""
+    
+    def wants_async(self, request):
+        """Whether the client asked for a background job (?async=true or {"async": true})."""
+        value = request.data.get('async', request.query_params.get('async', False))
+        return str(value).lower() in ('1', 'true', 'yes')
+    
+    def submit_job(self, request, job_type, params=None):
+        """Enqueue (or join) an analysis job and return 202 with its status."""
+        job, created = submit_analysis_job(request.user, job_type, params)
+        job.refresh_from_db()
+        return Response({
+            'success': True,
+            'job': AnalysisJobSerializer(job).data,
+            'deduplicated': not created
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class HealthTrendViewSet(AsyncAnalysisMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for health trends."""
     serializer_class = HealthTrendSerializer
     permission_classes = [IsAuthenticated]
@@ -25,7 +53,20 @@ class HealthTrendViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         """Return trends for the current user."""
-        return HealthTrend.objects.filter(patient=self.request.user)
+        queryset = HealthTrend.objects.filter(patient=self.request.user).select_related('patient')
+        if self.omits_data_points():
+            queryset = queryset.defer('data_points')
+        return queryset
+    
+    def omits_data_points(self):
+        """Whether a list request asked for trends without data points (?data_points=false)."""
+        value = self.request.query_params.get('data_points', 'true')
+        return self.action == 'list' and value.lower() in ('0', 'false', 'no')
+    
+    def get_serializer_class(self):
+        if self.omits_data_points():
+            return HealthTrendSummarySerializer
+        return super().get_serializer_class()
     
     @action(detail=False, methods=['post'])
     def analyze(self, request):
@@ -33,12 +74,19 @@ class HealthTrendViewSet(viewsets.ReadOnlyModelViewSet):
         analyzer = HealthAnalyzer(request.user)
         metric_name = request.data.get('metric_name')  # Optional
         
+        if self.wants_async(request):
+            params = {'metric_name': metric_name} if metric_name else {}
+            return self.submit_job(request, AnalysisJob.JobType.TRENDS, params)
+        
         try:
-            trends = analyzer.analyze_trends(metric_name=metric_name)
-            serializer = self.get_serializer(trends, many=True)
+            trends = AnalysisCache(request.user).get_or_compute(
+                'trends',
+                lambda: list(self.get_serializer(analyzer.analyze_trends(metric_name=metric_name), many=True).data),
+                params=metric_name or ''
+            )
             return Response({
                 'success': True,
-                'trends': serializer.data,
+                'trends': trends,
                 'count': len(trends)
             }, status=status.HTTP_200_OK)
         except Exception as e:
@@ -55,11 +103,10 @@ class HealthTrendViewSet(viewsets.ReadOnlyModelViewSet):
         days_ahead = int(request.query_params.get('days_ahead', 90))
         
         try:
-            predictions = PredictiveModel.predict_future_values(
-                request.user,
-                trend.metric_name,
-                days_ahead=days_ahead
-            )
+            predictions = PredictiveModel.forecast(
+                [trend],
+                horizons=range(30, days_ahead + 1, 30)
+            ).get(trend.metric_name)
             
             if predictions:
                 return Response({
@@ -78,9 +125,80 @@ class HealthTrendViewSet(viewsets.ReadOnlyModelViewSet):
                 'success': False,
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=True, methods=['get'])
+    def series(self, request, pk=None):
+        """
+        The trend's data points downsampled for charting.
+        
+        ?resolution=lttb (default, at most ?points= points) or week, month,
+        year (min/max/mean buckets per period).
+        """
+        trend = self.get_object()
+        resolution = request.query_params.get('resolution', 'lttb')
+        try:
+            points = int(request.query_params.get('points', DEFAULT_POINTS))
+        except ValueError:
+            points = 0
+        
+        if resolution not in RESOLUTIONS or not MIN_POINTS <= points <= MAX_POINTS:
+            return Response({
+                'success': False,
+                'error': f'resolution must be one of {", ".join(RESOLUTIONS)} and points between {MIN_POINTS} and {MAX_POINTS}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            series = TrendSeriesCache(trend).get_or_compute(
+                lambda: downsample_trend(trend, resolution, points),
+                params=f'{resolution}:{points}' if resolution == 'lttb' else resolution
+            )
+            return Response({
+                'success': True,
+                'metric_name': trend.metric_name,
+                'metric_unit': trend.metric_unit,
+                **series
+            })
+        except Exception as e:
+            logger.error(f"Error downsampling trend series: {str(e)}")
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """Forecast all of the user's trends (or ?metric_name=) at the given horizons."""
+        try:
+            horizons = [int(days) for days in request.query_params.get('horizons', '30,60,90').split(',')]
+            confidence = float(request.query_params.get('confidence', 0.95))
+        except ValueError:
+            horizons, confidence = [], 0
+        
+        if not horizons or min(horizons) < 1 or not 0 < confidence < 1:
+            return Response({
+                'success': False,
+                'error': 'horizons must be positive day counts and confidence between 0 and 1'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # Fits read observations, so the data_points JSON is not needed
+            trends = PredictiveModel.defer_series(self.filter_queryset(self.get_queryset()))
+            forecasts = PredictiveModel.forecast(trends, horizons, confidence)
+            return Response({
+                'success': True,
+                'confidence': confidence,
+                'forecasts': forecasts,
+                'count': len(forecasts)
+            })
+        except Exception as e:
+            logger.error(f"Error forecasting trends: {str(e)}")
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class HealthRiskViewSet(viewsets.ReadOnlyModelViewSet):
+class HealthRiskViewSet(AsyncAnalysisMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for health risks."""
     serializer_class = HealthRiskSerializer
     permission_classes = [IsAuthenticated]
@@ -89,19 +207,26 @@ class HealthRiskViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         """Return risks for the current user."""
-        return HealthRisk.objects.filter(patient=self.request.user)
+        return HealthRisk.objects.filter(patient=self.request.user).select_related('patient').prefetch_related(
+            Prefetch('related_records', queryset=HealthRecord.objects.only('id'))
+        )
     
     @action(detail=False, methods=['post'])
     def assess(self, request):
         """Assess health risks."""
         analyzer = HealthAnalyzer(request.user)
         
+        if self.wants_async(request):
+            return self.submit_job(request, AnalysisJob.JobType.RISKS)
+        
         try:
-            risks = analyzer.assess_health_risks()
-            serializer = self.get_serializer(risks, many=True)
+            risks = AnalysisCache(request.user).get_or_compute(
+                'risks',
+                lambda: list(self.get_serializer(analyzer.assess_health_risks(), many=True).data)
+            )
             return Response({
                 'success': True,
-                'risks': serializer.data,
+                'risks': risks,
                 'count': len(risks)
             }, status=status.HTTP_200_OK)
         except Exception as e:
@@ -112,29 +237,40 @@ class HealthRiskViewSet(viewsets.ReadOnlyModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class HealthInsightViewSet(viewsets.ModelViewSet):
+class HealthInsightViewSet(AsyncAnalysisMixin, viewsets.ModelViewSet):
     """ViewSet for health insights."""
     serializer_class = HealthInsightSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['type', 'severity', 'is_active']
+    pagination_class = KeysetPagination
+    cursor_ordering = ['-created_at', 'id']
     
     def get_queryset(self):
-        """Return insights for the current user."""
-        return HealthInsight.objects.filter(patient=self.request.user)
+        """Return insights for the current user; lists show active ones unless ?is_active= is given."""
+        queryset = HealthInsight.objects.filter(patient=self.request.user).select_related('patient').prefetch_related(
+            Prefetch('related_records', queryset=HealthRecord.objects.only('id'))
+        )
+        if self.action == 'list' and 'is_active' not in self.request.query_params:
+            queryset = queryset.filter(is_active=True)
+        return queryset
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
         """Generate comprehensive health insights."""
         analyzer = HealthAnalyzer(request.user)
         
+        if self.wants_async(request):
+            return self.submit_job(request, AnalysisJob.JobType.INSIGHTS)
+        
         try:
             insights = analyzer.generate_insights()
             serializer = self.get_serializer(insights, many=True)
             return Response({
                 'success': True,
                 'insights': serializer.data,
-                'count': len(insights)
+                'count': len(insights),
+                **analyzer.insight_counts
             }, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error generating insights: {str(e)}")
@@ -149,7 +285,7 @@ class HealthInsightViewSet(viewsets.ModelViewSet):
         analyzer = HealthAnalyzer(request.user)
         
         try:
-            anomalies = analyzer.detect_anomalies()
+            anomalies = AnalysisCache(request.user).get_or_compute('anomalies', analyzer.detect_anomalies)
             return Response({
                 'success': True,
                 'anomalies': anomalies,
@@ -162,3 +298,54 @@ class HealthInsightViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class AnalysisJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for polling asynchronous analysis jobs."""
+    serializer_class = AnalysisJobSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['job_type', 'status']
+    
+    def get_queryset(self):
+        """Return jobs for the current user."""
+        return AnalysisJob.objects.filter(patient=self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def analysis_cache_stats(request):
+    """
+    Analysis cache hit/miss counters for monitoring.
+    GET /api/v1/ai/cache/stats/
+    """
+    try:
+        return Response({
+            'success': True,
+            'stats': cache_stats()
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Error reading analysis cache stats: {str(e)}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def reanalysis_trigger_stats(request):
+    """
+    Debounced re-analysis counters (triggered, coalesced, rescheduled, submitted).
+    GET /api/v1/ai/reanalysis/stats/
+    """
+    try:
+        return Response({
+            'success': True,
+            'stats': reanalysis_stats()
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Error reading re-analysis stats: {str(e)}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,44 @@
+"""
+Fail when a list endpoint's query count grows with the number of rows it returns.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from api.query_audit import ENDPOINTS, QueryAuditError, audit_query_counts
+
+
+class Command(BaseCommand):
+    help = 'Check that list endpoints issue the same number of queries for one row and a full page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=settings.REST_FRAMEWORK['PAGE_SIZE'],
+                            help='Rows per endpoint for the full-page measurement')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=sorted(ENDPOINTS),
+                            help='Restrict to an endpoint (repeatable)')
+
+    def handle(self, *args, **options):
+        rows = max(options['rows'], 2)
+
+        # Synthetic users and rows are rolled back afterwards
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            try:
+                counts = audit_query_counts(rows, options['endpoints'])
+            except QueryAuditError as e:
+                raise CommandError(str(e))
+            finally:
+                transaction.set_rollback(True)
+
+        growing = []
+        for name, (single, page) in counts.items():
+            grew = page > single
+            self.stdout.write(
+                f'{name:<18} {single:>4} queries (1 row)  {page:>4} queries ({rows} rows)'
+                + ('  GROWS' if grew else '')
+            )
+            if grew:
+                growing.append(f'{name} ({single} -> {page})')
+
+        if growing:
+            raise CommandError(f"Query count grows with page size: {', '.join(growing)}")
+        self.stdout.write(self.style.SUCCESS(f'{len(counts)} endpoints issue a constant number of queries'))
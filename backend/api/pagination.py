@@ -0,0 +1,170 @@
+"""
+Opt-in keyset (cursor) pagination.
+
+Page-number pagination counts the whole queryset and OFFSET-scans to the
+requested page on every request. Views that set ``cursor_ordering`` also
+accept ``?pagination=cursor`` (and the ``cursor`` tokens of its links):
+pages are then fetched with a WHERE on the last row's ordering values, so
+every page costs the same as the first. ``?count=approx`` adds the
+planner's row estimate on PostgreSQL (an exact count elsewhere) instead of
+counting. Cursor pages always follow ``cursor_ordering``; an ``?ordering=``
+that is not a prefix of it is rejected with 400.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Q selecting rows after ``values`` in ``ordering`` (before it when ``reverse``).
+
+    ``(a DESC, b ASC)`` after ``(x, y)`` expands to ``a < x OR (a = x AND b > y)``.
+    """
+    names = [field.lstrip('-') for field in ordering]
+    condition = Q()
+    for index, field in enumerate(ordering):
+        descending = field.startswith('-') != reverse
+        clause = Q(**{f"{names[index]}__{'lt' if descending else 'gt'}": values[index]})
+        clause &= Q(**dict(zip(names[:index], values[:index])))
+        condition |= clause
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def approximate_count(queryset):
+    """Row estimate from the PostgreSQL planner; an exact count on other databases."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page numbers by default; keyset pages on request for views with ``cursor_ordering``.
+
+    ``cursor_ordering`` must end in a unique field (e.g. ``id``) so every
+    row has a distinct position.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = getattr(view, 'cursor_ordering', None)
+        self.use_cursor = bool(self.ordering) and (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = list(self.ordering)
+        self.check_ordering(request)
+        page_size = self.get_page_size(request)
+        self.approximate_count = None
+        if request.query_params.get(self.count_query_param) == 'approx':
+            self.approximate_count = approximate_count(queryset)
+
+        position, reverse = self.decode_cursor(queryset.model, request.query_params.get(self.cursor_query_param))
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position, reverse))
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        # Walking forwards, the page we came from lies behind (and vice versa)
+        self.has_next = more if not reverse else True
+        self.has_previous = more if reverse else position is not None
+        self.page_rows = rows
+        return rows
+
+    def check_ordering(self, request):
+        """Reject an ``?ordering=`` the keyset cannot follow (OrderingFilter applied it, but pages re-sort)."""
+        requested = request.query_params.get(api_settings.ORDERING_PARAM)
+        if not requested:
+            return
+        fields = [field.strip() for field in requested.split(',') if field.strip()]
+        if fields != self.ordering[:len(fields)]:
+            raise ValidationError({
+                api_settings.ORDERING_PARAM: f"Cursor pagination is ordered by {','.join(self.ordering)}; "
+                                             f"use page numbers for other orderings"
+            })
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        response = OrderedDict()
+        if self.approximate_count is not None:
+            response['approximate_count'] = self.approximate_count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        payload = {'v': [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, model, token):
+        """Return ``(ordering values, reverse)`` from a cursor token; ``(None, False)`` for the first page."""
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            raw = payload['v']
+            if len(raw) != len(self.ordering):
+                raise ValueError(token)
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, raw)
+            ]
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(payload.get('r'))
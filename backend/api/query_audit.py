@@ -0,0 +1,157 @@
+"""
+Query-count audit of the list endpoints.
+
+Seeds one row, then a full page, of every list endpoint's data and
+compares the queries each list request issues: a count that grows with
+the page means a serializer is loading related rows one by one. Used by
+the ``audit_query_counts`` command and the API tests.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ai_ml.models import AnalysisJob, HealthInsight, HealthRisk, HealthTrend
+from core.models import (
+    DocumentShare, HealthRecord, InsuranceClaim, InsurancePolicy, Notification, Provider, User
+)
+from core.services import sync_record_grants
+
+# name -> (url, requesting user)
+ENDPOINTS = {
+    'records': ('/api/v1/records/', 'patient'),
+    'provider-records': ('/api/v1/records/', 'doctor'),
+    'providers': ('/api/v1/providers/', 'patient'),
+    'shares': ('/api/v1/shares/', 'patient'),
+    'provider-shares': ('/api/v1/shares/', 'doctor'),
+    'policies': ('/api/v1/policies/', 'patient'),
+    'claims': ('/api/v1/claims/', 'patient'),
+    'notifications': ('/api/v1/notifications/', 'patient'),
+    'trends': ('/api/v1/ai/trends/', 'patient'),
+    'risks': ('/api/v1/ai/risks/', 'patient'),
+    'insights': ('/api/v1/ai/insights/', 'patient'),
+    'jobs': ('/api/v1/ai/jobs/', 'patient'),
+}
+
+
+class QueryAuditError(Exception):
+    """A list request failed during the audit."""
+
+
+def audit_query_counts(rows, endpoints=None):
+    """
+    Query counts of each endpoint's list request with one row and with ``rows`` rows.
+
+    Returns ``{name: (single, page)}``. Creates data; callers run it inside
+    a transaction they roll back (or a test database).
+    """
+    endpoints = endpoints or list(ENDPOINTS)
+    users = create_users()
+    seed(users, 1)
+    single = measure(users, endpoints)
+    seed(users, rows - 1)
+    page = measure(users, endpoints)
+    return {name: (single[name], page[name]) for name in endpoints}
+
+
+def create_users():
+    """A patient and a provider doctor administering a verified provider."""
+    def user(user_type):
+        return User.objects.create(mobile=f'7{uuid.uuid4().int % 10 ** 9:09d}', first_name='Audit',
+                                   last_name=user_type.title(), user_type=user_type)
+
+    patient = user(User.UserType.PATIENT)
+    doctor = user(User.UserType.PROVIDER_DOCTOR)
+    Provider.objects.create(name='Audit Provider', provider_type=Provider.ProviderType.choices[0][0],
+                            registration_number=uuid.uuid4().hex, email='audit@example.com', phone='0',
+                            address='-', city='-', state='-', pincode='000000',
+                            admin_user=doctor, is_verified=True, is_active=True)
+    return {'patient': patient, 'doctor': doctor}
+
+
+def seed(users, count):
+    """Add ``count`` rows (with their related rows) to every endpoint."""
+    patient = users['patient']
+    provider = Provider.objects.get(admin_user=users['doctor'])
+    now = timezone.now()
+    tag = uuid.uuid4().hex[:8]
+
+    Provider.objects.bulk_create([
+        Provider(name=f'Audit Provider {tag}-{index}', provider_type=provider.provider_type,
+                 registration_number=f'{tag}-{index}', email='audit@example.com', phone='0',
+                 address='-', city='-', state='-', pincode='000000', is_verified=True, is_active=True)
+        for index in range(count)
+    ])
+    records = HealthRecord.objects.bulk_create([
+        HealthRecord(patient=patient, uploaded_by=patient, provider_id=provider, title=f'Audit record {index}',
+                     category=HealthRecord.RecordCategory.LAB_REPORT, file_url='https://example.com/audit.pdf',
+                     file_name='audit.pdf', file_size=1, file_type='pdf', record_date=now.date())
+        for index in range(count)
+    ])
+
+    shares = DocumentShare.objects.bulk_create([
+        DocumentShare(patient=patient, provider=provider, shared_by=patient, purpose='audit',
+                      status=DocumentShare.ShareStatus.GRANTED, granted_at=now,
+                      expires_at=now + timedelta(days=1))
+        for _ in records
+    ])
+    policies = InsurancePolicy.objects.bulk_create([
+        InsurancePolicy(patient=patient, policy_number=f'AUDIT-{tag}-{index}', insurance_company='Audit',
+                        policy_type='health', coverage_amount=1000, start_date=now.date(),
+                        end_date=now.date() + timedelta(days=365))
+        for index in range(count)
+    ])
+    claims = InsuranceClaim.objects.bulk_create([
+        InsuranceClaim(patient=patient, policy=policy, claim_number=f'AUDIT-{tag}-{index}', provider=provider,
+                       claimed_amount=100, claim_date=now.date())
+        for index, policy in enumerate(policies)
+    ])
+    Notification.objects.bulk_create([
+        Notification(user=patient, type=Notification.NotificationType.choices[0][0], title='Audit', message='-')
+        for _ in range(count)
+    ])
+    HealthTrend.objects.bulk_create([
+        HealthTrend(patient=patient, metric_name=f'Audit {tag}-{index}') for index in range(count)
+    ])
+    risks = HealthRisk.objects.bulk_create([
+        HealthRisk(patient=patient, category=HealthRisk.RiskCategory.choices[0][0], description='-')
+        for _ in range(count)
+    ])
+    insights = HealthInsight.objects.bulk_create([
+        HealthInsight(patient=patient, type=HealthInsight.InsightType.choices[0][0], title='Audit', description='-')
+        for _ in range(count)
+    ])
+    AnalysisJob.objects.bulk_create([
+        AnalysisJob(patient=patient, job_type=AnalysisJob.JobType.INSIGHTS, signature=f'audit:{tag}-{index}',
+                    status=AnalysisJob.JobStatus.SUCCESS)
+        for index in range(count)
+    ])
+
+    for share, record in zip(shares, records):
+        share.records.add(record)
+    for claim, record in zip(claims, records):
+        claim.supporting_documents.add(record)
+    for assessment, record in [*zip(risks, records), *zip(insights, records)]:
+        assessment.related_records.add(record)
+    sync_record_grants(provider.id, [record.id for record in records])
+
+
+def measure(users, endpoints):
+    """Query count of one list request per endpoint, after a warm-up request."""
+    clients = {}
+    for role, user in users.items():
+        clients[role] = APIClient()
+        clients[role].force_authenticate(user)
+
+    counts = {}
+    for name in endpoints:
+        url, role = ENDPOINTS[name]
+        clients[role].get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = clients[role].get(url)
+        if response.status_code != 200:
+            raise QueryAuditError(f'{name}: GET {url} returned {response.status_code}')
+        counts[name] = len(queries)
+    return counts
@@ -0,0 +1,182 @@
+"""
+Tests for the REST API.
+"""
+import time
+from datetime import date, timedelta
+
+import fakeredis
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core.models import DocumentShare, Provider, RecordAccessGrant, User
+from core import access_cache
+from core.access_cache import has_record_access
+from core.services import can_download, grant_share, revoke_share
+from .query_audit import ENDPOINTS, audit_query_counts
+
+
+@pytest.fixture
+def doctor(db):
+    return User.objects.create(mobile='9000000002', first_name='Test', last_name='Doctor',
+                               user_type=User.UserType.PROVIDER_DOCTOR)
+
+
+@pytest.fixture
+def provider(doctor):
+    return Provider.objects.create(name='Test Clinic', provider_type=Provider.ProviderType.choices[0][0],
+                                   registration_number='REG-1', email='clinic@example.com', phone='0',
+                                   address='-', city='-', state='-', pincode='000000',
+                                   admin_user=doctor, is_verified=True, is_active=True)
+
+
+def share_records(patient, provider, records, days=30, allow_download=False):
+    share = DocumentShare.objects.create(patient=patient, provider=provider, shared_by=patient,
+                                         expires_at=timezone.now() + timedelta(days=days),
+                                         allow_download=allow_download)
+    return grant_share(share, records)
+
+
+def count_queries(client, url):
+    client.get(url)  # Warm per-user caches (e.g. the provider mapping)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(queries), response.json()
+
+
+@pytest.mark.django_db
+def test_provider_record_list_cost_does_not_grow_with_shares(patient, doctor, provider, make_record):
+    client = APIClient()
+    client.force_authenticate(doctor)
+    share_records(patient, provider, [make_record(patient)])
+
+    single, body = count_queries(client, '/api/v1/records/')
+    assert body['count'] == 1
+
+    for _ in range(15):
+        share_records(patient, provider, [make_record(patient), make_record(patient)])
+    many, body = count_queries(client, '/api/v1/records/')
+
+    assert body['count'] == 31
+    assert many == single
+
+
+@pytest.mark.django_db
+def test_download_survives_longer_share_without_download(patient, doctor, provider, make_record,
+                                                          django_capture_on_commit_callbacks):
+    record = make_record(patient)
+    download_share = share_records(patient, provider, [record], days=7, allow_download=True)
+    view_share = share_records(patient, provider, [record], days=90)
+
+    grant = RecordAccessGrant.objects.get(provider=provider, record=record)
+    assert grant.share_id == view_share.id
+    assert grant.download_expires_at == download_share.expires_at
+    assert can_download(doctor, record)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        revoke_share(download_share)
+    assert not can_download(doctor, record)
+    assert RecordAccessGrant.objects.filter(provider=provider, record=record).exists()
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """An in-process Redis behind the record access cache."""
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(access_cache, '_redis', lambda: client)
+    return client
+
+
+@pytest.mark.django_db
+def test_share_and_revoke_invalidate_cached_access(redis_client, patient, doctor, provider, make_record,
+                                                   django_capture_on_commit_callbacks):
+    client = APIClient()
+    client.force_authenticate(patient)
+    first, second = make_record(patient), make_record(patient)
+    records_key = access_cache._records_key(provider.id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(f'/api/v1/records/{first.id}/share/', {'provider_id': provider.id}, format='json')
+    assert response.status_code == 201
+    assert has_record_access(doctor, first.id) and not has_record_access(doctor, second.id)
+    assert redis_client.sismember(records_key, first.id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(f'/api/v1/records/{second.id}/share/', {'provider_id': provider.id}, format='json')
+    assert not redis_client.exists(records_key)
+    assert has_record_access(doctor, second.id)
+
+    share = DocumentShare.objects.get(records=first)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert client.post(f'/api/v1/shares/{share.id}/revoke/').status_code == 200
+    assert not has_record_access(doctor, first.id)
+    assert has_record_access(doctor, second.id)
+
+
+@pytest.mark.django_db
+def test_cached_access_expires_with_the_nearest_grant(redis_client, patient, doctor, provider, make_record,
+                                                      django_capture_on_commit_callbacks):
+    lasting, expiring = make_record(patient), make_record(patient)
+    share_records(patient, provider, [lasting])
+    share = DocumentShare.objects.create(patient=patient, provider=provider, shared_by=patient,
+                                         expires_at=timezone.now() + timedelta(seconds=1))
+    with django_capture_on_commit_callbacks(execute=True):
+        grant_share(share, [expiring])
+
+    assert has_record_access(doctor, expiring.id)
+    assert 0 < redis_client.ttl(access_cache._records_key(provider.id)) <= 1
+
+    time.sleep(1.1)
+    assert not has_record_access(doctor, expiring.id)
+    assert has_record_access(doctor, lasting.id)
+
+
+@pytest.mark.django_db
+def test_access_check_falls_back_to_database_without_redis(monkeypatch, patient, doctor, provider, make_record):
+    record = make_record(patient)
+    share_records(patient, provider, [record])
+    server = fakeredis.FakeServer()
+    server.connected = False
+
+    for client in (None, fakeredis.FakeRedis(server=server)):
+        monkeypatch.setattr(access_cache, '_redis', lambda: client)
+        assert has_record_access(doctor, record.id)
+        assert not has_record_access(doctor, record.id, download=True)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('endpoint', sorted(ENDPOINTS))
+def test_list_endpoint_query_count_is_constant(settings, endpoint):
+    (single, page), = audit_query_counts(settings.REST_FRAMEWORK['PAGE_SIZE'], [endpoint]).values()
+    assert page == single, f'{endpoint}: {single} queries for 1 row, {page} for a full page'
+
+
+@pytest.mark.django_db
+def test_cursor_pages_walk_records_in_keyset_order(patient, make_record):
+    for index in range(25):
+        make_record(patient, date(2024, 1, 1) + timedelta(days=index % 4))
+    client = APIClient()
+    client.force_authenticate(patient)
+
+    seen, url = [], '/api/v1/records/?pagination=cursor&page_size=10'
+    while url:
+        body = client.get(url).json()
+        seen += [record['id'] for record in body['results']]
+        url = body['next']
+
+    expected = sorted(patient.health_records.values_list('record_date', 'created_at', 'id'),
+                      key=lambda row: (-row[0].toordinal(), -row[1].timestamp(), row[2]))
+    assert seen == [row[2] for row in expected]
+
+
+@pytest.mark.django_db
+def test_cursor_pages_reject_incompatible_ordering(patient, make_record):
+    make_record(patient)
+    client = APIClient()
+    client.force_authenticate(patient)
+
+    assert client.get('/api/v1/records/?pagination=cursor&ordering=-record_date').status_code == 200
+    assert client.get('/api/v1/records/?pagination=cursor&ordering=title').status_code == 400
+    assert client.get('/api/v1/records/?ordering=record_date').status_code == 200
@@ -12,6 +12,7 @@ router.register(r'shares', views.DocumentShareViewSet, basename='documentshare')
 router.register(r'policies', views.InsurancePolicyViewSet, basename='insurancepolicy')
 router.register(r'claims', views.InsuranceClaimViewSet, basename='insuranceclaim')
 router.register(r'notifications', views.NotificationViewSet, basename='notification')
+router.register(r'audit-logs', views.AuditLogViewSet, basename='auditlog')
 
 app_name = 'api'
 
@@ -3,20 +3,28 @@ API views for Reform application.
 """
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.http import Http404
 from django.utils import timezone
 from core.models import (
     HealthRecord, Provider, DocumentShare,
-    InsurancePolicy, InsuranceClaim, Notification
+    InsurancePolicy, InsuranceClaim, Notification, AuditLog
 )
 from core.serializers import (
     HealthRecordSerializer, ProviderSerializer, DocumentShareSerializer,
-    InsurancePolicySerializer, InsuranceClaimSerializer, NotificationSerializer
+    InsurancePolicySerializer, InsuranceClaimSerializer, NotificationSerializer,
+    AuditLogSerializer
 )
 from core.models import User
+from core.services import (
+    can_download, grant_share, has_record_access, provider_ids, provider_records, revoke_share, sync_share
+)
+from storage.services import s3_storage
+from .pagination import KeysetPagination
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,26 +39,39 @@ class HealthRecordViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description', 'provider_name', 'doctor_name']
     ordering_fields = ['record_date', 'created_at']
     ordering = ['-record_date', '-created_at']
+    pagination_class = KeysetPagination
+    # ?pagination=cursor pages follow this order; an incompatible ?ordering= is a 400
+    cursor_ordering = ['-record_date', '-created_at', 'id']
     
     def get_queryset(self):
         """Return records for the current user."""
         user = self.request.user
         if user.user_type == User.UserType.PATIENT:
-            return HealthRecord.objects.filter(patient=user)
+            queryset = HealthRecord.objects.filter(patient=user)
         # For providers, return records they have access to via shares
         elif user.user_type in [User.UserType.PROVIDER_DOCTOR, User.UserType.PROVIDER_ADMIN]:
-            # Get provider associated with user
-            provider = Provider.objects.filter(admin_user=user).first()
-            if provider:
-                shares = DocumentShare.objects.filter(
-                    provider=provider,
-                    status=DocumentShare.ShareStatus.GRANTED
-                )
-                record_ids = []
-                for share in shares:
-                    record_ids.extend(share.records.values_list('id', flat=True))
-                return HealthRecord.objects.filter(id__in=record_ids)
-        return HealthRecord.objects.none()
+            # One indexed lookup on the flattened access grants
+            queryset = provider_records(user)
+        else:
+            return HealthRecord.objects.none()
+        return queryset.select_related('patient', 'provider_id')
+    
+    def get_object(self):
+        """Authorize provider reads of a single record against the cached access set."""
+        user = self.request.user
+        if self.request.method not in SAFE_METHODS or user.user_type not in [
+            User.UserType.PROVIDER_DOCTOR, User.UserType.PROVIDER_ADMIN
+        ]:
+            return super().get_object()
+        
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not str(pk).isdigit() or not has_record_access(user, pk):
+            raise Http404
+        record = HealthRecord.objects.select_related('patient', 'provider_id').filter(pk=pk).first()
+        if record is None:
+            raise Http404
+        self.check_object_permissions(self.request, record)
+        return record
     
     def perform_create(self, serializer):
         """Set patient and uploaded_by when creating record."""
@@ -85,21 +106,44 @@ class HealthRecordViewSet(viewsets.ModelViewSet):
         from django.utils import timezone
         from datetime import timedelta
         
-        share = DocumentShare.objects.create(
-            patient=request.user,
-            provider=provider,
-            shared_by=request.user,
-            purpose=purpose,
-            expires_at=timezone.now() + timedelta(days=duration_days),
-            allow_download=allow_download,
-            status=DocumentShare.ShareStatus.GRANTED
-        )
-        share.records.add(record)
+        with transaction.atomic():
+            share = DocumentShare.objects.create(
+                patient=request.user,
+                provider=provider,
+                shared_by=request.user,
+                purpose=purpose,
+                expires_at=timezone.now() + timedelta(days=duration_days),
+                allow_download=allow_download
+            )
+            grant_share(share, [record])
         
         return Response({
             'success': True,
             'share': DocumentShareSerializer(share).data
         }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Return a short-lived download URL for the record's file."""
+        record = self.get_object()
+        if not can_download(request.user, record):
+            return Response({
+                'success': False,
+                'error': 'Download not permitted for this record'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            return Response({
+                'success': True,
+                'url': s3_storage.get_presigned_url(s3_storage.file_key(record.file_url)),
+                'file_name': record.file_name
+            })
+        except Exception as e:
+            logger.error(f"Error generating download URL: {str(e)}")
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class ProviderViewSet(viewsets.ReadOnlyModelViewSet):
@@ -127,12 +171,25 @@ class DocumentShareViewSet(viewsets.ModelViewSet):
         """Return shares for the current user."""
         user = self.request.user
         if user.user_type == User.UserType.PATIENT:
-            return DocumentShare.objects.filter(patient=user)
+            queryset = DocumentShare.objects.filter(patient=user)
         elif user.user_type in [User.UserType.PROVIDER_DOCTOR, User.UserType.PROVIDER_ADMIN]:
-            provider = Provider.objects.filter(admin_user=user).first()
-            if provider:
-                return DocumentShare.objects.filter(provider=provider)
-        return DocumentShare.objects.none()
+            queryset = DocumentShare.objects.filter(provider_id__in=provider_ids(user))
+        else:
+            return DocumentShare.objects.none()
+        return queryset.select_related('patient', 'provider').prefetch_related(
+            Prefetch('records', queryset=HealthRecord.objects.only('id'))
+        ).annotate(record_count=Count('records', distinct=True))
+    
+    def perform_update(self, serializer):
+        """Keep access grants in step with the share's records and expiry."""
+        with transaction.atomic():
+            sync_share(serializer.save())
+    
+    def perform_destroy(self, instance):
+        """Drop the share's grants before deleting it."""
+        with transaction.atomic():
+            revoke_share(instance)
+            instance.delete()
     
     @action(detail=True, methods=['post'])
     def revoke(self, request, pk=None):
@@ -144,8 +201,7 @@ class DocumentShareViewSet(viewsets.ModelViewSet):
                 'error': 'Permission denied'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        share.status = DocumentShare.ShareStatus.REVOKED
-        share.save()
+        revoke_share(share)
         
         return Response({
             'success': True,
@@ -165,7 +221,7 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
         """Return policies for the current user."""
         user = self.request.user
         if user.user_type == User.UserType.PATIENT:
-            return InsurancePolicy.objects.filter(patient=user)
+            return InsurancePolicy.objects.filter(patient=user).select_related('patient')
         return InsurancePolicy.objects.none()
     
     def perform_create(self, serializer):
@@ -185,7 +241,9 @@ class InsuranceClaimViewSet(viewsets.ModelViewSet):
         """Return claims for the current user."""
         user = self.request.user
         if user.user_type == User.UserType.PATIENT:
-            return InsuranceClaim.objects.filter(patient=user)
+            return InsuranceClaim.objects.filter(patient=user).select_related(
+                'patient', 'policy', 'provider'
+            ).prefetch_related(Prefetch('supporting_documents', queryset=HealthRecord.objects.only('id')))
         return InsuranceClaim.objects.none()
     
     def perform_create(self, serializer):
@@ -202,6 +260,8 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['type', 'is_read', 'is_important']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    cursor_ordering = ['-created_at', 'id']
     
     def get_queryset(self):
         """Return notifications for the current user."""
@@ -250,3 +310,16 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             'count': count
         })
 
+
+class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for audit logs (staff only)."""
+    serializer_class = AuditLogSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['user', 'action', 'entity_type', 'entity_id']
+    pagination_class = KeysetPagination
+    cursor_ordering = ['-created_at', 'id']
+    
+    def get_queryset(self):
+        """Return all audit logs, newest first."""
+        return AuditLog.objects.select_related('user')
@@ -0,0 +1,45 @@
+"""
+Shared pytest fixtures.
+"""
+from datetime import date
+
+import pytest
+from django.core.cache import cache
+from core.models import HealthRecord, User
+from reform.celery import app as celery_app
+
+
+@pytest.fixture(autouse=True)
+def test_environment(settings, monkeypatch):
+    """Local-memory cache and inline Celery tasks, so tests need neither Redis nor a worker."""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    monkeypatch.setattr(celery_app.conf, 'task_always_eager', True)
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def patient(db):
+    return User.objects.create(mobile='9000000001', first_name='Test', last_name='Patient')
+
+
+@pytest.fixture
+def make_record(db):
+    """Create a HealthRecord for a patient (PROCESSED with ``values`` as its extracted values)."""
+    def make(patient, record_date=date(2024, 1, 1), values=None, status=HealthRecord.RecordStatus.PROCESSED):
+        return HealthRecord.objects.create(
+            patient=patient,
+            uploaded_by=patient,
+            title='Lab report',
+            category=HealthRecord.RecordCategory.LAB_REPORT,
+            file_url='https://example.com/report.pdf',
+            file_name='report.pdf',
+            file_size=1,
+            file_type='application/pdf',
+            record_date=record_date,
+            status=status,
+            extracted_values=values or {},
+        )
+    return make
@@ -0,0 +1,154 @@
+"""
+Redis-cached provider record access.
+
+For each provider, the ids of the records it may currently access (and the
+subset it may download) are kept as Redis sets, so authorizing one record
+is a single SISMEMBER. A set expires with the provider's earliest-expiring
+grant and is dropped once a transaction rewriting that provider's grants
+commits. The user -> provider mapping is cached alongside. Without a Redis
+cache (e.g. local memory in development) checks go to the database.
+"""
+import logging
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError, WatchError
+from .models import Provider, RecordAccessGrant
+
+logger = logging.getLogger(__name__)
+
+ACCESS_PREFIX = 'core:access'
+EMPTY_MEMBER = 0  # Record ids start at 1; keeps a provider without grants cached as a set
+GENERATION_TIMEOUT = 86400
+
+
+def _records_key(provider_id, download=False):
+    return f"{ACCESS_PREFIX}:provider:{provider_id}:{'downloads' if download else 'records'}"
+
+
+def _generation_key(provider_id):
+    return f'{ACCESS_PREFIX}:provider:{provider_id}:generation'
+
+
+def _providers_key(user_id):
+    return f'{ACCESS_PREFIX}:user:{user_id}:providers'
+
+
+def _redis():
+    """The raw Redis client behind the default cache, or None when it is not Redis."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def provider_ids(user):
+    """Ids of the providers a user administers, cached for RECORD_ACCESS_CACHE_TIMEOUT."""
+    key = _providers_key(user.id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Provider.objects.filter(admin_user=user).values_list('id', flat=True))
+        cache.set(key, ids, timeout=settings.RECORD_ACCESS_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_user(user_id):
+    """Forget a user's cached providers once the current transaction commits."""
+    if user_id is not None:
+        transaction.on_commit(lambda: cache.delete(_providers_key(user_id)))
+
+
+def invalidate_provider(provider_id):
+    """Drop a provider's cached record sets once the current transaction commits."""
+    transaction.on_commit(lambda: _drop_provider(provider_id))
+
+
+def _drop_provider(provider_id):
+    client = _redis()
+    if client is None:
+        return
+    try:
+        # Bumping the generation aborts any reload that read the old grants
+        with client.pipeline() as pipe:
+            pipe.incr(_generation_key(provider_id))
+            pipe.expire(_generation_key(provider_id), GENERATION_TIMEOUT)
+            pipe.delete(_records_key(provider_id), _records_key(provider_id, download=True))
+            pipe.execute()
+    except RedisError as e:
+        logger.error(f"Error invalidating record access for provider {provider_id}: {str(e)}")
+
+
+def _load_provider(client, provider_id):
+    """Read a provider's active grants and cache them as sets; returns ``(records, downloads)``."""
+    records, downloads = {EMPTY_MEMBER}, {EMPTY_MEMBER}
+    with client.pipeline() as pipe:
+        pipe.watch(_generation_key(provider_id))
+        now = timezone.now()
+        nearest = None
+        grants = RecordAccessGrant.objects.filter(provider_id=provider_id, expires_at__gt=now)
+        for record_id, expires_at, download_expires_at in grants.values_list(
+            'record_id', 'expires_at', 'download_expires_at'
+        ):
+            records.add(record_id)
+            if download_expires_at is not None and download_expires_at > now:
+                downloads.add(record_id)
+                expires_at = min(expires_at, download_expires_at)
+            nearest = expires_at if nearest is None else min(nearest, expires_at)
+
+        timeout = settings.RECORD_ACCESS_CACHE_TIMEOUT
+        if nearest is not None:
+            timeout = max(1, min(timeout, math.ceil((nearest - now).total_seconds())))
+
+        pipe.multi()
+        for key, members in ((_records_key(provider_id), records), (_records_key(provider_id, True), downloads)):
+            pipe.delete(key)
+            pipe.sadd(key, *members)
+            pipe.expire(key, timeout)
+        try:
+            pipe.execute()
+        except WatchError:
+            # Grants changed while loading; the next check reloads
+            pass
+    return records, downloads
+
+
+def _cached_access(client, ids, record_id, download):
+    key_of = {provider_id: _records_key(provider_id, download) for provider_id in ids}
+    with client.pipeline(transaction=False) as pipe:
+        for key in key_of.values():
+            pipe.exists(key)
+            pipe.sismember(key, record_id)
+        results = pipe.execute()
+
+    for index, provider_id in enumerate(key_of):
+        exists, member = results[2 * index], results[2 * index + 1]
+        if not exists:
+            records, downloads = _load_provider(client, provider_id)
+            member = record_id in (downloads if download else records)
+        if member:
+            return True
+    return False
+
+
+def has_record_access(user, record_id, download=False):
+    """Whether one of the user's providers holds an active (download) grant for a record."""
+    ids = provider_ids(user)
+    if not ids:
+        return False
+
+    client = _redis()
+    if client is not None:
+        try:
+            return _cached_access(client, ids, int(record_id), download)
+        except RedisError as e:
+            logger.warning(f"Record access cache unavailable, checking the database: {str(e)}")
+
+    now = timezone.now()
+    grants = RecordAccessGrant.objects.filter(provider_id__in=ids, record_id=record_id, expires_at__gt=now)
+    if download:
+        grants = grants.filter(allow_download=True, download_expires_at__gt=now)
+    return grants.exists()
@@ -4,9 +4,10 @@ Admin configuration for core models.
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
-    User, HealthRecord, Provider, DocumentShare,
+    User, HealthRecord, Provider, DocumentShare, RecordAccessGrant,
     InsurancePolicy, InsuranceClaim, Notification, AuditLog
 )
+from .services import sync_share
 
 
 @admin.register(User)
@@ -51,6 +52,24 @@ class DocumentShareAdmin(admin.ModelAdmin):
     list_filter = ('status', 'expires_at')
     search_fields = ('patient__mobile', 'provider__name')
     filter_horizontal = ('records',)
+    
+    def save_related(self, request, form, formsets, change):
+        """Rewrite access grants once the share's records are saved."""
+        super().save_related(request, form, formsets, change)
+        sync_share(form.instance)
+
+
+@admin.register(RecordAccessGrant)
+class RecordAccessGrantAdmin(admin.ModelAdmin):
+    """Record access grant admin (derived from shares; read-only)."""
+    list_display = ('provider', 'record', 'patient', 'expires_at', 'allow_download', 'created_at')
+    list_filter = ('allow_download', 'expires_at')
+    search_fields = ('provider__name', 'patient__mobile', 'record__title')
+    readonly_fields = ('provider', 'record', 'patient', 'share', 'expires_at', 'allow_download',
+                       'download_expires_at', 'created_at')
+    
+    def has_add_permission(self, request):
+        return False
 
 
 @admin.register(InsurancePolicy)
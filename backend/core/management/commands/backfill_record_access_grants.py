@@ -0,0 +1,48 @@
+"""
+Build RecordAccessGrant rows from existing document shares.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import DocumentShare, RecordAccessGrant
+from core.services import purge_expired_grants, sync_record_grants
+
+
+class Command(BaseCommand):
+    help = 'Rebuild record access grants from GRANTED, unexpired document shares'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of records synced per batch')
+        parser.add_argument('--provider', type=int, action='append', dest='provider_ids',
+                            help='Restrict to a provider id (repeatable)')
+        parser.add_argument('--purge-expired', action='store_true',
+                            help='Also delete grants that have expired')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        Through = DocumentShare.records.through
+        shared = Through.objects.all()
+        grants = RecordAccessGrant.objects.all()
+        if options['provider_ids']:
+            shared = shared.filter(documentshare__provider_id__in=options['provider_ids'])
+            grants = grants.filter(provider_id__in=options['provider_ids'])
+
+        # Every (provider, record) a share mentions or a grant holds gets re-derived
+        pairs = set(shared.values_list('documentshare__provider_id', 'healthrecord_id').distinct())
+        pairs.update(grants.values_list('provider_id', 'record_id'))
+        by_provider = {}
+        for provider_id, record_id in pairs:
+            by_provider.setdefault(provider_id, []).append(record_id)
+
+        written = 0
+        for provider_id, record_ids in sorted(by_provider.items()):
+            record_ids.sort()
+            for start in range(0, len(record_ids), chunk_size):
+                with transaction.atomic():
+                    written += sync_record_grants(provider_id, record_ids[start:start + chunk_size])
+            self.stdout.write(f'Synced provider {provider_id} ({len(record_ids)} records)')
+
+        purged = purge_expired_grants() if options['purge_expired'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} grants for {len(by_provider)} providers; purged {purged} expired grants'
+        ))
@@ -266,6 +266,41 @@ class DocumentShare(models.Model):
         return f"{self.patient.get_full_name()} → {self.provider.name}"
 
 
+class RecordAccessGrant(models.Model):
+    """
+    Flattened provider access to one record, derived from active shares.
+    
+    Maintained by core.services; one row per (provider, record) carries the
+    latest-expiring GRANTED share covering it. Download access is tracked
+    separately, until the latest expiry among the shares that allow it.
+    """
+    
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='access_grants')
+    record = models.ForeignKey(HealthRecord, on_delete=models.CASCADE, related_name='access_grants')
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='record_access_grants')
+    share = models.ForeignKey(DocumentShare, on_delete=models.CASCADE, related_name='access_grants')
+    
+    # Access Control (derived from the covering shares)
+    expires_at = models.DateTimeField()
+    allow_download = models.BooleanField(default=False)
+    download_expires_at = models.DateTimeField(null=True, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'record_access_grants'
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'record'], name='unique_provider_record_grant'),
+        ]
+        indexes = [
+            models.Index(fields=['provider', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider.name} → record {self.record_id}"
+
+
 class InsurancePolicy(models.Model):
     """Insurance policy model."""
     
@@ -452,6 +487,7 @@ class AuditLog(models.Model):
         db_table = 'audit_logs'
         ordering = ['-created_at']
         indexes = [
+            models.Index(fields=['-created_at']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['action', '-created_at']),
             models.Index(fields=['entity_type', 'entity_id']),
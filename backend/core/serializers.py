@@ -5,7 +5,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import (
     HealthRecord, Provider, DocumentShare,
-    InsurancePolicy, InsuranceClaim, Notification
+    InsurancePolicy, InsuranceClaim, Notification, AuditLog
 )
 
 User = get_user_model()
@@ -29,7 +29,7 @@ class UserSerializer(serializers.ModelSerializer):
 class HealthRecordSerializer(serializers.ModelSerializer):
     """Health record serializer."""
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
-    provider_name_display = serializers.CharField(source='provider.name', read_only=True)
+    provider_name_display = serializers.CharField(source='provider_id.name', read_only=True)
     
     class Meta:
         model = HealthRecord
@@ -72,6 +72,9 @@ class DocumentShareSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'granted_at', 'status')
     
     def get_record_count(self, obj):
+        # List querysets annotate the count; a single share counts its records
+        if hasattr(obj, 'record_count'):
+            return obj.record_count
         return obj.records.count()
 
 
@@ -113,3 +116,13 @@ class NotificationSerializer(serializers.ModelSerializer):
                  'read_at', 'is_important', 'created_at')
         read_only_fields = ('id', 'created_at', 'read_at')
 
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    """Audit log serializer."""
+    user_mobile = serializers.CharField(source='user.mobile', read_only=True, default=None)
+    
+    class Meta:
+        model = AuditLog
+        fields = ('id', 'user', 'user_mobile', 'action', 'entity_type', 'entity_id',
+                 'description', 'ip_address', 'user_agent', 'metadata', 'created_at')
+        read_only_fields = fields
@@ -0,0 +1,128 @@
+"""
+Services for share-based record access.
+
+``RecordAccessGrant`` flattens GRANTED, unexpired DocumentShares into one
+row per (provider, record), so provider list, retrieve and download checks
+are a single indexed lookup. Grants are rewritten in the same transaction
+as the share change that affects them, and the provider's cached access
+sets (see ``access_cache``) are dropped when it commits.
+"""
+from django.db import transaction
+from django.utils import timezone
+from .access_cache import has_record_access, invalidate_provider, provider_ids
+from .models import DocumentShare, HealthRecord, RecordAccessGrant
+
+GRANT_UPDATE_FIELDS = ['patient', 'share', 'expires_at', 'allow_download', 'download_expires_at']
+
+
+def sync_record_grants(provider_id, record_ids):
+    """
+    Rebuild one provider's grants for the given records from its active shares.
+    
+    Each record keeps a single grant carrying the latest-expiring GRANTED
+    share that covers it; records no active share covers lose their grant.
+    Downloads are allowed if any of those shares allows them, until the
+    latest expiry among such shares. Returns the number of grants written.
+    """
+    record_ids = list(record_ids)
+    if not record_ids:
+        return 0
+    
+    rows = DocumentShare.records.through.objects.filter(
+        healthrecord_id__in=record_ids,
+        documentshare__provider_id=provider_id,
+        documentshare__status=DocumentShare.ShareStatus.GRANTED,
+        documentshare__expires_at__gt=timezone.now()
+    ).order_by('healthrecord_id', '-documentshare__expires_at').values_list(
+        'healthrecord_id', 'healthrecord__patient_id', 'documentshare_id',
+        'documentshare__expires_at', 'documentshare__allow_download'
+    )
+    grants = {}
+    for record_id, patient_id, share_id, expires_at, allow_download in rows:
+        grant = grants.setdefault(record_id, RecordAccessGrant(
+            provider_id=provider_id,
+            record_id=record_id,
+            patient_id=patient_id,
+            share_id=share_id,
+            expires_at=expires_at
+        ))
+        # Rows run latest expiry first, so the first share allowing downloads sets their expiry
+        if allow_download and not grant.allow_download:
+            grant.allow_download = True
+            grant.download_expires_at = expires_at
+    
+    RecordAccessGrant.objects.filter(
+        provider_id=provider_id,
+        record_id__in=record_ids
+    ).exclude(record_id__in=list(grants)).delete()
+    RecordAccessGrant.objects.bulk_create(
+        grants.values(),
+        update_conflicts=True,
+        unique_fields=['provider', 'record'],
+        update_fields=GRANT_UPDATE_FIELDS
+    )
+    invalidate_provider(provider_id)
+    return len(grants)
+
+
+def sync_share(share):
+    """Rewrite the grants affected by a share after its records, expiry or status changed."""
+    affected = {}
+    for record_id in share.records.values_list('id', flat=True):
+        affected.setdefault(share.provider_id, set()).add(record_id)
+    # Grants the share held before the change (e.g. for a removed record or another provider)
+    for provider_id, record_id in RecordAccessGrant.objects.filter(share=share).values_list('provider_id', 'record_id'):
+        affected.setdefault(provider_id, set()).add(record_id)
+    
+    return sum(sync_record_grants(provider_id, record_ids) for provider_id, record_ids in affected.items())
+
+
+@transaction.atomic
+def grant_share(share, records=()):
+    """Grant a share (adding ``records`` to it) and write its access grants."""
+    if records:
+        share.records.add(*records)
+    share.status = DocumentShare.ShareStatus.GRANTED
+    share.granted_at = share.granted_at or timezone.now()
+    share.save(update_fields=['status', 'granted_at', 'updated_at'])
+    sync_share(share)
+    return share
+
+
+@transaction.atomic
+def revoke_share(share):
+    """Revoke a share and drop its grants with one bulk delete."""
+    share.status = DocumentShare.ShareStatus.REVOKED
+    share.save(update_fields=['status', 'updated_at'])
+    
+    record_ids = set(RecordAccessGrant.objects.filter(share=share).values_list('record_id', flat=True))
+    RecordAccessGrant.objects.filter(share=share).delete()
+    invalidate_provider(share.provider_id)
+    # Records that another active share also covers keep their access; the
+    # share may also have been the one allowing downloads on such a grant
+    record_ids.update(share.records.values_list('id', flat=True))
+    sync_record_grants(share.provider_id, record_ids)
+    return share
+
+
+def purge_expired_grants():
+    """Delete grants past their expiry (they already deny access); returns the count."""
+    deleted, _ = RecordAccessGrant.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def active_grants(user):
+    """Unexpired grants of the providers a user administers."""
+    return RecordAccessGrant.objects.filter(provider_id__in=provider_ids(user), expires_at__gt=timezone.now())
+
+
+def provider_records(user):
+    """Records a provider user may currently access."""
+    return HealthRecord.objects.filter(id__in=active_grants(user).values('record_id'))
+
+
+def can_download(user, record):
+    """Whether a user may download a record's file: its patient, or a provider granted downloads."""
+    if record.patient_id == user.id:
+        return True
+    return has_record_access(user, record.id, download=True)
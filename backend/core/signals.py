@@ -0,0 +1,31 @@
+"""
+Signal handlers keeping cached record access in step with providers.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .access_cache import invalidate_provider, invalidate_user
+from .models import Provider
+
+
+@receiver(pre_save, sender=Provider)
+def remember_admin_user(sender, instance, **kwargs):
+    """Remember the stored admin user so a reassignment clears both users' mappings."""
+    instance._previous_admin_user_id = (
+        Provider.objects.filter(pk=instance.pk).values_list('admin_user_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Provider)
+def invalidate_provider_admins(sender, instance, **kwargs):
+    """Drop cached provider ids of the provider's current and previous admin users."""
+    invalidate_user(instance.admin_user_id)
+    if instance._previous_admin_user_id != instance.admin_user_id:
+        invalidate_user(instance._previous_admin_user_id)
+
+
+@receiver(post_delete, sender=Provider)
+def invalidate_deleted_provider(sender, instance, **kwargs):
+    """Forget a deleted provider's access sets and its admin user's mapping."""
+    invalidate_user(instance.admin_user_id)
+    invalidate_provider(instance.pk)
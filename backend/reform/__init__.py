@@ -1,2 +1,5 @@
 # Reform Django Project
 
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
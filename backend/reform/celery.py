@@ -0,0 +1,17 @@
+"""
+Celery application for reform project.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reform.settings')
+
+app = Celery('reform')
+
+# Read CELERY_* settings from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Discover tasks.py modules in installed apps
+app.autodiscover_tasks()
@@ -5,6 +5,7 @@ Django settings for reform project.
 import os
 from pathlib import Path
 import environ
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'django_filters',
     'drf_yasg',
+    'django_celery_beat',
     
     # Local apps
     'core',
@@ -226,6 +228,40 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=False)  # Run tasks inline (tests/dev)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'ai-ml-nightly-population-analysis': {
+        'task': 'ai_ml.tasks.run_population_analysis',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'ai-ml-resume-population-runs': {
+        'task': 'ai_ml.tasks.resume_population_runs',
+        'schedule': crontab(minute='*/15'),
+    },
+}
+
+# Record access
+RECORD_ACCESS_CACHE_TIMEOUT = env.int('RECORD_ACCESS_CACHE_TIMEOUT', default=3600)  # upper bound (seconds) on cached provider access sets
+
+# AI/ML analysis jobs
+AI_ML_JOB_STALE_AFTER = env.int('AI_ML_JOB_STALE_AFTER', default=900)  # seconds without progress before an in-flight job is considered lost
+AI_ML_ANALYSIS_BACKEND = env('AI_ML_ANALYSIS_BACKEND', default='auto')  # auto | numpy | postgres
+AI_ML_COMPUTE_BACKEND = env('AI_ML_COMPUTE_BACKEND', default='inprocess')  # inprocess | process | auto (process when >1 core)
+AI_ML_COMPUTE_WORKERS = env.int('AI_ML_COMPUTE_WORKERS', default=0)  # process pool size; 0 = one per core
+AI_ML_TREND_ESTIMATOR = env('AI_ML_TREND_ESTIMATOR', default='ols')  # ols | theil_sen | huber; robust estimators are opted into per metric in metrics.json
+AI_ML_METRIC_REGISTRY_PATH = env('AI_ML_METRIC_REGISTRY_PATH', default=None)  # metrics.json override; reloaded when changed
+AI_ML_ANALYSIS_CACHE_TIMEOUT = env.int('AI_ML_ANALYSIS_CACHE_TIMEOUT', default=3600)  # seconds per cached result
+AI_ML_REANALYSIS_DEBOUNCE_SECONDS = env.int('AI_ML_REANALYSIS_DEBOUNCE_SECONDS', default=30)  # quiet window after record processing; 0 disables
+AI_ML_REANALYSIS_MAX_DELAY_SECONDS = env.int('AI_ML_REANALYSIS_MAX_DELAY_SECONDS', default=300)  # upper bound on debounced waiting
+
+# AI/ML population (nightly) analysis
+AI_ML_POPULATION_SHARD_SIZE = env.int('AI_ML_POPULATION_SHARD_SIZE', default=5000)  # patients per shard
+AI_ML_POPULATION_CHUNK_SIZE = env.int('AI_ML_POPULATION_CHUNK_SIZE', default=500)  # patients per checkpoint
+AI_ML_POPULATION_MAX_CONCURRENT_SHARDS = env.int('AI_ML_POPULATION_MAX_CONCURRENT_SHARDS', default=4)
+AI_ML_POPULATION_SHARD_STALE_AFTER = env.int('AI_ML_POPULATION_SHARD_STALE_AFTER', default=1800)  # seconds without progress
+AI_ML_POPULATION_SHARD_MAX_ATTEMPTS = env.int('AI_ML_POPULATION_SHARD_MAX_ATTEMPTS', default=3)
 
 # Logging
 LOGGING = {
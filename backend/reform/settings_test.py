@@ -0,0 +1,15 @@
+"""
+Django settings for running the test suite.
+
+Uses an in-memory SQLite database unless TEST_DATABASE_URL points at
+another one (e.g. postgres://... to run the PostgreSQL-only tests).
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import env
+
+DATABASES = {
+    'default': env.db('TEST_DATABASE_URL', default='sqlite://:memory:'),
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
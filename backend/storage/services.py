@@ -7,6 +7,7 @@ from botocore.exceptions import ClientError
 import logging
 import uuid
 from datetime import timedelta
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +75,10 @@ class S3StorageService:
             logger.error(f"Unexpected error uploading file: {str(e)}")
             raise
     
+    def file_key(self, file_url):
+        """S3 object key of a file URL produced by upload_file."""
+        return urlparse(file_url).path.lstrip('/')
+    
     def get_presigned_url(self, file_key, expires_in=300):
         """
         Generate presigned URL for file access.
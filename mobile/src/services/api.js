@@ -108,6 +108,12 @@ export const insuranceAPI = {
   },
 };
 
+export const trendsAPI = {
+  list: (params) => api.get('/ai/trends/', { params: { data_points: false, ...params } }),
+  series: (id, resolution = 'lttb', points = 100) =>
+    api.get(`/ai/trends/${id}/series/`, { params: { resolution, points } }),
+};
+
 export const notificationsAPI = {
   list: (params) => api.get('/notifications/', { params }),
   markRead: (id) => api.post(`/notifications/${id}/mark_read/`),